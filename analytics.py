@@ -0,0 +1,219 @@
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from dashboard_metrics import user_key
+from records import parse_time
+
+logger = logging.getLogger(__name__)
+
+BUCKET_SECONDS = {'hour': 3600, 'day': 86400, 'week': 7 * 86400}
+WEEK_ORIGIN = 4 * 86400  # 1970-01-05, the first Monday after the epoch
+MAX_BUCKETS = 5000
+WEEKDAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+
+def _seconds(ms):
+    return ms / 1000 if isinstance(ms, (int, float)) and not isinstance(ms, bool) else np.nan
+
+
+class Frame:
+    """Leads, appointments and conversations as column arrays
+
+    Times are epoch seconds (NaN when missing or unparseable). Contacts are integer
+    codes of user_key(): the same email or phone gets the same code in every
+    collection, and -1 means no contact details.
+    """
+
+    def __init__(self, leads, appointments, conversations):
+        contacts = {}
+
+        def code(key):
+            return contacts.setdefault(key, len(contacts)) if key else -1
+
+        leads = [d for d in (leads or {}).values() if isinstance(d, dict)]
+        self.lead_time = np.fromiter((_seconds(d.get('created_at')) for d in leads), np.float64, len(leads))
+        self.lead_contact = np.fromiter((code(user_key(d.get('email'), d.get('phone'))) for d in leads),
+                                        np.int64, len(leads))
+
+        appointments = [d for d in (appointments or {}).values() if isinstance(d, dict)]
+        self.appointment_time = np.fromiter((parse_time(d.get('time') or '')[1] or np.nan for d in appointments),
+                                            np.float64, len(appointments))
+        users = [d.get('user') if isinstance(d.get('user'), dict) else {} for d in appointments]
+        self.appointment_contact = np.fromiter((code(user_key(u.get('email'), u.get('phone'))) for u in users),
+                                               np.int64, len(appointments))
+        self.appointment_cancelled = np.fromiter(
+            ((d.get('status') or '').lower() == 'cancelled' for d in appointments), np.bool_, len(appointments))
+
+        conversations = [d for d in (conversations or {}).values() if isinstance(d, dict)]
+        self.conversation_time = np.fromiter((_seconds(d.get('timestamp')) for d in conversations),
+                                             np.float64, len(conversations))
+        details = [d.get('user_details') if isinstance(d.get('user_details'), dict) else {} for d in conversations]
+        # Anonymous chatters are told apart by session; a session id never matches a lead's contact
+        self.conversation_contact = np.fromiter(
+            (code(user_key(u.get('email'), u.get('phone'), d.get('session_id'))) for d, u in zip(conversations, details)),
+            np.int64, len(conversations))
+
+    def times(self, collection):
+        return {
+            'leads': self.lead_time,
+            'appointments': self.appointment_time,
+            'conversations': self.conversation_time
+        }[collection]
+
+    def size(self):
+        return {'leads': len(self.lead_time), 'appointments': len(self.appointment_time),
+                'conversations': len(self.conversation_time)}
+
+    def series(self, collection, bucket, start, end, tz_offset=0):
+        """Record counts per hour/day/week bucket in [start, end); labels are local bucket starts"""
+        if bucket not in BUCKET_SECONDS:
+            raise ValueError(f"bucket must be one of {', '.join(BUCKET_SECONDS)}")
+        if end <= start:
+            raise ValueError('end must be after start')
+        width = BUCKET_SECONDS[bucket]
+        origin = WEEK_ORIGIN if bucket == 'week' else 0
+        first = int((start + tz_offset - origin) // width)
+        last = int((end + tz_offset - origin - 1e-6) // width)
+        count = last - first + 1
+        if count > MAX_BUCKETS:
+            raise ValueError(f'Range spans {count} buckets; the limit is {MAX_BUCKETS}')
+
+        times = self.times(collection)
+        times = times[(times >= start) & (times < end)]
+        index = ((times + tz_offset - origin) // width).astype(np.int64) - first
+        counts = np.bincount(index, minlength=count)[:count]
+        starts = (first + np.arange(count)) * width + origin
+        return {
+            'collection': collection,
+            'bucket': bucket,
+            'labels': [datetime.fromtimestamp(int(s), timezone.utc).replace(tzinfo=None).isoformat() for s in starts],
+            'counts': counts.tolist(),
+            'total': int(counts.sum())
+        }
+
+    def funnel(self, start, end):
+        """Distinct contacts who chatted, left a lead and booked in [start, end), and how many moved on"""
+        def contacts(times, codes, extra=None):
+            mask = (times >= start) & (times < end) & (codes >= 0)
+            if extra is not None:
+                mask &= extra
+            return np.unique(codes[mask])
+
+        chatted = contacts(self.conversation_time, self.conversation_contact)
+        leads = contacts(self.lead_time, self.lead_contact)
+        booked = contacts(self.appointment_time, self.appointment_contact, ~self.appointment_cancelled)
+        leads_from_chat = int(np.isin(leads, chatted).sum())
+        booked_from_leads = int(np.isin(booked, leads).sum())
+        return {
+            'conversations': len(chatted),
+            'leads': len(leads),
+            'appointments': len(booked),
+            'leads_from_conversations': leads_from_chat,
+            'appointments_from_leads': booked_from_leads,
+            'conversation_to_lead': round(leads_from_chat / len(chatted), 4) if len(chatted) else 0.0,
+            'lead_to_appointment': round(booked_from_leads / len(leads), 4) if len(leads) else 0.0
+        }
+
+    def heatmap(self, start, end, tz_offset=0, top=5):
+        """Booked (not cancelled) appointment slots by local weekday and hour"""
+        times = self.appointment_time
+        mask = (times >= start) & (times < end) & ~self.appointment_cancelled
+        local = times[mask] + tz_offset
+        days = (local // 86400).astype(np.int64)
+        weekday = (days + 3) % 7  # 1970-01-01 was a Thursday
+        hour = ((local - days * 86400) // 3600).astype(np.int64)
+        grid = np.bincount(weekday * 24 + hour, minlength=7 * 24).reshape(7, 24)
+        flat = grid.ravel()
+        busiest = [int(i) for i in np.argsort(flat, kind='stable')[::-1][:top] if flat[i] > 0]
+        return {
+            'days': WEEKDAYS,
+            'hours': list(range(24)),
+            'counts': grid.tolist(),
+            'busiest': [{'day': WEEKDAYS[i // 24], 'hour': i % 24, 'count': int(flat[i])} for i in busiest]
+        }
+
+
+class AnalyticsEngine:
+    """Builds a Frame per data version and caches query results until the version changes
+
+    load() returns {'leads': ..., 'appointments': ..., 'conversations': ...} as
+    key -> record dicts; version() returns a token that changes with the data.
+    ttl bounds how long a frame is used without a version change.
+    """
+
+    def __init__(self, load, version, ttl=30.0, max_results=256):
+        self.load = load
+        self.version = version
+        self.ttl = ttl
+        self.max_results = max_results
+        self._frame = None
+        self._frame_version = None
+        self._built_at = 0.0
+        self._results = {}
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self.builds = 0
+        self.hits = 0
+        self.misses = 0
+
+    def frame(self):
+        token = self.version()
+        frame = self._current(token)
+        if frame is not None:
+            return frame
+        with self._build_lock:
+            frame = self._current(token)
+            if frame is None:
+                started = time.perf_counter()
+                frame = Frame(**self.load())
+                with self._lock:
+                    self._frame, self._frame_version, self._built_at = frame, token, time.time()
+                    self._results.clear()
+                    self.builds += 1
+                logger.info(f"Analytics frame built in {time.perf_counter() - started:.3f}s: {frame.size()}")
+        return frame
+
+    def _current(self, token):
+        with self._lock:
+            if self._frame is not None and self._frame_version == token and self._built_at + self.ttl > time.time():
+                return self._frame
+        return None
+
+    def _cached(self, key, compute):
+        frame = self.frame()
+        with self._lock:
+            if key in self._results:
+                self.hits += 1
+                return self._results[key]
+        result = compute(frame)
+        with self._lock:
+            self.misses += 1
+            if frame is self._frame:
+                if len(self._results) >= self.max_results:
+                    self._results.pop(next(iter(self._results)))
+                self._results[key] = result
+        return result
+
+    def series(self, collection, bucket, start, end, tz_offset=0):
+        return self._cached(('series', collection, bucket, start, end, tz_offset),
+                            lambda frame: frame.series(collection, bucket, start, end, tz_offset))
+
+    def funnel(self, start, end):
+        return self._cached(('funnel', start, end), lambda frame: frame.funnel(start, end))
+
+    def heatmap(self, start, end, tz_offset=0):
+        return self._cached(('heatmap', start, end, tz_offset), lambda frame: frame.heatmap(start, end, tz_offset))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'records': self._frame.size() if self._frame is not None else None,
+                'builds': self.builds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'cached_results': len(self._results)
+            }
@@ -1,39 +1,39 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session
-import google.generativeai as genai
+from flask import Flask, render_template, request, jsonify, redirect, url_for, session, Response, stream_with_context
 from dotenv import load_dotenv
 import os
 import logging
-import requests
-from bs4 import BeautifulSoup
 from datetime import datetime, timedelta
 import pytz
-from icalendar import Calendar, Event
 import json
-import csv
 import random
-from twilio.rest import Client
-from twilio.twiml.voice_response import VoiceResponse, Gather
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
+import importlib.util
 import pickle
 from functools import lru_cache
 import time
 import uuid
-from collections import Counter, defaultdict
+from collections import Counter, defaultdict, namedtuple
 from functools import wraps
 import base64
-
-# Firebase Admin SDK
-try:
-    import firebase_admin
-    from firebase_admin import credentials as fb_credentials
-    from firebase_admin import db as fb_db
-except Exception:
-    firebase_admin = None
-    fb_credentials = None
-    fb_db = None
+import atexit
+from cache import TTLCache, SQLiteCache, TieredCache, SimilarityIndex, normalize_cache_key
+from intents import build_intent_matcher, PRIORITY_COMMON
+from firebase_writer import FirebaseWriter
+from dashboard_metrics import MetricsAggregator, user_key, read_node
+from rtdb_mirror import RealtimeMirror
+from records import Lead, Appointment, Conversation, FormUser, to_dicts, parse_time
+import bulk_io
+from storage import create_storage
+from slot_locks import SlotLocks, SlotReservations
+from llm_gateway import LLMGateway, GatewayBusy, GatewayTimeout
+from prompts import PromptBuilder
+from sheets_writer import SheetsClient, SheetsWriter
+from voice_turns import VoiceTurns, LatencyRecorder
+from call_store import CallTranscriptStore
+from instrumentation import Metrics
+from services import ServiceRegistry
+from page_cache import Page, PageCache, DataVersion, COMPRESSIBLE_TYPES, accepted_encoding, compress, etag_matches
+from xml.sax.saxutils import escape
+from urllib.parse import urlencode
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -45,98 +45,286 @@ load_dotenv()
 app = Flask(__name__)
 app.secret_key = os.getenv('FLASK_SECRET_KEY', 'dev-secret-change-me')
 
-# Initialize Firebase (Realtime Database) for leads
-rtdb_available = False
-rtdb_url = None
-try:
-    if firebase_admin is not None:
-        firebase_credentials = None
-        firebase_b64 = os.getenv('FIREBASE_CREDENTIALS_B64')
-        firebase_json_env = os.getenv('FIREBASE_CREDENTIALS_JSON')
-        firebase_creds_path = os.getenv('FIREBASE_CREDENTIALS_PATH')
-        rtdb_url = os.getenv('FIREBASE_DATABASE_URL')
+# Gemini, Firebase and Twilio clients (and their SDK imports) are created on first use
+services = ServiceRegistry()
+
+# Request and dependency timings for /metrics; METRICS_SAMPLE_RATE=0 keeps only the counters
+app_metrics = Metrics(
+    sample_rate=float(os.getenv('METRICS_SAMPLE_RATE', '1')),
+    slow_request=float(os.getenv('METRICS_SLOW_REQUEST', '0')) or None
+)
+cache_lookups = app_metrics.counter('cache_lookups_total', 'Response cache lookups by result', ('result',))
+canned_answers = app_metrics.counter('canned_answers_total', 'Messages answered without Gemini by source', ('source',))
+
+@app.before_request
+def start_request_timer():
+    app_metrics.begin_request(request.endpoint)
+
+@app.after_request
+def record_request_timer(response):
+    app_metrics.end_request(request.method, response.status_code)
+    return response
+
+# Rendered pages are cached per data version and served with ETags and compression
+PAGE_CACHE_TTL = float(os.getenv('PAGE_CACHE_TTL', '30'))
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '1024'))
+page_cache = PageCache(ttl=PAGE_CACHE_TTL)
+data_version = DataVersion()
+
+@app.after_request
+def compress_response(response):
+    """Bump the data version after writes and compress sizeable text responses"""
+    if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+        data_version.bump()
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = accepted_encoding(request.headers.get('Accept-Encoding'))
+    body = response.get_data()
+    if encoding is None or len(body) < COMPRESS_MIN_SIZE:
+        return response
+    response.set_data(compress(body, encoding, fast=True))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def page_response(page, cache_control='no-cache'):
+    """Serve a cached Page: 304 when the client's ETag matches, else the best accepted encoding"""
+    headers = {'ETag': page.etag, 'Cache-Control': cache_control, 'Vary': 'Accept-Encoding'}
+    if etag_matches(request.headers.get('If-None-Match'), page.etag):
+        return Response(status=304, headers=headers)
+    encoding = accepted_encoding(request.headers.get('Accept-Encoding'))
+    if encoding is not None:
+        headers['Content-Encoding'] = encoding
+    return Response(page.encoded(encoding), mimetype=page.mimetype, headers=headers)
+
+# Firebase (Realtime Database) for leads: credentials are read now, the SDK is imported
+# and initialized on the first database access
+def load_firebase_credentials():
+    firebase_b64 = os.getenv('FIREBASE_CREDENTIALS_B64')
+    firebase_json_env = os.getenv('FIREBASE_CREDENTIALS_JSON')
+    firebase_creds_path = os.getenv('FIREBASE_CREDENTIALS_PATH')
+    try:
+        if firebase_b64:
+            decoded = base64.b64decode(firebase_b64.encode('utf-8')).decode('utf-8')
+            return json.loads(decoded)
+        elif firebase_json_env:
+            try:
+                return json.loads(firebase_json_env)
+            except json.JSONDecodeError:
+                return json.loads(firebase_json_env.replace('\\n', '\n'))
+        elif firebase_creds_path and os.path.exists(firebase_creds_path):
+            with open(firebase_creds_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+    except Exception as e:
+        logger.error(f"Error loading Firebase credentials from environment: {e}")
+    return None
 
-        try:
-            if firebase_b64:
-                decoded = base64.b64decode(firebase_b64.encode('utf-8')).decode('utf-8')
-                firebase_credentials = json.loads(decoded)
-            elif firebase_json_env:
-                try:
-                    firebase_credentials = json.loads(firebase_json_env)
-                except json.JSONDecodeError:
-                    firebase_credentials = json.loads(firebase_json_env.replace('\\n', '\n'))
-            elif firebase_creds_path and os.path.exists(firebase_creds_path):
-                with open(firebase_creds_path, 'r', encoding='utf-8') as f:
-                    firebase_credentials = json.load(f)
-        except Exception as e:
-            logger.error(f"Error loading Firebase credentials from environment: {e}")
-            firebase_credentials = None
+def create_firebase_db():
+    global rtdb_available
+    try:
+        import firebase_admin
+        from firebase_admin import credentials as fb_credentials
+        from firebase_admin import db
+        firebase_admin.initialize_app(fb_credentials.Certificate(firebase_credentials), {
+            'databaseURL': rtdb_url
+        })
+    except Exception as e:
+        logger.error(f"Failed to initialize Firebase with credentials: {e}")
+        rtdb_available = False
+        raise
+    logger.info(f"Firebase initialized successfully with database: {rtdb_url}")
+    return db
 
-        if firebase_credentials:
-            try:
-                cred = fb_credentials.Certificate(firebase_credentials)
-                if not rtdb_url:
-                    rtdb_url = firebase_credentials.get('databaseURL')
-                if not rtdb_url:
-                    rtdb_url = 'https://{}.firebaseio.com/'.format(firebase_credentials.get('project_id', ''))
-                firebase_admin.initialize_app(cred, {
-                    'databaseURL': rtdb_url
-                })
-                logger.info(f"Firebase initialized successfully with database: {rtdb_url}")
-                rtdb_available = True
-            except Exception as e:
-                logger.error(f"Failed to initialize Firebase with credentials: {e}")
-                rtdb_available = False
-        else:
-            logger.warning('Firebase credentials are not provided via environment. RTDB features disabled.')
+rtdb_available = False
+rtdb_url = None
+fb_db = None
+firebase_credentials = None
+if importlib.util.find_spec('firebase_admin') is None:
+    logger.warning('firebase_admin is not installed. Leads dashboard will be disabled until installed.')
+else:
+    firebase_credentials = load_firebase_credentials()
+    if firebase_credentials:
+        rtdb_url = (os.getenv('FIREBASE_DATABASE_URL') or firebase_credentials.get('databaseURL') or
+                    'https://{}.firebaseio.com/'.format(firebase_credentials.get('project_id', '')))
+        services.register('firebase', create_firebase_db)
+        fb_db = services.proxy('firebase')
+        rtdb_available = True
     else:
-        logger.warning('firebase_admin is not installed. Leads dashboard will be disabled until installed.')
-except Exception as e:
-    logger.error(f"Unexpected Firebase init error: {e}")
-    rtdb_available = False
+        logger.warning('Firebase credentials are not provided via environment. RTDB features disabled.')
+
+# Background write-behind queue so request handlers don't wait on RTDB writes
+FIREBASE_WRITE_BEHIND = os.getenv('FIREBASE_WRITE_BEHIND', 'true').lower() in ('1', 'true', 'yes')
+firebase_writer = None
+if rtdb_available and FIREBASE_WRITE_BEHIND:
+    firebase_writer = FirebaseWriter(
+        lambda: fb_db.reference(),
+        max_queue=int(os.getenv('FIREBASE_WRITE_QUEUE_SIZE', '10000')),
+        batch_size=int(os.getenv('FIREBASE_WRITE_BATCH_SIZE', '100')),
+        journal_path=os.getenv('FIREBASE_JOURNAL_PATH', 'firebase_journal.jsonl')
+    )
+    app_metrics.instrument(firebase_writer, 'firebase', ['batch_update'])
+    firebase_writer.start()
+    atexit.register(firebase_writer.stop)
+
+# Dashboard counters maintained at write time under metrics/
+dashboard_metrics = MetricsAggregator(lambda path: fb_db.reference(path)).start() if rtdb_available else None
+
+# In-memory mirror of the dashboard collections, kept current by RTDB listen() streams
+DASHBOARD_REALTIME = os.getenv('DASHBOARD_REALTIME', 'true').lower() in ('1', 'true', 'yes')
+DASHBOARD_KEEPALIVE = float(os.getenv('DASHBOARD_KEEPALIVE', '15'))
+# metrics/ is mirrored too, so the dashboard counters are read from memory as well
+MIRRORED_COLLECTIONS = ('leads', 'appointments', 'conversations', 'users', 'metrics')
+
+def create_rtdb_mirror(get_ref, **kwargs):
+    """RealtimeMirror of MIRRORED_COLLECTIONS with the indexes the dashboard reads"""
+    mirror = RealtimeMirror(get_ref, MIRRORED_COLLECTIONS, **kwargs)
+    mirror.add_index('appointments', 'upcoming', lambda d: upcoming_epoch(d))
+    return mirror
+
+rtdb_mirror = None
+if rtdb_available and DASHBOARD_REALTIME:
+    rtdb_mirror = create_rtdb_mirror(
+        lambda path: fb_db.reference(path),
+        max_subscribers=int(os.getenv('DASHBOARD_MAX_STREAMS', '100'))
+    )
+    services.register('rtdb_mirror', rtdb_mirror.start)
+    atexit.register(rtdb_mirror.stop)
+
+# Atomic slot claims under slots/ for instances sharing the database
+slot_reservations = SlotReservations(lambda path: fb_db.reference(path)) if rtdb_available else None
 
 # Google Sheets setup
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
 SPREADSHEET_ID = os.getenv('SPREADSHEET_ID', '')
 RANGE_NAME = os.getenv('GOOGLE_SHEETS_RANGE_NAME', 'Calls!A:E')
 
- # Configure Gemini
+# Configure Gemini
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY', '')
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
-else:
+if not GEMINI_API_KEY:
     logger.warning('GEMINI_API_KEY is not set. Chat responses may fail until configured.')
-model = genai.GenerativeModel('gemini-2.0-flash')
+
+def create_gemini_model():
+    import google.generativeai as genai
+    if GEMINI_API_KEY:
+        genai.configure(api_key=GEMINI_API_KEY)
+    return app_metrics.instrument(genai.GenerativeModel('gemini-2.0-flash'), 'gemini', ['generate_content'])
+
+services.register('gemini', create_gemini_model)
+model = services.proxy('gemini')
+
+# Every Gemini call goes through the gateway: bounded concurrency, per-call deadlines, coalescing
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '8'))
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '10'))
+LLM_QUEUE_TIMEOUT = float(os.getenv('LLM_QUEUE_TIMEOUT', '1'))
+llm_gateway = LLMGateway(model, max_concurrency=LLM_MAX_CONCURRENCY, timeout=LLM_TIMEOUT, queue_timeout=LLM_QUEUE_TIMEOUT)
+# Gemini runs on the gateway's threads; time the wait in the request thread so it is attributed to the route
+app_metrics.instrument(llm_gateway, 'llm', ['generate'])
 
 # Configure Twilio
 TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID', '')
 TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN', '')
 TWILIO_PHONE_NUMBER = os.getenv('TWILIO_PHONE_NUMBER', '')
-twilio_client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN) if (TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN) else None
+
+def create_twilio_client():
+    from twilio.rest import Client
+    return Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+
+twilio_client = None
+if TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN:
+    services.register('twilio', create_twilio_client)
+    twilio_client = services.proxy('twilio')
 
 # Store appointments in memory (in production, use a database)
 appointments = []
 
+# Local storage: 'files' (appointments.csv + users_data.json) or 'sqlite'
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'files').lower()
+local_store = create_storage(
+    STORAGE_BACKEND,
+    sqlite_path=os.getenv('SQLITE_PATH', 'imsolutions.db'),
+    appointments_path=os.getenv('APPOINTMENTS_CSV_PATH', 'appointments.csv'),
+    users_path='users_data.json'
+)
+app_metrics.instrument(local_store, f'storage.{local_store.name}', [
+    'find_appointment_conflict', 'add_appointment', 'set_appointment_status', 'list_appointments',
+    'add_lead', 'add_user', 'list_users', 'add_conversation', 'bulk_insert', 'page', 'metrics'
+])
+atexit.register(local_store.close)
+
+# Serialise the conflict check and the write of each booking, per slot
+slot_locks = SlotLocks(os.getenv('SLOT_LOCK_DIR') or None)
+
 # Load IM Solutions content from JSON
 with open('imsolutions_content.json', 'r', encoding='utf-8') as f:
     IM_SOLUTIONS_DATA = json.load(f)
 
 # Cache for Gemini responses
-response_cache = {}
 CACHE_EXPIRY = 3600  # Cache expiry time in seconds (1 hour)
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '1024'))
+CACHE_MAX_BYTES = int(os.getenv('CACHE_MAX_BYTES', str(8 * 1024 * 1024)))
+response_cache = TTLCache(max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES, ttl=CACHE_EXPIRY)
+
+# 'sqlite' backs the per-process cache with a disk cache shared by all workers and kept across restarts
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'sqlite').lower()
+if CACHE_BACKEND == 'sqlite':
+    response_cache = TieredCache(response_cache, SQLiteCache(
+        os.getenv('CACHE_DB_PATH', 'response_cache.db'),
+        ttl=CACHE_EXPIRY,
+        max_entries=int(os.getenv('CACHE_SHARED_MAX_ENTRIES', '10000'))
+    ))
+
+# Optional near-duplicate lookup over cached questions
+SEMANTIC_CACHE_ENABLED = os.getenv('SEMANTIC_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.85'))
+similarity_index = SimilarityIndex(threshold=SEMANTIC_CACHE_THRESHOLD, max_entries=CACHE_MAX_ENTRIES)
+
+# Preload the most-hit shared entries so a fresh worker starts warm
+CACHE_WARM_ENTRIES = int(os.getenv('CACHE_WARM_ENTRIES', '200'))
+if isinstance(response_cache, TieredCache) and CACHE_WARM_ENTRIES > 0:
+    try:
+        warmed_keys = response_cache.warm(min(CACHE_WARM_ENTRIES, CACHE_MAX_ENTRIES))
+        if SEMANTIC_CACHE_ENABLED:
+            for warmed_key in warmed_keys:
+                similarity_index.add(warmed_key)
+        logger.info(f"Response cache warmed with {len(warmed_keys)} entries")
+    except Exception as e:
+        logger.warning(f"Response cache warm-up failed: {e}")
 
 def get_cached_response(user_input):
     """Get cached response if available and not expired"""
-    current_time = time.time()
-    if user_input in response_cache:
-        cached_time, cached_response = response_cache[user_input]
-        if current_time - cached_time < CACHE_EXPIRY:
-            return cached_response
-    return None
+    key = normalize_cache_key(user_input)
+    if not key:
+        # Punctuation- or whitespace-only messages are never cached
+        cache_lookups.inc('miss')
+        return None
+    with app_metrics.span('cache.get'):
+        cached = response_cache.get(key)
+    if cached is not None or not SEMANTIC_CACHE_ENABLED:
+        cache_lookups.inc('hit' if cached is not None else 'miss')
+        return cached
+    similar_key, score = similarity_index.lookup(key)
+    if similar_key is None:
+        cache_lookups.inc('miss')
+        return None
+    cached = response_cache.get(similar_key)
+    if cached is None:
+        # The answer expired or was evicted; stop matching against it
+        similarity_index.discard(similar_key)
+        cache_lookups.inc('miss')
+    else:
+        logger.debug(f"Semantic cache hit ({score:.2f}): '{key}' ~ '{similar_key}'")
+        cache_lookups.inc('semantic_hit')
+    return cached
 
 def cache_response(user_input, response):
     """Cache the response with current timestamp"""
-    response_cache[user_input] = (time.time(), response)
+    key = normalize_cache_key(user_input)
+    if not key:
+        return
+    response_cache.set(key, response)
+    if SEMANTIC_CACHE_ENABLED:
+        similarity_index.add(key)
 
 # Common questions and their responses
 COMMON_QUESTIONS = {
@@ -146,9 +334,33 @@ COMMON_QUESTIONS = {
     "what is your vision": IM_SOLUTIONS_DATA['vision']
 }
 
-def get_google_sheets_service():
+# Canned answers generated from imsolutions_content.json, compiled once into a single-pass matcher.
+# Curated COMMON_QUESTIONS always answer; generated intents must cover more than INTENT_MIN_CONFIDENCE of the message.
+INTENT_MIN_CONFIDENCE = float(os.getenv('INTENT_MIN_CONFIDENCE', '0.5'))
+intent_matcher = build_intent_matcher(IM_SOLUTIONS_DATA, COMMON_QUESTIONS)
+logger.info(f"Intent matcher compiled with {len(intent_matcher)} patterns")
+
+def match_intent(user_input):
+    """Return a canned response for the message, or None to fall through to Gemini"""
+    match = intent_matcher.match(user_input, min_confidence=INTENT_MIN_CONFIDENCE)
+    if match is None:
+        return None
+    canned_answers.inc('common_questions' if match.intent.priority >= PRIORITY_COMMON else 'content')
+    logger.debug(f"Intent '{match.intent.name}' matched with confidence {match.confidence:.2f}")
+    return match.intent.response
+
+GOOGLE_TOKEN_PATH = os.getenv('GOOGLE_TOKEN_PATH', 'token.pickle')
+
+def save_google_credentials(creds):
+    with open(GOOGLE_TOKEN_PATH, 'wb') as token:
+        pickle.dump(creds, token)
+
+def load_google_credentials():
+    from google.auth.transport.requests import Request
+    from google_auth_oauthlib.flow import InstalledAppFlow
+
     creds = None
-    token_path = os.getenv('GOOGLE_TOKEN_PATH', 'token.pickle')
+    token_path = GOOGLE_TOKEN_PATH
     if os.path.exists(token_path):
         with open(token_path, 'rb') as token:
             creds = pickle.load(token)
@@ -175,76 +387,163 @@ def get_google_sheets_service():
             else:
                 flow = InstalledAppFlow.from_client_secrets_file(creds_path, SCOPES)
             creds = flow.run_local_server(port=0)
-        with open(token_path, 'wb') as token:
-            pickle.dump(creds, token)
+        save_google_credentials(creds)
+
+    return creds
 
-    return build('sheets', 'v4', credentials=creds)
+# One Sheets client for the process; credentials are refreshed only when they expire
+sheets_client = SheetsClient(load_google_credentials, save_google_credentials)
+
+def get_google_sheets_service():
+    return sheets_client.service()
+
+# Call summaries are buffered and appended to the sheet in batches (journaled until sent)
+sheets_writer = SheetsWriter(
+    sheets_client,
+    SPREADSHEET_ID,
+    RANGE_NAME,
+    batch_size=int(os.getenv('SHEETS_BATCH_SIZE', '50')),
+    flush_interval=float(os.getenv('SHEETS_FLUSH_INTERVAL', '5')),
+    journal_path=os.getenv('SHEETS_JOURNAL_PATH', 'sheets_journal.jsonl')
+)
+app_metrics.instrument(sheets_writer, 'sheets', ['flush'])
+if SPREADSHEET_ID:
+    sheets_writer.start()
+    atexit.register(sheets_writer.stop)
 
 def save_call_summary(call_sid, phone_number, duration, summary):
     try:
-        service = get_google_sheets_service()
-        values = [[
+        sheets_writer.append([
             datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
             call_sid,
             phone_number,
             duration,
             summary
-        ]]
-        body = {
-            'values': values
-        }
-        result = service.spreadsheets().values().append(
-            spreadsheetId=SPREADSHEET_ID,
-            range=RANGE_NAME,
-            valueInputOption='RAW',
-            body=body
-        ).execute()
-        logger.info(f"Call summary saved to Google Sheets: {result}")
+        ])
+        logger.info(f"Call summary queued for Google Sheets: {call_sid}")
         return True
     except Exception as e:
         logger.error(f"Error saving call summary: {str(e)}")
         return False
 
-# Store call summaries in memory (in case Google Sheets fails)
-call_summaries = {}
+def format_call_summary(exchanges):
+    summary = "Call Summary:\n"
+    for exchange in exchanges:
+        summary += f"User: {exchange['user']}\n"
+        summary += f"Bot: {exchange['bot']}\n"
+        summary += f"Time: {exchange['timestamp']}\n\n"
+    return summary
+
+def summarise_abandoned_call(call_sid, exchanges):
+    """Calls whose completion callback never arrived still get a summary"""
+    logger.info(f"Call {call_sid} timed out without a completion callback, saving its summary")
+    save_call_summary(call_sid, '', '', format_call_summary(exchanges))
+
+# In-progress call transcripts: shared by workers, kept across restarts, abandoned calls expire
+call_store = CallTranscriptStore(
+    os.getenv('CALL_TRANSCRIPTS_PATH', 'call_transcripts.jsonl'),
+    ttl=float(os.getenv('CALL_TRANSCRIPT_TTL', '3600')),
+    max_calls=int(os.getenv('CALL_TRANSCRIPT_MAX_CALLS', '10000')),
+    on_expire=summarise_abandoned_call
+).start()
+atexit.register(call_store.stop)
+
+MAX_REPLY_LINES = 6
+FALLBACK_REPLY = "I apologize for the inconvenience, but I'm currently experiencing some technical difficulties. Please try again in a moment."
+SLOW_REPLY = "Thanks for your patience! I'm receiving a lot of questions right now. Could you try again in a moment, or ask about our services, offices or careers?"
+
+def slow_reply(user_input):
+    """Canned answer when Gemini is busy or slow: the closest intent at any confidence, else SLOW_REPLY"""
+    match = intent_matcher.match(user_input)
+    return match.intent.response if match else SLOW_REPLY
+
+# Static company context is rendered once and re-rendered when imsolutions_content.json changes;
+# the chunks most relevant to each question are retrieved from a BM25 index over the same file
+prompt_builder = PromptBuilder(
+    'imsolutions_content.json',
+    max_input_tokens=int(os.getenv('PROMPT_MAX_INPUT_TOKENS', '256')),
+    max_context_tokens=int(os.getenv('PROMPT_MAX_CONTEXT_TOKENS', '1024')),
+    top_k=int(os.getenv('PROMPT_CONTEXT_TOP_K', '3'))
+)
+
+def build_prompt(user_input):
+    """Build the Gemini prompt for a user question"""
+    prompt = prompt_builder.build(user_input)
+    if prompt.truncated:
+        logger.info(f"User input clipped to {prompt.input_tokens} tokens")
+    logger.debug(f"Prompt context retrieved: {prompt.sources}")
+    return prompt
+
+def log_gemini_call(prompt, started):
+    logger.info(f"Gemini call: {prompt.tokens} prompt tokens "
+                f"(input {prompt.input_tokens}, context {prompt.context_tokens}), {time.time() - started:.2f}s")
+
+def clean_reply(text):
+    """Strip markdown asterisks and limit the reply to MAX_REPLY_LINES lines"""
+    reply = text.strip().replace('*', '')
+    return '\n'.join(reply.splitlines()[:MAX_REPLY_LINES])
+
+def stream_reply_deltas(chunks):
+    """Apply clean_reply incrementally to streamed Gemini chunks, yielding text deltas"""
+    started = False
+    newlines = 0
+    pending = ''  # whitespace held back so the reply never ends with it
+    for chunk in chunks:
+        text = (chunk.text or '').replace('*', '').replace('\r\n', '\n').replace('\r', '\n')
+        if not started:
+            text = text.lstrip()
+            if not text:
+                continue
+            started = True
+        delta = []
+        for ch in text:
+            if ch == '\n':
+                newlines += 1
+                if newlines >= MAX_REPLY_LINES:
+                    if delta:
+                        yield ''.join(delta)
+                    return
+            if ch.isspace():
+                pending += ch
+            else:
+                delta.append(pending)
+                delta.append(ch)
+                pending = ''
+        if delta:
+            yield ''.join(delta)
+
+def get_ready_response(user_input):
+    """Canned or cached answer for the message, or None if Gemini must be called"""
+    # Check for common questions first
+    canned_response = match_intent(user_input)
+    if canned_response:
+        return canned_response
+
+    # Check cache
+    cached_response = get_cached_response(user_input)
+    if cached_response:
+        logger.debug("Returning cached response")
+        return cached_response
+    return None
 
 def get_chatgpt_response(user_input):
     try:
         logger.debug(f"Processing input: {user_input}")
-        
-        # Check for common questions first
-        user_input_lower = user_input.lower().strip()
-        for question, response in COMMON_QUESTIONS.items():
-            if question in user_input_lower:
-                return response
-
-        # Check cache
-        cached_response = get_cached_response(user_input)
-        if cached_response:
-            logger.debug("Returning cached response")
-            return cached_response
 
-        # Create a more concise prompt
-        prompt = f"""You are a customer service rep for {IM_SOLUTIONS_DATA['company_info']['name']}. 
-Answer this question briefly (max 6 lines): {user_input}
+        ready_response = get_ready_response(user_input)
+        if ready_response:
+            return ready_response
 
-Company Info:
-- Type: {IM_SOLUTIONS_DATA['company_info']['type']}
-- Founded: {IM_SOLUTIONS_DATA['company_info']['founded']}
-- Location: {IM_SOLUTIONS_DATA['company_info']['location']}
-
-Services: {', '.join(IM_SOLUTIONS_DATA['services']['online_services'][:5])} and more.
-
-Be brief, helpful, and professional. Do not include contact information or website details in your response. If question is unrelated to {IM_SOLUTIONS_DATA['company_info']['name']}, politely redirect to our services."""
-
-        response = model.generate_content(prompt)
+        prompt = build_prompt(user_input)
+        started = time.time()
+        try:
+            text = llm_gateway.generate(prompt.text)
+        except (GatewayBusy, GatewayTimeout) as e:
+            logger.warning(f"Gemini unavailable, using canned reply: {e}")
+            return slow_reply(user_input)
         
-        logger.debug(f"Received response from Gemini")
-        reply = response.text.strip()
-        reply = reply.replace('*', '')
-        # Limit to 6 lines
-        lines = reply.splitlines()
-        reply = '\n'.join(lines[:6])
+        log_gemini_call(prompt, started)
+        reply = clean_reply(text)
 
         # Cache the response
         cache_response(user_input, reply)
@@ -253,11 +552,40 @@ Be brief, helpful, and professional. Do not include contact information or websi
     except Exception as e:
         error_msg = f"Error calling Gemini API: {str(e)}"
         logger.error(error_msg)
-        return f"I apologize for the inconvenience, but I'm currently experiencing some technical difficulties. Please try again in a moment."
+        return FALLBACK_REPLY
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    """Expose response cache counters for monitoring"""
+    stats = response_cache.stats()
+    stats['semantic'] = similarity_index.stats() if SEMANTIC_CACHE_ENABLED else None
+    stats['pages'] = page_cache.stats()
+    stats['mirror'] = rtdb_mirror.stats() if rtdb_mirror is not None else None
+    stats['analytics'] = services.get('analytics').stats() if services.loaded('analytics') else None
+    return jsonify(stats)
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Request, span and counter metrics in the Prometheus text format"""
+    return Response(app_metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/llm_stats', methods=['GET'])
+def llm_stats():
+    """Expose Gemini gateway and prompt size counters for monitoring"""
+    stats = llm_gateway.stats()
+    stats['prompts'] = prompt_builder.stats()
+    return jsonify(stats)
+
+def build_index_page():
+    """index.html has no per-request data: render and compress it once"""
+    with app.app_context():
+        return Page(render_template('index.html'), precompress=('gzip', 'br'))
+
+services.register('index_page', build_index_page)
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return page_response(services.get('index_page'))
 
 def login_required(view_func):
     @wraps(view_func)
@@ -287,6 +615,46 @@ def logout():
     session.clear()
     return redirect(url_for('login'))
 
+def conversation_context():
+    """Session details recorded alongside each conversation"""
+    return {
+        'session_id': session.get('session_id', 'default'),
+        'user_details': {
+            'name': session.get('name', 'Anonymous'),
+            'email': session.get('email', ''),
+            'phone': session.get('phone', '')
+        }
+    }
+
+def save_conversation(user_message, bot_response, context):
+    """Store a chat exchange in local storage and Firebase"""
+    try:
+        conversation_id = str(uuid.uuid4())
+        conversation_data = {
+            'id': conversation_id,
+            'user_message': user_message,
+            'bot_response': bot_response,
+            'timestamp': int(time.time() * 1000),
+            'session_id': context['session_id'],
+            'user_details': context['user_details']
+        }
+        
+        local_store.add_conversation(conversation_data)
+        firebase_set(f'conversations/{conversation_id}', conversation_data)
+        if dashboard_metrics is not None:
+            details = context['user_details']
+            dashboard_metrics.record_conversation(
+                user_key(details.get('email'), details.get('phone'), context['session_id'])
+            )
+        
+    except Exception as e:
+        logger.warning(f"Failed to save conversation: {e}")
+
+def sse_event(data, event=None):
+    """Format a Server-Sent Events message"""
+    message = f"event: {event}\n" if event else ''
+    return message + f"data: {json.dumps(data)}\n\n"
+
 @app.route('/send_message', methods=['POST'])
 def send_message():
     try:
@@ -296,28 +664,7 @@ def send_message():
         logger.debug(f"Sending response to user: {bot_response}")
         
         # Store conversation in Firebase
-        if rtdb_available:
-            try:
-                conversation_id = str(uuid.uuid4())
-                conversation_data = {
-                    'id': conversation_id,
-                    'user_message': user_message,
-                    'bot_response': bot_response,
-                    'timestamp': int(time.time() * 1000),
-                    'session_id': session.get('session_id', 'default'),
-                    'user_details': {
-                        'name': session.get('name', 'Anonymous'),
-                        'email': session.get('email', ''),
-                        'phone': session.get('phone', '')
-                    }
-                }
-                
-                safe_firebase_operation(
-                    lambda: fb_db.reference('conversations').child(conversation_id).set(conversation_data)
-                )
-                
-            except Exception as e:
-                logger.warning(f"Failed to save conversation to RTDB: {e}")
+        save_conversation(user_message, bot_response, conversation_context())
         
         return jsonify({'response': bot_response})
     except Exception as e:
@@ -325,6 +672,52 @@ def send_message():
         logger.error(error_msg)
         return jsonify({'response': f"Error: {str(e)}"}), 500
 
+@app.route('/send_message_stream', methods=['POST'])
+def send_message_stream():
+    """Stream the bot reply as Server-Sent Events while Gemini generates it"""
+    user_message = (request.json or {}).get('message', '')
+    if not user_message:
+        return jsonify({'error': 'Message is required'}), 400
+    logger.debug(f"Received streaming message from user: {user_message}")
+    context = conversation_context()
+
+    def generate():
+        reply_parts = []
+        try:
+            ready_response = get_ready_response(user_message)
+            if ready_response:
+                reply_parts.append(ready_response)
+                yield sse_event({'delta': ready_response})
+            else:
+                prompt = build_prompt(user_message)
+                started = time.time()
+                response = llm_gateway.stream(prompt.text)
+                for delta in stream_reply_deltas(response):
+                    reply_parts.append(delta)
+                    yield sse_event({'delta': delta})
+                log_gemini_call(prompt, started)
+                if reply_parts:
+                    cache_response(user_message, ''.join(reply_parts))
+        except (GatewayBusy, GatewayTimeout) as e:
+            logger.warning(f"Gemini stream unavailable: {e}")
+            if not reply_parts:
+                reply_parts.append(slow_reply(user_message))
+                yield sse_event({'delta': reply_parts[0]})
+        except Exception as e:
+            logger.error(f"Error streaming Gemini response: {str(e)}")
+            if not reply_parts:
+                reply_parts.append(FALLBACK_REPLY)
+                yield sse_event({'delta': FALLBACK_REPLY})
+        bot_response = ''.join(reply_parts)
+        save_conversation(user_message, bot_response, context)
+        yield sse_event({'response': bot_response}, event='done')
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/schedule_appointment', methods=['POST'])
 def schedule_appointment():
     try:
@@ -339,24 +732,6 @@ def schedule_appointment():
         # Convert time string to datetime object
         appointment_time = datetime.fromisoformat(time.replace('Z', '+00:00'))
         
-        # Check for existing appointments at the same time
-        existing_appointments = []
-        try:
-            with open('appointments.csv', 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                existing_appointments = list(reader)
-        except FileNotFoundError:
-            pass
-
-        # Check if there's any appointment at the same time
-        for existing in existing_appointments:
-            existing_time = datetime.fromisoformat(existing['time'].replace('Z', '+00:00'))
-            if existing_time == appointment_time:
-                return jsonify({
-                    'error': 'This time slot is already booked. Please choose a different time.',
-                    'existing_appointment': existing
-                }), 409  # 409 Conflict status code
-
         # Generate a unique ID (timestamp + random number)
         timestamp = int(datetime.now().timestamp())
         random_num = random.randint(1000, 9999)
@@ -389,32 +764,46 @@ def schedule_appointment():
             'user': user_info
         }
         
+        # The conflict check and the write must not interleave with another booking of this slot
+        with slot_locks.hold(appointment_time):
+            existing = local_store.find_appointment_conflict(appointment_time)
+            if not existing and slot_reservations is not None:
+                holder = safe_firebase_operation(
+                    lambda: slot_reservations.reserve(appointment_time, appointment_id),
+                    appointment_id
+                )
+                if holder != appointment_id:
+                    existing = {'id': holder, 'time': appointment['time']}
+            if existing:
+                return jsonify({
+                    'error': 'This time slot is already booked. Please choose a different time.',
+                    'existing_appointment': existing
+                }), 409  # 409 Conflict status code
+
+            # Save to local storage
+            try:
+                local_store.add_appointment({
+                    'id': appointment['id'],
+                    'title': appointment['title'],
+                    'time': appointment['time'],
+                    'notes': appointment['notes'],
+                    'status': appointment['status'],
+                    'user_name': user_info.get('name', ''),
+                    'user_email': user_info.get('email', ''),
+                    'user_phone': user_info.get('phone', ''),
+                    'user_company': user_info.get('company', '')
+                })
+            except Exception:
+                # The booking failed, so the slot must not stay reserved for it
+                if slot_reservations is not None:
+                    safe_firebase_operation(lambda: slot_reservations.release(appointment_time, appointment_id))
+                raise
+        
         # Add to appointments list
         appointments.append(appointment)
         
-        # Save to CSV file
-        csv_file = 'appointments.csv'
-        file_exists = os.path.isfile(csv_file)
-        with open(csv_file, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(
-                f,
-                fieldnames=['id', 'title', 'time', 'notes', 'status', 'user_name', 'user_email', 'user_phone', 'user_company']
-            )
-            if not file_exists:
-                writer.writeheader()
-            writer.writerow({
-                'id': appointment['id'],
-                'title': appointment['title'],
-                'time': appointment['time'],
-                'notes': appointment['notes'],
-                'status': appointment['status'],
-                'user_name': user_info.get('name', ''),
-                'user_email': user_info.get('email', ''),
-                'user_phone': user_info.get('phone', ''),
-                'user_company': user_info.get('company', '')
-            })
-        
         # Create iCalendar event
+        from icalendar import Calendar, Event
         cal = Calendar()
         event = Event()
         event.add('summary', title)
@@ -424,16 +813,18 @@ def schedule_appointment():
         cal.add_component(event)
         
         # Save to file (in production, use a database)
-        with open(f'appointments/{appointment["id"]}.ics', 'wb') as f:
+        with app_metrics.span('file.write_ics'), open(f'appointments/{appointment["id"]}.ics', 'wb') as f:
             f.write(cal.to_ical())
         
         # Save to Firebase Realtime Database
         if rtdb_available:
             try:
-                safe_firebase_operation(
-                    lambda: fb_db.reference('appointments').child(appointment_id).set(appointment)
-                )
-                logger.info(f"Appointment saved to Firebase: {appointment_id}")
+                firebase_set(f'appointments/{appointment_id}', appointment)
+                if dashboard_metrics is not None:
+                    dashboard_metrics.record_appointment(
+                        appointment['status'], user_key(user_info.get('email'), user_info.get('phone'))
+                    )
+                logger.info(f"Appointment queued for Firebase: {appointment_id}")
             except Exception as e:
                 logger.warning(f"Failed to save appointment to RTDB: {e}")
         
@@ -457,11 +848,7 @@ def get_appointments():
             )
             appointments_list = list(snapshot.values()) if isinstance(snapshot, dict) else []
         else:
-            appointments_list = []
-            with open('appointments.csv', 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    appointments_list.append(row)
+            appointments_list = local_store.list_appointments()
         return jsonify({'appointments': appointments_list})
     except Exception as e:
         logger.error(f"Error getting appointments: {str(e)}")
@@ -476,31 +863,8 @@ def cancel_appointment():
         if not appointment_id:
             return jsonify({'error': 'Appointment ID is required'}), 400
 
-        # Read all appointments from CSV (best-effort)
-        appointments_list = []
-        try:
-            with open('appointments.csv', 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                appointments_list = list(reader)
-        except FileNotFoundError:
-            appointments_list = []
-
-        appointment_row = None
-        for row in appointments_list:
-            if row.get('id') == appointment_id:
-                row['status'] = 'cancelled'
-                appointment_row = row
-                break
-
-        # Persist back CSV file if we loaded any
-        if appointments_list:
-            with open('appointments.csv', 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(
-                    f,
-                    fieldnames=['id', 'title', 'time', 'notes', 'status', 'user_name', 'user_email', 'user_phone']
-                )
-                writer.writeheader()
-                writer.writerows(appointments_list)
+        # Record the cancellation in local storage (best-effort)
+        appointment_row = local_store.set_appointment_status(appointment_id, 'cancelled')
 
         # Update Firebase and fetch latest details
         fb_details = None
@@ -512,17 +876,22 @@ def cancel_appointment():
                     None
                 )
                 if fb_details is not None:
+                    previous_status = (fb_details.get('status') or 'pending').lower()
                     fb_details['status'] = 'cancelled'
-                    safe_firebase_operation(
-                        lambda: fb_db.reference('appointments').child(appointment_id).update({'status': 'cancelled'})
-                    )
+                    firebase_set(f'appointments/{appointment_id}/status', 'cancelled')
+                    if dashboard_metrics is not None:
+                        dashboard_metrics.record_status_change(previous_status, 'cancelled')
                     logger.info(f"Appointment cancelled in Firebase: {appointment_id}")
             except Exception as e:
                 logger.warning(f"Failed to update appointment in RTDB: {e}")
 
-        # Prefer Firebase details, else CSV row, else minimal
+        # Prefer Firebase details, else the local row, else minimal
         result_appt = fb_details or appointment_row or {'id': appointment_id, 'status': 'cancelled'}
 
+        # Free the slot so it can be booked again
+        if slot_reservations is not None and result_appt.get('time'):
+            safe_firebase_operation(lambda: slot_reservations.release(result_appt['time'], appointment_id))
+
         return jsonify({
             'message': 'Appointment cancelled successfully',
             'appointment_id': appointment_id,
@@ -533,56 +902,131 @@ def cancel_appointment():
         logger.error(f"Error cancelling appointment: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+VOICE = 'Polly.Amy'
+# Twilio waits on every webhook; answer within this many seconds and keep the caller company otherwise
+VOICE_LATENCY_BUDGET = float(os.getenv('VOICE_LATENCY_BUDGET', '2.5'))
+VOICE_MAX_POLLS = int(os.getenv('VOICE_MAX_POLLS', '4'))
+VOICE_RENDER_MARGIN = 0.2  # left for rendering and sending the TwiML
+VOICE_FILLERS = [
+    'One moment while I look that up.',
+    'Thanks for waiting, I am still checking.',
+    'Almost there, just a moment more.'
+]
+
+VoiceTwiml = namedtuple('VoiceTwiml', 'greeting retry follow_up')
+
+def build_voice_twiml():
+    """Static TwiML, rendered once on the first voice webhook"""
+    from twilio.twiml.voice_response import VoiceResponse, Gather
+
+    greeting = VoiceResponse()
+    gather = Gather(input='speech', action='/handle-voice-input', method='POST')
+    gather.say('Welcome to IM Solutions. How can I help you today?', voice=VOICE)
+    greeting.append(gather)
+    # If the user doesn't say anything, repeat the prompt
+    greeting.say('I didn\'t catch that. Please try again.', voice=VOICE)
+    greeting.redirect('/voice')
+
+    retry = VoiceResponse()
+    retry.say('I didn\'t catch that. Please try again.', voice=VOICE)
+    retry.redirect('/voice')
+
+    follow_up = Gather(input='speech', action='/handle-voice-input', method='POST')
+    follow_up.say('Is there anything else I can help you with?', voice=VOICE)
+    return VoiceTwiml(str(greeting), str(retry), follow_up.to_xml(xml_declaration=False))
+
+services.register('voice_twiml', build_voice_twiml)
+voice_twiml = services.proxy('voice_twiml')
+TWIML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>'
+
+voice_turns = VoiceTurns(get_chatgpt_response, max_workers=int(os.getenv('VOICE_WORKERS', '8')))
+voice_turn_latency = LatencyRecorder()
+voice_webhook_latency = LatencyRecorder()
+
+def voice_answer_twiml(call_sid, question, answer, turn_started, webhook_started):
+    """Speak the answer, record the exchange and latencies, then ask if there is anything else"""
+    record_call_exchange(call_sid, question, answer)
+    voice_turn_latency.record(time.time() - turn_started)
+    voice_webhook_latency.record(time.time() - webhook_started, VOICE_LATENCY_BUDGET)
+    return f'{TWIML_HEADER}<Response><Say voice="{VOICE}">{escape(answer)}</Say>{voice_twiml.follow_up}</Response>'
+
+def voice_hold_twiml(turn_id, question, attempt, turn_started, webhook_started):
+    """Filler prompt plus a redirect that polls for the background answer"""
+    voice_webhook_latency.record(time.time() - webhook_started, VOICE_LATENCY_BUDGET)
+    filler = VOICE_FILLERS[min(attempt - 1, len(VOICE_FILLERS) - 1)]
+    url = '/voice-result?' + urlencode({'turn': turn_id, 'attempt': attempt, 't': f'{turn_started:.3f}', 'q': question})
+    return (f'{TWIML_HEADER}<Response><Say voice="{VOICE}">{escape(filler)}</Say>'
+            f'<Redirect method="POST">{escape(url)}</Redirect></Response>')
+
+def record_call_exchange(call_sid, user_text, bot_text):
+    """Store a voice exchange for the call summary"""
+    try:
+        call_store.add(call_sid, user_text, bot_text)
+    except Exception as e:
+        logger.error(f"Failed to record call exchange for {call_sid}: {e}")
+
 @app.route('/voice', methods=['POST'])
 def voice():
     """Handle incoming voice calls"""
-    response = VoiceResponse()
-    
-    # Get the user's input from the call
-    gather = Gather(input='speech', action='/handle-voice-input', method='POST')
-    gather.say('Welcome to IM Solutions. How can I help you today?', voice='Polly.Amy')
-    response.append(gather)
-    
-    # If the user doesn't say anything, repeat the prompt
-    response.say('I didn\'t catch that. Please try again.', voice='Polly.Amy')
-    response.redirect('/voice')
-    
-    return str(response)
+    return voice_twiml.greeting
 
 @app.route('/handle-voice-input', methods=['POST'])
 def handle_voice_input():
-    """Process voice input and respond"""
-    response = VoiceResponse()
+    """Process voice input and respond within VOICE_LATENCY_BUDGET"""
+    started = time.time()
     
     # Get the transcribed speech from the call
     speech_result = request.values.get('SpeechResult', '')
     call_sid = request.values.get('CallSid', '')
     
-    if speech_result:
-        # Get response from the chatbot
-        bot_response = get_chatgpt_response(speech_result)
-        
-        # Store the conversation for summary
-        if call_sid not in call_summaries:
-            call_summaries[call_sid] = []
-        call_summaries[call_sid].append({
-            'user': speech_result,
-            'bot': bot_response,
-            'timestamp': datetime.now().isoformat()
-        })
-        
-        # Convert the response to speech
-        response.say(bot_response, voice='Polly.Amy')
-        
-        # Ask if there's anything else
-        gather = Gather(input='speech', action='/handle-voice-input', method='POST')
-        gather.say('Is there anything else I can help you with?', voice='Polly.Amy')
-        response.append(gather)
+    if not speech_result:
+        return voice_twiml.retry
+
+    # Canned and cached answers are immediate; anything else runs in the background
+    ready_response = get_ready_response(speech_result)
+    if ready_response:
+        return voice_answer_twiml(call_sid, speech_result, ready_response, started, started)
+
+    turn_id = voice_turns.start(speech_result)
+    done, bot_response = voice_turns.wait(turn_id, VOICE_LATENCY_BUDGET - VOICE_RENDER_MARGIN - (time.time() - started))
+    if done:
+        return voice_answer_twiml(call_sid, speech_result, bot_response, started, started)
+    return voice_hold_twiml(turn_id, speech_result, 1, started, started)
+
+@app.route('/voice-result', methods=['POST'])
+def voice_result():
+    """Poll for a voice answer that missed the latency budget"""
+    started = time.time()
+    call_sid = request.values.get('CallSid', '')
+    turn_id = request.args.get('turn', '')
+    question = request.args.get('q', '')
+    try:
+        attempt = int(request.args.get('attempt', '1'))
+        turn_started = float(request.args.get('t', started))
+    except ValueError:
+        attempt, turn_started = VOICE_MAX_POLLS, started
+
+    if turn_id in voice_turns:
+        done, bot_response = voice_turns.wait(turn_id, VOICE_LATENCY_BUDGET - VOICE_RENDER_MARGIN)
     else:
-        response.say('I didn\'t catch that. Please try again.', voice='Polly.Amy')
-        response.redirect('/voice')
-    
-    return str(response)
+        # The turn runs in another worker; its answer lands in the shared response cache
+        bot_response = get_ready_response(question) if question else None
+        done = bot_response is not None
+
+    if done:
+        return voice_answer_twiml(call_sid, question, bot_response, turn_started, started)
+    if attempt >= VOICE_MAX_POLLS or not question:
+        return voice_answer_twiml(call_sid, question, slow_reply(question), turn_started, started)
+    return voice_hold_twiml(turn_id, question, attempt + 1, turn_started, started)
+
+@app.route('/voice_stats', methods=['GET'])
+def voice_stats():
+    """Per-turn and per-webhook voice latency percentiles (seconds)"""
+    return jsonify({
+        'budget': VOICE_LATENCY_BUDGET,
+        'turn': voice_turn_latency.stats(),
+        'webhook': voice_webhook_latency.stats()
+    })
 
 @app.route('/call-completed', methods=['POST'])
 def call_completed():
@@ -592,20 +1036,10 @@ def call_completed():
         duration = request.values.get('CallDuration')
         phone_number = request.values.get('To')
         
-        if call_sid in call_summaries:
-            # Generate summary of the conversation
-            conversation = call_summaries[call_sid]
-            summary = "Call Summary:\n"
-            for exchange in conversation:
-                summary += f"User: {exchange['user']}\n"
-                summary += f"Bot: {exchange['bot']}\n"
-                summary += f"Time: {exchange['timestamp']}\n\n"
-            
+        conversation = call_store.complete(call_sid) if call_sid else None
+        if conversation:
             # Save to Google Sheets
-            save_call_summary(call_sid, phone_number, duration, summary)
-            
-            # Clean up
-            del call_summaries[call_sid]
+            save_call_summary(call_sid, phone_number, duration, format_call_summary(conversation))
         
         return '', 200
     except Exception as e:
@@ -665,10 +1099,11 @@ def test_sheets_connection():
         service = get_google_sheets_service()
         
         # Try to read the first row of the sheet
-        result = service.spreadsheets().values().get(
-            spreadsheetId=SPREADSHEET_ID,
-            range='Calls!A1:E1'
-        ).execute()
+        with app_metrics.span('sheets.get'):
+            result = service.spreadsheets().values().get(
+                spreadsheetId=SPREADSHEET_ID,
+                range='Calls!A1:E1'
+            ).execute()
         
         # Try to write a test row
         test_values = [[
@@ -683,12 +1118,13 @@ def test_sheets_connection():
             'values': test_values
         }
         
-        write_result = service.spreadsheets().values().append(
-            spreadsheetId=SPREADSHEET_ID,
-            range=RANGE_NAME,
-            valueInputOption='RAW',
-            body=body
-        ).execute()
+        with app_metrics.span('sheets.append'):
+            write_result = service.spreadsheets().values().append(
+                spreadsheetId=SPREADSHEET_ID,
+                range=RANGE_NAME,
+                valueInputOption='RAW',
+                body=body
+            ).execute()
         
         return jsonify({
             'success': True,
@@ -706,7 +1142,7 @@ def test_sheets_connection():
 @app.route('/create_lead', methods=['POST'])
 def create_lead():
     try:
-        if not rtdb_available:
+        if not rtdb_available and not local_store.supports_queries:
             return jsonify({'success': False, 'message': 'Leads storage is not configured (Realtime Database is unavailable).'}), 503
 
         data = request.json or {}
@@ -730,9 +1166,10 @@ def create_lead():
             'created_at': now_ts
         }
 
-        safe_firebase_operation(
-            lambda: fb_db.reference('leads').child(lead_id).set(lead_data)
-        )
+        local_store.add_lead(lead_data)
+        firebase_set(f'leads/{lead_id}', lead_data)
+        if dashboard_metrics is not None:
+            dashboard_metrics.record_lead(now_ts, user_key(email, phone))
 
         return jsonify({'success': True, 'message': 'Lead submitted successfully', 'lead_id': lead_id})
     except Exception as e:
@@ -746,284 +1183,658 @@ def safe_firebase_operation(operation, default_value=None):
         return default_value
     
     try:
-        return operation()
+        with app_metrics.span('firebase'):
+            return operation()
     except Exception as e:
         logger.warning(f"Firebase operation failed: {e}")
         return default_value
 
-@app.route('/dashboard', methods=['GET'])
+def firebase_set(path, value):
+    """Write value at path, through the write-behind queue when it is running"""
+    if not rtdb_available:
+        return
+    if firebase_writer is not None:
+        with app_metrics.span('firebase.enqueue'):
+            firebase_writer.enqueue(path, value)
+    else:
+        safe_firebase_operation(lambda: fb_db.reference(path).set(value))
+
+DASHBOARD_PAGE_SIZE = int(os.getenv('DASHBOARD_PAGE_SIZE', '50'))
+DASHBOARD_MAX_PAGE_SIZE = 500
+
+# Collection -> (child ordered on, record type). '$key' orders by push id.
+DASHBOARD_COLLECTIONS = {
+    'leads': ('created_at', Lead),
+    'appointments': ('time', Appointment),
+    'conversations': ('timestamp', Conversation),
+    'users': ('$key', FormUser)
+}
+
+def encode_cursor(value, key):
+    raw = json.dumps([value, key]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_cursor(cursor):
+    try:
+        value, key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        return value, key
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def fetch_page(collection, limit=DASHBOARD_PAGE_SIZE, cursor=None):
+    """Newest-first page of a collection, from the RTDB mirror or an ordered, limited RTDB query
+
+    Returns (items, next_cursor); next_cursor is None on the last page.
+    """
+    order_by, record_type = DASHBOARD_COLLECTIONS[collection]
+    before = decode_cursor(cursor) if cursor else None
+    if mirror_ready(collection):
+        records, next_before = rtdb_mirror.page(collection, order_by, limit, before, rank=record_type.rank)
+        next_cursor = encode_cursor(*next_before) if next_before else None
+        return to_dicts(record_type, records), next_cursor
+
+    def _query():
+        ref = fb_db.reference(collection)
+        query = ref.order_by_key() if order_by == '$key' else ref.order_by_child(order_by)
+        if before is not None:
+            query = query.end_at(before[1] if order_by == '$key' else before[0])
+        # One extra record tells us whether an older page exists; the cursor record itself may come back too
+        return query.limit_to_last(limit + 2 if before else limit + 1).get()
+
+    snapshot = safe_firebase_operation(_query, {}) or {}
+    records = []
+    for key, d in reversed(list(snapshot.items())):
+        if not isinstance(d, dict):
+            continue
+        value = key if order_by == '$key' else d.get(order_by)
+        # end_at() is inclusive: skip the cursor record and ties already shown on earlier pages
+        if before is not None and value == before[0] and key >= before[1]:
+            continue
+        records.append((value, key, d))
+
+    page = records[:limit]
+    next_cursor = None
+    if len(records) > limit and page:
+        value, key, _ = page[-1]
+        next_cursor = encode_cursor(value, key)
+    return to_dicts(record_type, [(key, d) for _, key, d in page]), next_cursor
+
+def fetch_local_page(collection, limit=DASHBOARD_PAGE_SIZE, cursor=None):
+    """Newest-first page from local storage, used when RTDB is unavailable"""
+    _, record_type = DASHBOARD_COLLECTIONS[collection]
+    before = decode_cursor(cursor) if cursor else None
+    records, next_before = local_store.page(collection, limit, before)
+    next_cursor = encode_cursor(*next_before) if next_before else None
+    return to_dicts(record_type, records), next_cursor
+
+def mirror_ready(collection=None):
+    """True when dashboard reads of collection (or of all of them) can be served from the RTDB mirror"""
+    if rtdb_mirror is None:
+        return False
+    try:
+        services.get('rtdb_mirror')
+    except Exception as e:
+        logger.warning(f"RTDB mirror unavailable: {e}")
+        return False
+    return rtdb_mirror.ready(collection)
+
+def upcoming_epoch(d):
+    """Slot time (epoch seconds) of an appointment that can be upcoming, None if cancelled or unparseable"""
+    if not isinstance(d, dict) or (d.get('status') or 'pending').lower() == 'cancelled':
+        return None
+    return parse_time(d.get('time') or '')[1]
+
+def count_upcoming(appointment_records, now):
+    """Appointments after now (epoch seconds) that are not cancelled"""
+    upcoming = 0
+    for d in appointment_records:
+        epoch = upcoming_epoch(d)
+        if epoch is not None and epoch > now:
+            upcoming += 1
+    return upcoming
+
+def count_children(path):
+    """Number of direct children at path, fetched with a shallow read (keys only)"""
+    snapshot = safe_firebase_operation(lambda: fb_db.reference(path).get(shallow=True), {})
+    return len(snapshot) if isinstance(snapshot, dict) else 0
+
+@app.route('/api/dashboard/<collection>', methods=['GET'])
 @login_required
-def dashboard():
+def dashboard_page(collection):
+    """JSON page of dashboard records; pass the returned next_cursor to get the next (older) page"""
+    if collection not in DASHBOARD_COLLECTIONS:
+        return jsonify({'error': f'Unknown collection: {collection}'}), 404
     try:
-        error_message = None
-        leads = []
-        appointments_view = []
-        conversations = []
-        users = []
-        metrics = {
-            'totalLeads': 0,
-            'leadsToday': 0,
-            'totalAppointments': 0,
-            'upcomingAppointments': 0,
-            'totalConversations': 0,
-            'totalUsers': 0
-        }
-        leads_day_counts = defaultdict(int)
-        appt_status_counts = Counter()
-
-        if not rtdb_available:
-            error_message = 'Realtime Database is not configured on the server. Upload credentials and restart the app.'
+        limit = min(max(int(request.args.get('limit', DASHBOARD_PAGE_SIZE)), 1), DASHBOARD_MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    cursor = request.args.get('cursor') or None
+    try:
+        if rtdb_available:
+            items, next_cursor = fetch_page(collection, limit, cursor)
         else:
-            # Load leads
-            leads_snapshot = safe_firebase_operation(
-                lambda: fb_db.reference('leads').get(),
-                {}
-            )
-            
-            for key, d in leads_snapshot.items():
-                created_ms = d.get('created_at') or 0
-                try:
-                    created_dt = datetime.fromtimestamp(created_ms / 1000)
-                    created_iso = created_dt.isoformat()
-                    leads_day_counts[created_dt.strftime('%Y-%m-%d')] += 1
-                except Exception:
-                    created_dt = None
-                    created_iso = str(created_ms)
-                leads.append({
-                    'id': d.get('id', key),
-                    'name': d.get('name', ''),
-                    'email': d.get('email', ''),
-                    'phone': d.get('phone', ''),
-                    'message': d.get('message', ''),
-                    'source': d.get('source', ''),
-                    'created_at': created_iso
-                })
+            items, next_cursor = fetch_local_page(collection, limit, cursor)
+        return jsonify({'items': items, 'next_cursor': next_cursor})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error loading dashboard page for {collection}: {str(e)}")
+        return jsonify({'error': str(e)}), 500
 
-            # Load appointments
-            appointments_snapshot = safe_firebase_operation(
-                lambda: fb_db.reference('appointments').get(),
-                {}
-            )
-            
-            for key, d in appointments_snapshot.items():
-                time_str = d.get('time', '')
-                try:
-                    time_dt = datetime.fromisoformat(time_str.replace('Z', '+00:00'))
-                    time_iso = time_dt.isoformat()
-                except Exception:
-                    time_dt = None
-                    time_iso = time_str
-                status = (d.get('status') or 'pending').lower()
-                
-                # Extract user information properly
-                user_data = d.get('user', {})
-                if not user_data:
-                    # Fallback to flat fields if user object doesn't exist
-                    user_data = {
-                        'name': d.get('user_name', ''),
-                        'email': d.get('user_email', ''),
-                        'phone': d.get('user_phone', ''),
-                        'company': d.get('user_company', '')
-                    }
-                
-                # Ensure user data has proper structure
-                if isinstance(user_data, dict):
-                    user_info = {
-                        'name': user_data.get('name', 'Anonymous User'),
-                        'email': user_data.get('email', ''),
-                        'phone': user_data.get('phone', ''),
-                        'company': user_data.get('company', '')
-                    }
-                else:
-                    user_info = {
-                        'name': 'Anonymous User',
-                        'email': '',
-                        'phone': '',
-                        'company': ''
-                    }
-                
-                # If user name is still empty, provide a meaningful default
-                if not user_info['name'] or user_info['name'] == 'Anonymous':
-                    user_info['name'] = 'Anonymous User'
-                
-                # Log the user info for debugging
-                logger.debug(f"Appointment {d.get('id', key)} user info: {user_info}")
-                
-                appointments_view.append({
-                    'id': d.get('id', key),
-                    'title': d.get('title', ''),
-                    'time': time_iso,
-                    'notes': d.get('notes', ''),
-                    'status': status,
-                    'user': user_info
-                })
-                appt_status_counts[status] += 1
-                try:
-                    if status != 'cancelled' and time_dt and time_dt > datetime.utcnow():
-                        metrics['upcomingAppointments'] += 1
-                except Exception:
-                    pass
-
-            # Load conversations and extract user details
-            conversations_snapshot = safe_firebase_operation(
-                lambda: fb_db.reference('conversations').get(),
-                {}
-            )
-            
-            user_sessions = {}  # Track users by session_id
-            
-            for key, d in conversations_snapshot.items():
-                timestamp_ms = d.get('timestamp') or 0
-                try:
-                    timestamp_iso = datetime.fromtimestamp(timestamp_ms / 1000).isoformat()
-                except Exception:
-                    timestamp_iso = str(timestamp_ms)
-                
-                user_details = d.get('user_details', {})
-                session_id = d.get('session_id', 'default')
-                
-                conversations.append({
-                    'id': d.get('id', key),
-                    'user_message': d.get('user_message', ''),
-                    'bot_response': d.get('bot_response', ''),
-                    'timestamp': timestamp_iso,
-                    'session_id': session_id,
-                    'user_details': user_details
-                })
-                
-                # Track unique users by session
-                if session_id not in user_sessions:
-                    user_sessions[session_id] = {
-                        'name': user_details.get('name', 'Anonymous'),
-                        'email': user_details.get('email', ''),
-                        'phone': user_details.get('phone', ''),
-                        'first_seen': timestamp_iso,
-                        'last_seen': timestamp_iso,
-                        'session_id': session_id,
-                        'conversation_count': 1
-                    }
-                else:
-                    user_sessions[session_id]['last_seen'] = timestamp_iso
-                    user_sessions[session_id]['conversation_count'] += 1
-            
-            # Convert user sessions to list
-            users = list(user_sessions.values())
-
-            # Build a unified unique-user set from sessions and from 'users' node (chatbot form)
-            unique_keys = set()
-            def _key_from(u):
-                for k in [u.get('email'), u.get('phone'), u.get('session_id')]:
-                    if k:
-                        return k
-                return None
-
-            for u in users:
-                k = _key_from(u)
-                if k:
-                    unique_keys.add(k)
-
-            # Pull users captured via chatbot form and merge
-            try:
-                form_users_snapshot = safe_firebase_operation(
-                    lambda: fb_db.reference('users').get(),
-                    {}
-                )
-                if isinstance(form_users_snapshot, dict) and form_users_snapshot:
-                    for key2, u2 in form_users_snapshot.items():
-                        k2 = None
-                        for k in [u2.get('email'), u2.get('phone')]:
-                            if k:
-                                k2 = k
-                                break
-                        if k2:
-                            unique_keys.add(k2)
-                else:
-                    # Fallback to local users_data.json to keep metrics in sync with table
-                    try:
-                        if os.path.exists('users_data.json'):
-                            with open('users_data.json', 'r', encoding='utf-8') as f:
-                                for line in f:
-                                    if not line.strip():
-                                        continue
-                                    u2 = json.loads(line.strip())
-                                    k2 = None
-                                    for k in [u2.get('email'), u2.get('phone')]:
-                                        if k:
-                                            k2 = k
-                                            break
-                                    if k2:
-                                        unique_keys.add(k2)
-                    except Exception:
-                        pass
-            except Exception:
-                pass
+def iter_local_records(collection, batch=1000):
+    """Every (key, record) of a collection in local storage, newest first, a page at a time"""
+    before = None
+    while True:
+        records, before = local_store.page(collection, batch, before)
+        yield from records
+        if before is None:
+            return
+
+def load_analytics_snapshot():
+    """Full leads, appointments and conversations: from the mirror, else RTDB, else local storage"""
+    snapshot = {}
+    for collection in ('leads', 'appointments', 'conversations'):
+        if mirror_ready(collection):
+            snapshot[collection] = rtdb_mirror.snapshot(collection)
+        elif rtdb_available:
+            snapshot[collection] = safe_firebase_operation(lambda: fb_db.reference(collection).get(), {}) or {}
+        else:
+            snapshot[collection] = dict(iter_local_records(collection))
+    return snapshot
+
+def create_analytics():
+    # NumPy is only imported once analytics are first requested
+    from analytics import AnalyticsEngine
+    return AnalyticsEngine(load_analytics_snapshot, dashboard_version, ttl=PAGE_CACHE_TTL)
+
+services.register('analytics', create_analytics)
+
+def time_arg(name):
+    """Epoch seconds of an ISO-8601 query parameter (UTC unless it has an offset), or None if absent"""
+    value = request.args.get(name)
+    if not value:
+        return None
+    epoch = parse_time(value)[1]
+    if epoch is None:
+        raise ValueError(f'{name} must be an ISO-8601 date or time')
+    return epoch
+
+def analytics_range(default_days):
+    """(start, end, tz_offset) in seconds from the start, end and tz_offset (minutes east of UTC) query parameters"""
+    try:
+        tz_offset = int(request.args.get('tz_offset', '0')) * 60
+    except ValueError:
+        raise ValueError('tz_offset must be an integer number of minutes')
+    # Default to the current minute so repeated requests share cached results
+    end = time_arg('end') or (int(time.time()) // 60 + 1) * 60
+    start = time_arg('start') or end - default_days * 86400
+    return start, end, tz_offset
+
+def analytics_response(compute):
+    """Run an analytics query, mapping bad parameters to 400 and missing NumPy to 503"""
+    try:
+        return jsonify(compute(services.get('analytics')))
+    except ImportError as e:
+        logger.warning(f"Analytics unavailable: {e}")
+        return jsonify({'error': 'Analytics need NumPy installed on the server.'}), 503
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error computing analytics: {str(e)}")
+        return jsonify({'error': str(e)}), 500
 
-            metrics['totalUsers'] = len(unique_keys)
+@app.route('/api/analytics/series', methods=['GET'])
+@login_required
+def analytics_series():
+    """Counts of leads, appointments or conversations per hour, day or week"""
+    collection = request.args.get('collection', 'leads')
+    if collection not in ('leads', 'appointments', 'conversations'):
+        return jsonify({'error': f'Unknown collection: {collection}'}), 404
+    bucket = request.args.get('bucket', 'day')
+
+    def compute(engine):
+        start, end, tz_offset = analytics_range(30 if bucket != 'hour' else 2)
+        return engine.series(collection, bucket, start, end, tz_offset)
+    return analytics_response(compute)
+
+@app.route('/api/analytics/funnel', methods=['GET'])
+@login_required
+def analytics_funnel():
+    """Conversation -> lead -> appointment conversion over a date range"""
+    def compute(engine):
+        start, end, _ = analytics_range(30)
+        return engine.funnel(start, end)
+    return analytics_response(compute)
+
+@app.route('/api/analytics/heatmap', methods=['GET'])
+@login_required
+def analytics_heatmap():
+    """Booked appointment slots by weekday and hour"""
+    def compute(engine):
+        start, end, tz_offset = analytics_range(90)
+        return engine.heatmap(start, end, tz_offset)
+    return analytics_response(compute)
+
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '1000'))
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', '500'))
+EXPORT_FORMATS = {'csv': 'text/csv', 'jsonl': 'application/jsonl', 'ndjson': 'application/x-ndjson'}
+IMPORT_MAX_ERRORS = 20
+
+def iter_rtdb_records(collection, batch=EXPORT_BATCH_SIZE):
+    """Every (key, record) of an RTDB collection in key order, read batch records at a time"""
+    last_key = None
+    while True:
+        def _query():
+            query = fb_db.reference(collection).order_by_key()
+            if last_key is not None:
+                query = query.start_at(last_key)
+            return query.limit_to_first(batch + 1).get()
+
+        snapshot = safe_firebase_operation(_query, None)
+        if snapshot is None:
+            logger.error(f"Export of {collection} stopped: the Realtime Database read failed")
+            return
+        for key, d in snapshot.items():
+            # start_at() is inclusive: the page starts with the last key already read
+            if last_key is not None and key <= last_key:
+                continue
+            last_key = key
+            if isinstance(d, dict):
+                yield key, d
+        if len(snapshot) <= batch:
+            return
+
+def iter_rtdb_range(collection, start, end, batch=EXPORT_BATCH_SIZE):
+    """(key, record) pairs of an RTDB collection whose time child lies in the stored form of [start, end)
+
+    Pages on the child value. start_at() takes no key to break ties with, so each page
+    re-reads the records already yielded at the last value and asks for that many more.
+    """
+    field, low, high = bulk_io.stored_range(collection, start, end)
+    seen = set()  # keys already yielded at low
+    while True:
+        limit = batch + len(seen) + 1
+
+        def _query():
+            query = fb_db.reference(collection).order_by_child(field)
+            if low is not None:
+                query = query.start_at(low)
+            if high is not None:
+                query = query.end_at(high)
+            return query.limit_to_first(limit).get()
+
+        snapshot = safe_firebase_operation(_query, None)
+        if snapshot is None:
+            logger.error(f"Export of {collection} stopped: the Realtime Database read failed")
+            return
+        for key, d in snapshot.items():
+            if key in seen:
+                continue
+            value = d.get(field) if isinstance(d, dict) else None
+            if value != low:
+                low, seen = value, set()
+            seen.add(key)
+            if isinstance(d, dict):
+                yield key, d
+        if len(snapshot) < limit:
+            return
+
+def export_records(collection, start=None, end=None):
+    """(key, record) pairs in [start, end) from the mirror, else RTDB, else local storage
+
+    RTDB exports with a range read only that range, paging on the collection's time child.
+    """
+    if mirror_ready(collection):
+        records = rtdb_mirror.snapshot(collection).items()
+    elif rtdb_available and (start is not None or end is not None):
+        records = iter_rtdb_range(collection, start, end)
+    elif rtdb_available:
+        records = iter_rtdb_records(collection)
+    else:
+        records = iter_local_records(collection, EXPORT_BATCH_SIZE)
+    for key, d in records:
+        if isinstance(d, dict) and bulk_io.in_range(collection, d, start, end):
+            yield key, d
 
+@app.route('/api/export/<collection>', methods=['GET'])
+@login_required
+def export_collection(collection):
+    """Stream a collection as CSV, JSONL or NDJSON, optionally limited to a start/end range"""
+    if collection not in DASHBOARD_COLLECTIONS:
+        return jsonify({'error': f'Unknown collection: {collection}'}), 404
+    fmt = request.args.get('format', 'csv').lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    try:
+        start, end = time_arg('start'), time_arg('end')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    records = export_records(collection, start, end)
+    body = bulk_io.stream_csv(collection, records) if fmt == 'csv' else bulk_io.stream_jsonl(records)
+    return Response(
+        stream_with_context(body),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename={collection}.{fmt}', 'Cache-Control': 'no-store'}
+    )
+
+def book_imported_appointment(key, record):
+    """Store an imported appointment through the booking path: slot lock, conflict check and slots/ reservation
+
+    Raises ValueError if the slot is held by another appointment. Cancelled
+    appointments hold no slot and are stored as they are.
+    """
+    row = bulk_io.flatten('appointments', key, record)
+    if (row.get('status') or '').lower() == 'cancelled':
+        local_store.add_appointment(row)
+        return
+    try:
+        appointment_time = datetime.fromisoformat(str(row.get('time') or '').replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f"time {row.get('time')!r} must be an ISO-8601 date and time")
+    with slot_locks.hold(appointment_time):
+        # Re-importing an appointment over itself is not a conflict
+        existing = local_store.find_appointment_conflict(appointment_time)
+        holder = existing.get('id') if existing else key
+        if holder == key and slot_reservations is not None:
+            holder = safe_firebase_operation(lambda: slot_reservations.reserve(appointment_time, key), key)
+        if holder != key:
+            raise ValueError(f"time slot {row['time']} is already booked by appointment {holder}")
         try:
-            leads.sort(key=lambda x: x.get('created_at') or '', reverse=True)
-        except Exception:
-            pass
-        try:
-            appointments_view.sort(key=lambda x: x.get('time') or '', reverse=True)
-        except Exception:
-            pass
-        try:
-            conversations.sort(key=lambda x: x.get('timestamp') or '', reverse=True)
-        except Exception:
-            pass
-
-        # Metrics summary
-        metrics['totalLeads'] = len(leads)
-        metrics['totalAppointments'] = len(appointments_view)
-        metrics['totalConversations'] = len(conversations)
-        if metrics.get('totalUsers', 0) == 0:
-            metrics['totalUsers'] = len(users)
-        try:
-            metrics['leadsToday'] = leads_day_counts.get(datetime.utcnow().strftime('%Y-%m-%d'), 0)
+            local_store.add_appointment(row)
         except Exception:
-            metrics['leadsToday'] = 0
+            if slot_reservations is not None:
+                safe_firebase_operation(lambda: slot_reservations.release(appointment_time, key))
+            raise
+
+def write_import_batch(collection, batch):
+    """Write (key, record) pairs to local storage and as one multi-path RTDB update; returns RTDB success"""
+    # Appointments were stored one at a time by book_imported_appointment
+    if collection != 'appointments':
+        local_store.bulk_insert(collection, [dict(d, id=key) if collection == 'users' else d for key, d in batch])
+    if not rtdb_available:
+        return True
+
+    def _update():
+        fb_db.reference().update({f'{collection}/{key}': d for key, d in batch})
+        return True
+    return safe_firebase_operation(_update, False)
+
+@app.route('/api/import/<collection>', methods=['POST'])
+@login_required
+def import_collection(collection):
+    """Bulk-load CSV or JSON lines (as exported) into local storage and RTDB in batches"""
+    if collection not in DASHBOARD_COLLECTIONS:
+        return jsonify({'error': f'Unknown collection: {collection}'}), 404
+    if not rtdb_available and not local_store.supports_queries and collection in ('leads', 'conversations'):
+        return jsonify({'success': False, 'message': f'{collection.capitalize()} storage is not configured (Realtime Database is unavailable).'}), 503
+    fmt = (request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'jsonl')).lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    try:
+        # The body is read a line at a time, never held whole
+        lines = (line.decode('utf-8-sig') for line in request.stream)
+        rows = bulk_io.read_csv(collection, lines) if fmt == 'csv' else bulk_io.read_jsonl(lines)
+        result = {'imported': 0, 'rejected': 0, 'errors': [], 'firebase_failed': 0}
 
-        # Build charts data (use weekday labels)
+        def valid_records():
+            for line, record in rows:
+                try:
+                    if isinstance(record, Exception):
+                        raise record
+                    key = bulk_io.import_key(collection, record)
+                    if collection == 'appointments':
+                        book_imported_appointment(key, record)
+                    yield key, record
+                except ValueError as e:
+                    result['rejected'] += 1
+                    if len(result['errors']) < IMPORT_MAX_ERRORS:
+                        result['errors'].append({'line': line, 'error': str(e)})
+
+        for batch in bulk_io.batched(valid_records(), IMPORT_BATCH_SIZE):
+            if not write_import_batch(collection, batch):
+                result['firebase_failed'] += len(batch)
+            result['imported'] += len(batch)
+        if result['imported'] and dashboard_metrics is not None:
+            # Imports bypass the write-time hooks, so the counters are recomputed once at the end
+            result['metrics_rebuilt'] = safe_firebase_operation(lambda: bool(rebuild_dashboard_metrics()), False)
+        logger.info(f"Imported {result['imported']} {collection} ({result['rejected']} rejected)")
+        return jsonify(dict(result, success=True))
+    except UnicodeDecodeError:
+        return jsonify({'success': False, 'message': 'The upload must be UTF-8 text.'}), 400
+    except Exception as e:
+        logger.error(f"Error importing {collection}: {str(e)}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+def dashboard_change(change):
+    """Event payload for a mirrored record: its table row (None once deleted) and the new totals"""
+    collection, key, record = change['collection'], change['key'], change['record']
+    _, record_type = DASHBOARD_COLLECTIONS[collection]
+    return {
+        'collection': collection,
+        'id': key,
+        'created': change['created'],
+        'item': to_dicts(record_type, [(key, record)])[0] if isinstance(record, dict) else None,
+        'totals': {name: rtdb_mirror.count(name) for name in ('leads', 'appointments', 'conversations')}
+    }
+
+@app.route('/api/dashboard/events', methods=['GET'])
+@login_required
+def dashboard_events():
+    """Server-Sent Events for every dashboard record added, changed or removed in RTDB"""
+    if not mirror_ready():
+        return jsonify({'error': 'Realtime dashboard updates are unavailable.'}), 503
+    subscription = rtdb_mirror.subscribe()
+    if subscription is None:
+        return jsonify({'error': 'Too many open dashboard streams.'}), 503
+
+    def generate():
         try:
-            labels = []
-            data = []
-            today = datetime.utcnow().date()
-            for i in range(6, -1, -1):
-                day = today - timedelta(days=i)
-                k = day.strftime('%Y-%m-%d')
-                labels.append(day.strftime('%a'))
-                data.append(leads_day_counts.get(k, 0))
-            leads_chart_labels = labels
-            leads_chart_data = data
-        except Exception:
-            leads_chart_labels = []
-            leads_chart_data = []
-
-        appt_status_labels = list(appt_status_counts.keys())
-        appt_status_data = [appt_status_counts[k] for k in appt_status_labels]
-
-        return render_template(
-            'dashboard.html',
-            leads=leads,
-            appointments=appointments_view,
-            conversations=conversations,
-            users=users,
-            error_message=error_message,
-            metrics=metrics,
-            leads_chart_labels=leads_chart_labels,
-            leads_chart_data=leads_chart_data,
-            appt_status_labels=appt_status_labels,
-            appt_status_data=appt_status_data,
-            rtdb_available=rtdb_available
+            yield sse_event({'version': rtdb_mirror.version}, event='ready')
+            while True:
+                change = subscription.get(timeout=DASHBOARD_KEEPALIVE)
+                if change is None:
+                    # Comment line so proxies keep the idle connection open
+                    yield ': keepalive\n\n'
+                elif change.get('collection') not in (None, *DASHBOARD_COLLECTIONS):
+                    # metrics/ is mirrored for the counters, not shown as a table
+                    continue
+                elif change['type'] == 'reset':
+                    yield sse_event({'collection': change.get('collection')}, event='reset')
+                else:
+                    yield sse_event(dashboard_change(change), event='change')
+        finally:
+            subscription.close()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def rebuild_dashboard_metrics():
+    """Recompute metrics/ from full RTDB reads once pending write-time updates have been applied"""
+    dashboard_metrics.flush()
+    return dashboard_metrics.rebuild(
+        fb_db.reference('leads').get(),
+        fb_db.reference('appointments').get(),
+        fb_db.reference('conversations').get(),
+        fb_db.reference('users').get()
+    )
+
+@app.route('/api/metrics/rebuild', methods=['POST'])
+@login_required
+def rebuild_metrics():
+    """Recompute the write-time dashboard metrics from a full scan (one-off backfill)"""
+    if dashboard_metrics is None:
+        return jsonify({'success': False, 'message': 'Realtime Database is unavailable.'}), 503
+    try:
+        result = rebuild_dashboard_metrics()
+        return jsonify({'success': True, 'counters': result['counters']})
+    except Exception as e:
+        logger.error(f"Error rebuilding metrics: {str(e)}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+def dashboard_version():
+    """Token that changes whenever data shown on the dashboard may have changed"""
+    return (data_version.value,
+            firebase_writer.written if firebase_writer is not None else 0,
+            dashboard_metrics.applied if dashboard_metrics is not None else 0,
+            rtdb_mirror.version if rtdb_mirror is not None else 0)
+
+def render_dashboard():
+    """Render dashboard.html with the first page of each table and the counters"""
+    error_message = None
+    leads = []
+    appointments_view = []
+    conversations = []
+    next_cursors = {}
+    metrics = {
+        'totalLeads': 0,
+        'leadsToday': 0,
+        'totalAppointments': 0,
+        'upcomingAppointments': 0,
+        'totalConversations': 0,
+        'totalUsers': 0
+    }
+    leads_day_counts = defaultdict(int)
+    appt_status_counts = Counter()
+
+    if not rtdb_available and local_store.supports_queries:
+        # Serve the dashboard from local storage with indexed queries
+        leads, next_cursors['leads'] = fetch_local_page('leads')
+        appointments_view, next_cursors['appointments'] = fetch_local_page('appointments')
+        conversations, next_cursors['conversations'] = fetch_local_page('conversations')
+        week_start = datetime.utcnow().date() - timedelta(days=7)
+        stored = local_store.metrics(
+            since_day=week_start.strftime('%Y-%m-%d'),
+            now_iso=datetime.utcnow().isoformat()
         )
+        counters = stored['counters']
+        metrics['totalLeads'] = counters['leads']
+        metrics['totalAppointments'] = counters['appointments']
+        metrics['totalConversations'] = counters['conversations']
+        metrics['totalUsers'] = counters['unique_users']
+        metrics['upcomingAppointments'] = stored['upcoming_appointments']
+        leads_day_counts.update(stored['leads_by_day'])
+        appt_status_counts.update(stored['appointment_status'])
+    elif not rtdb_available:
+        error_message = 'Realtime Database is not configured on the server. Upload credentials and restart the app.'
+    elif mirror_ready():
+        # Everything comes from the in-memory mirror, with no RTDB round trip
+        leads, next_cursors['leads'] = fetch_page('leads')
+        appointments_view, next_cursors['appointments'] = fetch_page('appointments')
+        conversations, next_cursors['conversations'] = fetch_page('conversations')
+
+        # The write-time counters come from the mirrored metrics/ node; upcoming is an index count
+        week_start = datetime.now().date() - timedelta(days=7)
+        stored = read_node(rtdb_mirror.snapshot('metrics'), since_day=week_start.strftime('%Y-%m-%d'))
+        counters = stored['counters']
+        if counters:
+            metrics['totalLeads'] = int(counters.get('leads', 0))
+            metrics['totalAppointments'] = int(counters.get('appointments', 0))
+            metrics['totalConversations'] = int(counters.get('conversations', 0))
+            metrics['totalUsers'] = int(counters.get('unique_users', 0))
+            leads_day_counts.update(stored['leads_by_day'])
+            appt_status_counts.update(stored['appointment_status'])
+        else:
+            # Metrics have not been built yet: fall back to the mirrored record counts
+            metrics['totalLeads'] = rtdb_mirror.count('leads')
+            metrics['totalAppointments'] = rtdb_mirror.count('appointments')
+            metrics['totalConversations'] = rtdb_mirror.count('conversations')
+            metrics['totalUsers'] = rtdb_mirror.count('users')
+        metrics['upcomingAppointments'] = rtdb_mirror.count_above('appointments', 'upcoming', time.time())
+    else:
+        # First page of each table; the rest is fetched lazily from /api/dashboard/<collection>
+        leads, next_cursors['leads'] = fetch_page('leads')
+        appointments_view, next_cursors['appointments'] = fetch_page('appointments')
+        conversations, next_cursors['conversations'] = fetch_page('conversations')
+
+        # Counters are maintained at write time, so this is a handful of small reads
+        week_start = datetime.now().date() - timedelta(days=7)
+        stored = safe_firebase_operation(
+            lambda: dashboard_metrics.read(since_day=week_start.strftime('%Y-%m-%d')),
+            None
+        )
+        counters = (stored or {}).get('counters')
+        if counters:
+            metrics['totalLeads'] = int(counters.get('leads', 0))
+            metrics['totalAppointments'] = int(counters.get('appointments', 0))
+            metrics['totalConversations'] = int(counters.get('conversations', 0))
+            metrics['totalUsers'] = int(counters.get('unique_users', 0))
+            leads_day_counts.update(stored['leads_by_day'])
+            appt_status_counts.update(stored['appointment_status'])
+        else:
+            # Metrics have not been built yet: fall back to shallow (keys-only) counts
+            metrics['totalLeads'] = count_children('leads')
+            metrics['totalAppointments'] = count_children('appointments')
+            metrics['totalConversations'] = count_children('conversations')
+            metrics['totalUsers'] = count_children('users')
+
+        # Only appointments from now on can be upcoming
+        now_utc = datetime.utcnow()
+        future_appointments = safe_firebase_operation(
+            lambda: fb_db.reference('appointments').order_by_child('time')
+            .start_at(now_utc.isoformat()).get(),
+            {}
+        ) or {}
+        metrics['upcomingAppointments'] = count_upcoming(future_appointments.values(), time.time())
+
+    try:
+        metrics['leadsToday'] = leads_day_counts.get(datetime.utcnow().strftime('%Y-%m-%d'), 0)
+    except Exception:
+        metrics['leadsToday'] = 0
+
+    # Build charts data (use weekday labels)
+    try:
+        labels = []
+        data = []
+        today = datetime.utcnow().date()
+        for i in range(6, -1, -1):
+            day = today - timedelta(days=i)
+            k = day.strftime('%Y-%m-%d')
+            labels.append(day.strftime('%a'))
+            data.append(leads_day_counts.get(k, 0))
+        leads_chart_labels = labels
+        leads_chart_data = data
+    except Exception:
+        leads_chart_labels = []
+        leads_chart_data = []
+
+    appt_status_labels = list(appt_status_counts.keys())
+    appt_status_data = [appt_status_counts[k] for k in appt_status_labels]
+
+    return render_template(
+        'dashboard.html',
+        leads=leads,
+        appointments=appointments_view,
+        conversations=conversations,
+        next_cursors=next_cursors,
+        error_message=error_message,
+        metrics=metrics,
+        leads_chart_labels=leads_chart_labels,
+        leads_chart_data=leads_chart_data,
+        appt_status_labels=appt_status_labels,
+        appt_status_data=appt_status_data,
+        rtdb_available=rtdb_available
+    )
+
+@app.route('/dashboard', methods=['GET'])
+@login_required
+def dashboard():
+    try:
+        # Repeat views reuse the rendered page until the data version changes
+        version = dashboard_version()
+        page = page_cache.get('dashboard', version)
+        if page is None:
+            page = page_cache.put('dashboard', version, Page(render_dashboard()))
+        return page_response(page, 'private, no-cache')
     except Exception as e:
         logger.error(f"Error loading dashboard: {str(e)}")
         return render_template('dashboard.html', 
             leads=[], 
             appointments=[], 
             conversations=[], 
-            users=[], 
+            next_cursors={},
             error_message=str(e),
             metrics={
                 'totalLeads': 0,
@@ -1085,13 +1896,14 @@ def store_user_data():
                     except Exception:
                         return 1
                 fb_db.reference('metrics/total_users').transaction(_incr_counter)
+                if dashboard_metrics is not None:
+                    dashboard_metrics.record_user(user_key(user_data['email'], user_data['phone']))
             except Exception as e:
                 logger.error(f"Failed to store user data in Firebase: {e}")
         
         # Also store locally for backup
         try:
-            with open('users_data.json', 'a') as f:
-                f.write(json.dumps(user_data) + '\n')
+            local_store.add_user(user_data)
         except Exception as e:
             logger.error(f"Failed to store user data locally: {e}")
         
@@ -1120,15 +1932,10 @@ def get_users_data():
             except Exception as e:
                 logger.error(f"Failed to get users data from Firebase: {e}")
         
-        # If no Firebase data, try local file
+        # If no Firebase data, try local storage
         if not users_data:
             try:
-                if os.path.exists('users_data.json'):
-                    with open('users_data.json', 'r') as f:
-                        for line in f:
-                            if line.strip():
-                                user_data = json.loads(line.strip())
-                                users_data.append(user_data)
+                users_data = local_store.list_users()
             except Exception as e:
                 logger.error(f"Failed to read local users data: {e}")
         
@@ -1138,6 +1945,10 @@ def get_users_data():
         logger.error(f"Error getting users data: {e}")
         return jsonify({'error': str(e)}), 500
 
+# Create the lazily loaded clients on a background thread so the first requests rarely wait for them
+SERVICES_PRELOAD = os.getenv('SERVICES_PRELOAD', 'firebase,rtdb_mirror,index_page,voice_twiml,twilio,gemini')
+services.preload([name.strip() for name in SERVICES_PRELOAD.split(',') if name.strip()])
+
 if __name__ == '__main__':
     # Create appointments directory if it doesn't exist
     os.makedirs('appointments', exist_ok=True)
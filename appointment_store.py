@@ -0,0 +1,324 @@
+import bisect
+import csv
+import io
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process locking only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+APPOINTMENT_FIELDS = ['id', 'title', 'time', 'notes', 'status', 'user_name', 'user_email', 'user_phone', 'user_company']
+
+
+def slot_key(value):
+    """Comparable slot time: naive datetime, with timezone-aware values converted to UTC"""
+    dt = value if isinstance(value, datetime) else datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def _same_booking(a, b):
+    """True if row b only changes the status of booking a"""
+    return all((a.get(field) or '') == (b.get(field) or '') for field in APPOINTMENT_FIELDS if field != 'status')
+
+
+def _render_row(row):
+    buf = io.StringIO()
+    csv.writer(buf).writerow([row.get(field, '') or '' for field in APPOINTMENT_FIELDS])
+    return buf.getvalue()
+
+
+@contextmanager
+def _exclusive(path):
+    """Cross-process exclusive lock on a sidecar file next to path"""
+    if fcntl is None:
+        yield
+        return
+    with open(path + '.lock', 'a') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class AppointmentStore:
+    """Appointments kept in appointments.csv as an append-only log, with in-memory indexes
+
+    Every booking or status change appends one row; the latest row for an id wins.
+    Older files wrote each booking once and could reuse an id, so a repeated id
+    that is not a status change of the same booking gets an id of its own on load.
+    A hash index maps id -> current row and a sorted (slot time, id) index of active
+    appointments answers conflict checks with a binary search. Rows appended by other
+    processes are picked up incrementally from the last read offset, and the log is
+    compacted once superseded rows outnumber live ones.
+    """
+
+    def __init__(self, path='appointments.csv', compact_ratio=2.0, min_compact_rows=500):
+        self.path = path
+        self.compact_ratio = compact_ratio
+        self.min_compact_rows = min_compact_rows
+        self._lock = threading.RLock()
+        self._by_id = {}
+        self._order = []  # ids in first-seen order
+        self._slots = []  # sorted (slot datetime, id) for non-cancelled appointments
+        self._log_rows = 0
+        self._offset = 0
+        self._inode = None
+        self._reused_ids = 0
+        self._file_locks = 0  # nesting depth of _file_lock in this process
+
+    @contextmanager
+    def _file_lock(self):
+        """The cross-process log lock, re-entrant within this store"""
+        with self._lock:
+            if self._file_locks:
+                self._file_locks += 1
+                try:
+                    yield
+                finally:
+                    self._file_locks -= 1
+                return
+            with _exclusive(self.path):
+                self._file_locks = 1
+                try:
+                    yield
+                finally:
+                    self._file_locks = 0
+
+    # Loading
+
+    def _reset(self):
+        self._by_id = {}
+        self._order = []
+        self._slots = []
+        self._log_rows = 0
+        self._offset = 0
+        self._inode = None
+        self._reused_ids = 0
+
+    def _load_all(self):
+        self._reset()
+        try:
+            with open(self.path, 'r', encoding='utf-8', newline='') as f:
+                header = next(csv.reader([f.readline()]), [])
+        except FileNotFoundError:
+            return
+        if header and header != APPOINTMENT_FIELDS:
+            self._migrate()
+        self._read_from(0)
+        if self._reused_ids:
+            self._migrate()
+            self._reset()
+            self._read_from(0)
+
+    def _migrate(self):
+        """Rewrite an older log with the current columns, keeping every row and giving each booking its own id
+
+        The log is read and replaced under the file lock, so rows appended by other
+        processes meanwhile are carried over; migrating an up-to-date log is a no-op rewrite.
+        """
+        with self._file_lock():
+            with open(self.path, 'r', encoding='utf-8', newline='') as f:
+                reader = csv.reader(f)
+                header = next(reader, None) or APPOINTMENT_FIELDS
+                rows = []
+                for values in reader:
+                    if not values:
+                        continue
+                    row = dict(zip(header, values))
+                    # Rows appended with more columns than the old header, e.g. user_company
+                    extra = values[len(header):]
+                    for field in [name for name in APPOINTMENT_FIELDS if name not in header]:
+                        if extra:
+                            row[field] = extra.pop(0)
+                    rows.append(row)
+            taken = {row.get('id', '') for row in rows}
+            latest = {}  # original id -> (assigned id, latest row of that booking)
+            renamed = 0
+            for row in rows:
+                original = row.get('id', '')
+                previous = latest.get(original)
+                if previous is not None and _same_booking(previous[1], row):
+                    row['id'] = previous[0]
+                elif previous is not None:
+                    n = 2
+                    while f'{original}-{n}' in taken:
+                        n += 1
+                    row['id'] = f'{original}-{n}'
+                    taken.add(row['id'])
+                    renamed += 1
+                latest[original] = (row['id'], row)
+            self._write_log(rows)
+            logger.info(f"Migrated {self.path} to columns {APPOINTMENT_FIELDS}, {renamed} reused ids renamed")
+
+    def _read_from(self, offset):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self._reset()
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        # Only consume complete lines; a concurrent writer may be mid-row
+        end = data.rfind(b'\n') + 1
+        chunk = data[:end].decode('utf-8')
+        self._inode = st.st_ino
+        self._offset = offset + end
+        reader = csv.reader(io.StringIO(chunk, newline=''))
+        if offset == 0:
+            next(reader, None)
+        for values in reader:
+            if values:
+                self._apply(dict(zip(APPOINTMENT_FIELDS, values)))
+
+    def _refresh(self):
+        """Pick up rows written since the last read, reloading if the log was replaced"""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            if self._inode is not None:
+                self._reset()
+            return
+        if self._inode is None or st.st_ino != self._inode or st.st_size < self._offset:
+            self._load_all()
+        elif st.st_size > self._offset:
+            self._read_from(self._offset)
+
+    # Indexes
+
+    def _slot_entry(self, row):
+        try:
+            return (slot_key(row.get('time', '')), row['id'])
+        except Exception:
+            return None
+
+    def _unindex_slot(self, row):
+        entry = self._slot_entry(row)
+        if entry is None:
+            return
+        i = bisect.bisect_left(self._slots, entry)
+        if i < len(self._slots) and self._slots[i] == entry:
+            del self._slots[i]
+
+    def _apply(self, row):
+        self._log_rows += 1
+        appointment_id = row.get('id', '')
+        previous = self._by_id.get(appointment_id)
+        if previous is None:
+            self._order.append(appointment_id)
+        elif not _same_booking(previous, row):
+            self._reused_ids += 1
+        if previous is not None and (previous.get('status') or '').lower() != 'cancelled':
+            self._unindex_slot(previous)
+        self._by_id[appointment_id] = row
+        if (row.get('status') or '').lower() != 'cancelled':
+            entry = self._slot_entry(row)
+            if entry is not None:
+                bisect.insort(self._slots, entry)
+
+    # Public API
+
+    def find_conflict(self, when):
+        """Active appointment booked at exactly this slot, or None"""
+        key = slot_key(when)
+        with self._lock:
+            self._refresh()
+            i = bisect.bisect_left(self._slots, (key, ''))
+            if i < len(self._slots) and self._slots[i][0] == key:
+                return dict(self._by_id[self._slots[i][1]])
+            return None
+
+    def between(self, start, end):
+        """Active appointments with start <= time < end, in time order"""
+        start, end = slot_key(start), slot_key(end)
+        with self._lock:
+            self._refresh()
+            lo = bisect.bisect_left(self._slots, (start, ''))
+            hi = bisect.bisect_left(self._slots, (end, ''))
+            return [dict(self._by_id[appointment_id]) for _, appointment_id in self._slots[lo:hi]]
+
+    def get(self, appointment_id):
+        with self._lock:
+            self._refresh()
+            row = self._by_id.get(appointment_id)
+            return dict(row) if row else None
+
+    def all(self):
+        """Current version of every appointment, in booking order"""
+        with self._lock:
+            self._refresh()
+            return [dict(self._by_id[appointment_id]) for appointment_id in self._order]
+
+    def add(self, row):
+        with self._lock:
+            self._refresh()
+            self._append(row)
+
+    def set_status(self, appointment_id, status):
+        """Append a status change; returns the updated row or None if the id is unknown"""
+        with self._lock:
+            self._refresh()
+            current = self._by_id.get(appointment_id)
+            if current is None:
+                return None
+            updated = dict(current, status=status)
+            self._append(updated)
+            self._maybe_compact()
+            return dict(updated)
+
+    def cancel(self, appointment_id):
+        return self.set_status(appointment_id, 'cancelled')
+
+    def _append(self, row):
+        # Whole rows (and the header of a new file) are written under the file lock
+        with self._file_lock():
+            new_file = not os.path.isfile(self.path)
+            with open(self.path, 'a', encoding='utf-8', newline='') as f:
+                if new_file:
+                    f.write(_render_row({field: field for field in APPOINTMENT_FIELDS}))
+                f.write(_render_row(row))
+        self._refresh()
+
+    # Compaction
+
+    def _maybe_compact(self):
+        live = len(self._by_id)
+        if self._log_rows >= self.min_compact_rows and self._log_rows > live * self.compact_ratio:
+            self.compact()
+
+    def compact(self):
+        """Rewrite the log with only the latest row per appointment
+
+        The re-read, rewrite and replace all happen under the file lock so that a
+        row appended by another process cannot land in between and be dropped.
+        """
+        with self._lock, self._file_lock():
+            self._refresh()
+            before = self._log_rows
+            self._write_log([self._by_id[appointment_id] for appointment_id in self._order])
+            self._load_all()
+            logger.info(f"Compacted {self.path}: {before} rows -> {self._log_rows}")
+
+    def _write_log(self, rows):
+        with self._file_lock():
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=APPOINTMENT_FIELDS, extrasaction='ignore')
+                writer.writeheader()
+                writer.writerows(rows)
+            os.replace(tmp_path, self.path)
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._by_id)
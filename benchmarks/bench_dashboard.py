@@ -0,0 +1,156 @@
+"""Benchmark the dashboard record pipeline: render time and peak memory by record count
+
+Compares the original approach (one formatted dict per record, each timestamp converted
+on its own, ISO-string sorting) with what the dashboard now runs on its RTDB mirror:
+RealtimeMirror.page() picks the newest records on each record type's numeric rank()
+and only the shown page becomes slotted records with column-wise timestamp formatting.
+
+Usage: python benchmarks/bench_dashboard.py [--sizes 10000 100000 1000000] [--page 50] [--json out.json]
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from records import Lead, Appointment, Conversation, to_dicts  # noqa: E402
+from rtdb_mirror import RealtimeMirror  # noqa: E402
+
+START_MS = int(datetime(2025, 1, 1).timestamp() * 1000)
+# Collection -> (ordering field, record type), as in app.DASHBOARD_COLLECTIONS
+TABLES = {'leads': ('created_at', Lead), 'appointments': ('time', Appointment), 'conversations': ('timestamp', Conversation)}
+
+
+def make_snapshot(size, seed=7):
+    """RTDB-shaped collections: 60% conversations, 20% leads, 20% appointments"""
+    rng = random.Random(seed)
+    leads, appointments, conversations = {}, {}, {}
+    for i in range(size // 5):
+        leads[f'lead{i:08d}'] = {
+            'id': f'lead{i:08d}', 'name': f'Lead {i}', 'email': f'lead{i}@example.com', 'phone': '',
+            'message': 'Please call me back about a quote', 'source': 'chatbot',
+            'created_at': START_MS + rng.randrange(365 * 86400) * 1000
+        }
+    for i in range(size // 5):
+        when = datetime(2025, 1, 1) + timedelta(minutes=30 * rng.randrange(20000))
+        appointments[f'APT-{i:08d}'] = {
+            'id': f'APT-{i:08d}', 'title': 'Consultation', 'time': when.isoformat() + '+00:00', 'notes': '',
+            'status': rng.choice(['scheduled', 'cancelled', 'pending']),
+            'user': {'name': f'User {i}', 'email': f'user{i}@example.com', 'phone': '', 'company': ''}
+        }
+    for i in range(size - 2 * (size // 5)):
+        conversations[f'conv{i:08d}'] = {
+            'id': f'conv{i:08d}', 'user_message': 'What are your services?', 'bot_response': 'We offer ...',
+            'timestamp': START_MS + rng.randrange(365 * 86400) * 1000, 'session_id': f's{i % 5000}',
+            'user_details': {'name': 'Anonymous', 'email': '', 'phone': ''}
+        }
+    return {'leads': leads, 'appointments': appointments, 'conversations': conversations}
+
+
+def legacy_pipeline(snapshot, page):
+    """The original dashboard(): a dict per record, per-record isoformat, sort on ISO strings"""
+    tables = {}
+    leads = []
+    for key, d in snapshot['leads'].items():
+        created_ms = d.get('created_at') or 0
+        leads.append({
+            'id': d.get('id', key), 'name': d.get('name', ''), 'email': d.get('email', ''),
+            'phone': d.get('phone', ''), 'message': d.get('message', ''), 'source': d.get('source', ''),
+            'created_at': datetime.fromtimestamp(created_ms / 1000).isoformat()
+        })
+    leads.sort(key=lambda x: x['created_at'], reverse=True)
+    tables['leads'] = leads
+    appointments = []
+    for key, d in snapshot['appointments'].items():
+        user = d.get('user', {})
+        appointments.append({
+            'id': d.get('id', key), 'title': d.get('title', ''),
+            'time': datetime.fromisoformat(d.get('time', '').replace('Z', '+00:00')).isoformat(),
+            'notes': d.get('notes', ''), 'status': (d.get('status') or 'pending').lower(),
+            'user': {'name': user.get('name', 'Anonymous User'), 'email': user.get('email', ''),
+                     'phone': user.get('phone', ''), 'company': user.get('company', '')}
+        })
+    appointments.sort(key=lambda x: x['time'], reverse=True)
+    tables['appointments'] = appointments
+    conversations = []
+    for key, d in snapshot['conversations'].items():
+        conversations.append({
+            'id': d.get('id', key), 'user_message': d.get('user_message', ''),
+            'bot_response': d.get('bot_response', ''),
+            'timestamp': datetime.fromtimestamp((d.get('timestamp') or 0) / 1000).isoformat(),
+            'session_id': d.get('session_id', 'default'), 'user_details': d.get('user_details', {})
+        })
+    conversations.sort(key=lambda x: x['timestamp'], reverse=True)
+    tables['conversations'] = conversations
+    return {name: rows[:page] for name, rows in tables.items()}
+
+
+def load_mirror(snapshot):
+    """A RealtimeMirror holding the snapshot, as after its listeners' first put events"""
+    mirror = RealtimeMirror(lambda path: None, list(snapshot))
+    for name, records in snapshot.items():
+        mirror._apply(name, 'put', '/', records)
+    return mirror
+
+
+def records_pipeline(mirror, page):
+    """app.fetch_page() on a loaded mirror: newest page on rank(), then slotted records for those rows only"""
+    shown = {}
+    for name, (order_by, record_type) in TABLES.items():
+        records, _ = mirror.page(name, order_by, page, rank=record_type.rank)
+        shown[name] = to_dicts(record_type, records)
+    return shown
+
+
+# Pipeline name -> (prepare the data it reads, render)
+PIPELINES = {'dicts': (lambda snapshot: snapshot, legacy_pipeline), 'records': (load_mirror, records_pipeline)}
+
+
+def measure(pipeline, source, page, repeat):
+    gc.collect()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        pipeline(source, page)
+        timings.append((time.perf_counter() - started) * 1000)
+    gc.collect()
+    tracemalloc.start()
+    pipeline(source, page)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'render_ms': round(min(timings), 1), 'peak_mb': round(peak / 1024 / 1024, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--page', type=int, default=50, help='rows shown per table')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per size (the best is reported)')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'records':>10} {'pipeline':>9} {'render ms':>10} {'peak MB':>8}")
+    for size in args.sizes:
+        snapshot = make_snapshot(size)
+        for name, (prepare, pipeline) in PIPELINES.items():
+            source = prepare(snapshot)
+            row = dict(records=size, pipeline=name, **measure(pipeline, source, args.page, args.repeat))
+            del source
+            results.append(row)
+            print(f"{size:>10} {name:>9} {row['render_ms']:>10} {row['peak_mb']:>8}")
+        del snapshot
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'page': args.page, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
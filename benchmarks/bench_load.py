@@ -0,0 +1,306 @@
+"""Load test the Flask app in-process with fake Gemini, RTDB, Sheets and Twilio backends
+
+Drives a weighted mix of chat, appointment, dashboard, lead/user and Twilio webhook
+requests from concurrent threads, then reports p50/p95/p99 latency and throughput per
+endpoint. Results are written as JSON; pass --compare with an earlier file to print
+the change per endpoint.
+
+Usage: python benchmarks/bench_load.py [--concurrency 16] [--duration 20] [--out load_results.json]
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import FakeDatabase, FakeModel, FakeSheetsClient, FakeTwilioClient  # noqa: E402
+
+QUESTIONS_CANNED = ['what are your services', 'where are you located', 'are you hiring', 'what is your mission']
+QUESTIONS_REPEATED = ['How much does SEO cost for a small business?', 'Can you run a campaign for my restaurant?',
+                      'Do you handle Instagram ads?', 'What results can I expect in three months?']
+
+# (name, weight); names double as the keys in the results file
+MIX = [
+    ('send_message', 30),
+    ('send_message_stream', 5),
+    ('schedule_appointment', 8),
+    ('get_appointments', 5),
+    ('cancel_appointment', 2),
+    ('dashboard', 4),
+    ('api_dashboard_page', 6),
+    ('get_users_data', 4),
+    ('store_user_data', 5),
+    ('create_lead', 6),
+    ('voice', 5),
+    ('handle_voice_input', 10),
+    ('call_completed', 3),
+    ('initiate_call', 2)
+]
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summarise(samples, errors, elapsed):
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'rps': len(samples) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p95_ms': percentile(samples, 95) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+        'max_ms': (max(samples) if samples else 0.0) * 1000
+    }
+
+
+def load_app(args, workdir):
+    """Import app.py inside a scratch directory and swap its backends for fakes"""
+    shutil.copy(os.path.join(REPO, 'imsolutions_content.json'), workdir)
+    os.makedirs(os.path.join(workdir, 'appointments'), exist_ok=True)
+    os.chdir(workdir)
+    os.environ.setdefault('STORAGE_BACKEND', args.storage)
+    os.environ.setdefault('CACHE_BACKEND', args.cache)
+    os.environ.setdefault('SLOT_LOCK_DIR', os.path.join(workdir, 'locks'))
+    os.environ.setdefault('SPREADSHEET_ID', 'bench-sheet')
+    os.environ.setdefault('SERVICES_PRELOAD', '')
+
+    import app as app_module
+    from dashboard_metrics import MetricsAggregator
+    from firebase_writer import FirebaseWriter
+    from slot_locks import SlotReservations
+
+    logging.getLogger().setLevel(getattr(logging, args.log_level))
+    model = app_module.app_metrics.instrument(FakeModel(latency=args.gemini_latency), 'gemini', ['generate_content'])
+    app_module.model = model
+    app_module.llm_gateway.model = model
+    app_module.sheets_writer.client = FakeSheetsClient(latency=args.sheets_latency)
+    app_module.twilio_client = FakeTwilioClient(latency=args.twilio_latency)
+    app_module.TWILIO_PHONE_NUMBER = '+15550000000'
+    if not args.no_rtdb:
+        db = FakeDatabase(latency=args.rtdb_latency)
+        app_module.fb_db = db
+        app_module.rtdb_available = True
+        app_module.firebase_writer = FirebaseWriter(lambda: db.reference(), journal_path='firebase_journal.jsonl').start()
+        app_module.dashboard_metrics = MetricsAggregator(db.reference).start()
+        app_module.slot_reservations = SlotReservations(db.reference)
+        if not args.no_mirror:
+            app_module.rtdb_mirror = app_module.create_rtdb_mirror(db.reference)
+            app_module.services.set('rtdb_mirror', app_module.rtdb_mirror.start())
+    return app_module
+
+
+class Traffic:
+    """Builds requests for each endpoint in MIX and remembers ids needed by later requests"""
+
+    def __init__(self, seed):
+        self.random = random.Random(seed)
+        self.counter = itertools.count()
+        self.appointment_ids = []
+        self.call_sids = []
+        self.lock = threading.Lock()
+
+    def question(self):
+        roll = self.random.random()
+        if roll < 0.3:
+            return self.random.choice(QUESTIONS_CANNED)
+        if roll < 0.7:
+            return self.random.choice(QUESTIONS_REPEATED)
+        return f'I have a question about campaign number {next(self.counter)} for my business'
+
+    def call_sid(self, new=False):
+        with self.lock:
+            if new or not self.call_sids:
+                self.call_sids.append(f'CA{next(self.counter):08d}')
+                self.call_sids = self.call_sids[-200:]
+            return self.random.choice(self.call_sids)
+
+    def send(self, client, name):
+        if name == 'send_message':
+            return client.post('/send_message', json={'message': self.question()})
+        if name == 'send_message_stream':
+            response = client.post('/send_message_stream', json={'message': self.question()})
+            response.get_data()
+            return response
+        if name == 'schedule_appointment':
+            slot = datetime(2031, 1, 1) + timedelta(minutes=30 * self.random.randrange(200000))
+            response = client.post('/schedule_appointment', json={
+                'title': 'Consultation', 'time': slot.isoformat() + 'Z', 'notes': 'bench',
+                'user_name': 'Bench User', 'user_email': f'user{next(self.counter)}@example.com'
+            })
+            if response.status_code == 200:
+                with self.lock:
+                    self.appointment_ids.append(response.get_json()['appointment_id'])
+            return response
+        if name == 'get_appointments':
+            return client.get('/get_appointments')
+        if name == 'cancel_appointment':
+            with self.lock:
+                appointment_id = self.appointment_ids.pop() if self.appointment_ids else 'APT-missing'
+            return client.post('/cancel_appointment', json={'appointment_id': appointment_id})
+        if name == 'dashboard':
+            return client.get('/dashboard')
+        if name == 'api_dashboard_page':
+            return client.get(f"/api/dashboard/{self.random.choice(['leads', 'appointments', 'conversations'])}?limit=50")
+        if name == 'get_users_data':
+            return client.get('/get_users_data')
+        if name == 'store_user_data':
+            n = next(self.counter)
+            return client.post('/store_user_data', json={'name': f'User {n}', 'email': f'user{n}@example.com',
+                                                         'phone': f'+91{n:010d}'})
+        if name == 'create_lead':
+            n = next(self.counter)
+            return client.post('/create_lead', json={'name': f'Lead {n}', 'email': f'lead{n}@example.com',
+                                                     'message': 'Interested in SEO'})
+        if name == 'voice':
+            return client.post('/voice', data={'CallSid': self.call_sid(new=True)})
+        if name == 'handle_voice_input':
+            return client.post('/handle-voice-input', data={'CallSid': self.call_sid(), 'SpeechResult': self.question()})
+        if name == 'call_completed':
+            return client.post('/call-completed', data={'CallSid': self.call_sid(), 'CallDuration': '42',
+                                                        'To': '+15551234567'})
+        if name == 'initiate_call':
+            return client.post('/initiate-call', json={'phone_number': '+15551234567'})
+        raise ValueError(name)
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix='bench-load-')
+    app_module = load_app(args, workdir)
+    traffic = Traffic(args.seed)
+    names = [name for name, _ in MIX]
+    weights = [weight for _, weight in MIX]
+    samples = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    lock = threading.Lock()
+    deadline = time.time() + args.warmup + args.duration
+    measure_from = time.time() + args.warmup
+
+    def worker(index):
+        client = app_module.app.test_client()
+        with client.session_transaction() as session:
+            session['logged_in'] = True
+        rng = random.Random(args.seed + index)
+        while time.time() < deadline:
+            name = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                status = traffic.send(client, name).status_code
+            except Exception:
+                status = 599
+            elapsed = time.perf_counter() - started
+            if time.time() < measure_from:
+                continue
+            with lock:
+                samples[name].append(elapsed)
+                if status >= 500:
+                    errors[name] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    every = [s for values in samples.values() for s in values]
+    results = {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat() + 'Z',
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'config': vars(args)
+        },
+        'overall': summarise(every, sum(errors.values()), args.duration),
+        'endpoints': {name: summarise(samples[name], errors[name], args.duration) for name in names},
+        'backends': {
+            'gemini_calls': app_module.llm_gateway.model.calls,
+            'llm_gateway': app_module.llm_gateway.stats(),
+            'cache': app_module.response_cache.stats()
+        }
+    }
+    # Let background writers finish before the scratch directory goes away
+    app_module.sheets_writer.stop()
+    if app_module.firebase_writer is not None:
+        app_module.firebase_writer.stop()
+    app_module.call_store.stop()
+    os.chdir(REPO)
+    shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    print(f"\n{'endpoint':<22}{'p95 ms':>12}{'base p95':>12}{'change':>10}{'rps':>10}{'base rps':>10}")
+    rows = [('overall', results['overall'], baseline.get('overall', {}))]
+    rows += [(name, stats, baseline.get('endpoints', {}).get(name, {})) for name, stats in results['endpoints'].items()]
+    for name, stats, base in rows:
+        base_p95 = base.get('p95_ms')
+        change = f"{(stats['p95_ms'] - base_p95) / base_p95 * 100:+.0f}%" if base_p95 else 'n/a'
+        print(f"{name:<22}{stats['p95_ms']:>12.1f}{(base_p95 or 0):>12.1f}{change:>10}"
+              f"{stats['rps']:>10.1f}{base.get('rps', 0):>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20.0, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=2.0, help='unmeasured seconds before measuring')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--gemini-latency', type=float, default=0.8)
+    parser.add_argument('--rtdb-latency', type=float, default=0.03)
+    parser.add_argument('--sheets-latency', type=float, default=0.4)
+    parser.add_argument('--twilio-latency', type=float, default=0.3)
+    parser.add_argument('--no-rtdb', action='store_true', help='run with RTDB unavailable (local storage only)')
+    parser.add_argument('--no-mirror', action='store_true', help='serve the dashboard from RTDB queries, not the listen() mirror')
+    parser.add_argument('--storage', default='sqlite', choices=['files', 'sqlite'])
+    parser.add_argument('--cache', default='memory', choices=['memory', 'sqlite'])
+    parser.add_argument('--log-level', default='WARNING')
+    parser.add_argument('--out', default='load_results.json')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    args = parser.parse_args()
+    args.out = os.path.abspath(args.out)
+    args.compare = os.path.abspath(args.compare) if args.compare else None
+
+    results = run(args)
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+
+    overall = results['overall']
+    print(f"{overall['requests']} requests, {overall['rps']:.1f} req/s, p50 {overall['p50_ms']:.1f} ms, "
+          f"p95 {overall['p95_ms']:.1f} ms, p99 {overall['p99_ms']:.1f} ms, {overall['errors']} errors")
+    for name, stats in results['endpoints'].items():
+        print(f"  {name:<22}{stats['requests']:>7}  p50 {stats['p50_ms']:8.1f}  p95 {stats['p95_ms']:8.1f}  "
+              f"p99 {stats['p99_ms']:8.1f} ms  errors {stats['errors']}")
+    print(f"Results written to {args.out}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Benchmark the BM25 context index: build time, lookup latency and prompt size
+
+Usage: python benchmarks/bench_retrieval.py [--repeat 2000] [--json out.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prompts import PromptBuilder  # noqa: E402
+from retrieval import BM25Index, chunk_content  # noqa: E402
+
+QUESTIONS = [
+    'What digital marketing services do you offer?',
+    'Do you do bus branding or mall advertising?',
+    'Are you hiring graphic designers?',
+    'Where are your offices?',
+    'What is your mission?',
+    'When was the company founded?',
+    'Can you help with SEO and social media marketing?',
+    'What are your core values?',
+    'Do you provide printing services?',
+    'Tell me about your history'
+]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--content', default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                          'imsolutions_content.json'))
+    parser.add_argument('--repeat', type=int, default=2000)
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    with open(args.content, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    builds = []
+    for _ in range(50):
+        started = time.perf_counter()
+        index = BM25Index(chunk_content(data))
+        builds.append((time.perf_counter() - started) * 1000)
+
+    lookups = []
+    for i in range(args.repeat):
+        question = QUESTIONS[i % len(QUESTIONS)]
+        started = time.perf_counter()
+        index.search(question, 3)
+        lookups.append((time.perf_counter() - started) * 1000)
+
+    builder = PromptBuilder(args.content, top_k=3)
+    baseline = PromptBuilder(args.content, top_k=0)
+    prompt_tokens = [builder.build(q).tokens for q in QUESTIONS]
+    baseline_tokens = [baseline.build(q).tokens for q in QUESTIONS]
+
+    results = {
+        'chunks': len(index),
+        'build_ms': {'mean': statistics.mean(builds), 'p95': percentile(builds, 95)},
+        'lookup_ms': {
+            'p50': percentile(lookups, 50),
+            'p95': percentile(lookups, 95),
+            'p99': percentile(lookups, 99)
+        },
+        'prompt_tokens': {
+            'with_retrieval_mean': statistics.mean(prompt_tokens),
+            'with_retrieval_max': max(prompt_tokens),
+            'without_retrieval_mean': statistics.mean(baseline_tokens)
+        },
+        'top_hits': {q: [chunk.title for chunk, _ in index.search(q, 3)] for q in QUESTIONS}
+    }
+    print(json.dumps(results, indent=2))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
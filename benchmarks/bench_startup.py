@@ -0,0 +1,125 @@
+"""Measure cold-start cost: import time of each heavy dependency and of the app, plus client creation
+
+Every measurement runs in a fresh interpreter so nothing is already imported; the
+median of --repeat runs is reported. Results are written as JSON; pass --compare
+with an earlier file to print the change per item.
+
+Usage: python benchmarks/bench_startup.py [--repeat 5] [--out startup_results.json]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEPENDENCIES = [
+    'flask',
+    'dotenv',
+    'pytz',
+    'google.generativeai',
+    'firebase_admin',
+    'firebase_admin.db',
+    'twilio.rest',
+    'twilio.twiml.voice_response',
+    'googleapiclient.discovery',
+    'google_auth_oauthlib.flow',
+    'icalendar'
+]
+
+# Clients the app creates on first use (see services.py)
+SERVICES = ['voice_twiml', 'twilio', 'gemini']
+
+IMPORT_SNIPPET = """
+import time
+started = time.perf_counter()
+import {module}
+print(time.perf_counter() - started)
+"""
+
+FIRST_REQUEST_SNIPPET = """
+import time
+started = time.perf_counter()
+import app
+app.app.test_client().get('/cache_stats')
+print(time.perf_counter() - started)
+"""
+
+SERVICE_SNIPPET = """
+import time
+import app
+started = time.perf_counter()
+app.services.get({name!r})
+print(time.perf_counter() - started)
+"""
+
+
+def run_snippet(code, workdir):
+    env = dict(os.environ, PYTHONPATH=REPO, SERVICES_PRELOAD='', TWILIO_ACCOUNT_SID='ACbench', TWILIO_AUTH_TOKEN='bench')
+    result = subprocess.run([sys.executable, '-c', code], cwd=workdir, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def measure(code, workdir, repeat):
+    samples = [run_snippet(code, workdir) for _ in range(repeat)]
+    if any(s is None for s in samples):
+        return None
+    return statistics.median(samples) * 1000
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    print(f"\n{'item':<36}{'ms':>10}{'base ms':>10}{'change':>10}")
+    for name, ms in results['items'].items():
+        base = baseline.get('items', {}).get(name)
+        if ms is None:
+            continue
+        change = f"{(ms - base) / base * 100:+.0f}%" if base else 'n/a'
+        print(f"{name:<36}{ms:>10.1f}{(base or 0):>10.1f}{change:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--out', default='startup_results.json')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    args = parser.parse_args()
+
+    # The app writes caches and logs into its working directory; keep them out of the repo
+    workdir = tempfile.mkdtemp(prefix='bench-startup-')
+    shutil.copy(os.path.join(REPO, 'imsolutions_content.json'), workdir)
+    items = {}
+    try:
+        for module in DEPENDENCIES:
+            items[f'import {module}'] = measure(IMPORT_SNIPPET.format(module=module), workdir, args.repeat)
+        items['import app'] = measure(IMPORT_SNIPPET.format(module='app'), workdir, args.repeat)
+        items['import app + first request'] = measure(FIRST_REQUEST_SNIPPET, workdir, args.repeat)
+        for name in SERVICES:
+            items[f'service {name}'] = measure(SERVICE_SNIPPET.format(name=name), workdir, args.repeat)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for name, ms in items.items():
+        print(f"{name:<36}{'not installed / failed' if ms is None else f'{ms:10.1f} ms'}")
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO,
+                                         stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        commit = None
+    results = {'commit': commit, 'python': sys.version.split()[0], 'repeat': args.repeat, 'items': items}
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {os.path.abspath(args.out)}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
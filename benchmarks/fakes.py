@@ -0,0 +1,275 @@
+"""In-process stand-ins for Gemini, the Firebase Realtime Database, Google Sheets and Twilio
+
+Each fake sleeps for a configurable latency (with jitter) so benchmarks see realistic
+blocking behaviour without network access or credentials.
+"""
+import copy
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+def _pause(latency, jitter=0.25):
+    if latency > 0:
+        time.sleep(latency * random.uniform(1 - jitter, 1 + jitter))
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    """Replaces genai.GenerativeModel: generate_content() with and without stream=True"""
+
+    def __init__(self, latency=0.8, chunks=5):
+        self.latency = latency
+        self.chunks = chunks
+        self.calls = 0
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        self.calls += 1
+        reply = ('We can certainly help with that. Our team offers tailored digital and offline '
+                 'marketing solutions. Would you like a quote or a call back?')
+        if not stream:
+            _pause(self.latency)
+            return FakeResponse(reply)
+        return self._stream(reply)
+
+    def _stream(self, reply):
+        words = reply.split(' ')
+        size = max(1, len(words) // self.chunks)
+        for i in range(0, len(words), size):
+            _pause(self.latency / self.chunks)
+            yield FakeResponse(' '.join(words[i:i + size]) + ' ')
+
+
+class FakeEvent:
+    def __init__(self, event_type, path, data):
+        self.event_type = event_type
+        self.path = path
+        self.data = data
+
+
+class FakeListener:
+    def __init__(self, db, entry):
+        self.db = db
+        self.entry = entry
+
+    def close(self):
+        with self.db.lock:
+            if self.entry in self.db.listeners:
+                self.db.listeners.remove(self.entry)
+
+
+class FakeDatabase:
+    """Minimal firebase_admin.db: reference(path) with get/set/update/push/delete/transaction,
+    ordered queries and listen()"""
+
+    def __init__(self, latency=0.03):
+        self.latency = latency
+        self.root = {}
+        self.lock = threading.RLock()
+        self.operations = 0
+        self.listeners = []
+
+    def reference(self, path='/'):
+        return FakeReference(self, [p for p in path.strip('/').split('/') if p])
+
+    def _notify(self, parts, value):
+        """Deliver a put at parts to listeners on it or on one of its ancestors (called under the lock)"""
+        for listen_parts, callback in list(self.listeners):
+            if parts[:len(listen_parts)] == listen_parts:
+                callback(FakeEvent('put', '/' + '/'.join(parts[len(listen_parts):]), copy.deepcopy(value)))
+
+
+class FakeReference:
+    def __init__(self, db, parts, order=None, start=None, end=None, limit_last=None, limit_first=None):
+        self.db = db
+        self.parts = parts
+        self.key = parts[-1] if parts else None
+        self._order = order
+        self._start = start
+        self._end = end
+        self._limit_last = limit_last
+        self._limit_first = limit_first
+
+    def _query(self, **changes):
+        args = dict(order=self._order, start=self._start, end=self._end, limit_last=self._limit_last,
+                    limit_first=self._limit_first)
+        args.update(changes)
+        return FakeReference(self.db, self.parts, **args)
+
+    def child(self, path):
+        return FakeReference(self.db, self.parts + [p for p in path.strip('/').split('/') if p])
+
+    def order_by_child(self, name):
+        return self._query(order=name)
+
+    def order_by_key(self):
+        return self._query(order='$key')
+
+    def start_at(self, value):
+        return self._query(start=value)
+
+    def end_at(self, value):
+        return self._query(end=value)
+
+    def limit_to_last(self, n):
+        return self._query(limit_last=n)
+
+    def limit_to_first(self, n):
+        return self._query(limit_first=n)
+
+    def _io(self):
+        self.db.operations += 1
+        _pause(self.db.latency)
+
+    def _lookup(self):
+        node = self.db.root
+        for part in self.parts:
+            if not isinstance(node, dict) or part not in node:
+                return None
+            node = node[part]
+        return node
+
+    def _parent(self, create=True):
+        node = self.db.root
+        for part in self.parts[:-1]:
+            if part not in node or not isinstance(node[part], dict):
+                if not create:
+                    return None
+                node[part] = {}
+            node = node[part]
+        return node
+
+    def get(self, shallow=False):
+        self._io()
+        with self.db.lock:
+            value = self._lookup()
+            if shallow and isinstance(value, dict):
+                return {k: True for k in value}
+            value = copy.deepcopy(value)
+        if self._order is None or not isinstance(value, dict):
+            return value
+
+        def sort_value(item):
+            return item[0] if self._order == '$key' else (item[1] or {}).get(self._order) if isinstance(item[1], dict) else None
+
+        items = [item for item in value.items() if sort_value(item) is not None]
+        items.sort(key=lambda item: (sort_value(item), item[0]))
+        if self._start is not None:
+            items = [item for item in items if sort_value(item) >= self._start]
+        if self._end is not None:
+            items = [item for item in items if sort_value(item) <= self._end]
+        if self._limit_last is not None:
+            items = items[-self._limit_last:]
+        if self._limit_first is not None:
+            items = items[:self._limit_first]
+        return OrderedDict(items)
+
+    def set(self, value):
+        self._io()
+        with self.db.lock:
+            if not self.parts:
+                self.db.root = copy.deepcopy(value)
+            else:
+                self._parent()[self.key] = copy.deepcopy(value)
+            self.db._notify(self.parts, value)
+
+    def update(self, values):
+        self._io()
+        with self.db.lock:
+            for path, value in values.items():
+                ref = self.child(path)
+                ref._parent()[ref.key] = copy.deepcopy(value)
+                self.db._notify(ref.parts, value)
+
+    def push(self, value):
+        key = uuid.uuid4().hex[:20]
+        ref = self.child(key)
+        ref.set(value)
+        return ref
+
+    def delete(self):
+        self._io()
+        with self.db.lock:
+            parent = self._parent(create=False)
+            if parent is not None:
+                parent.pop(self.key, None)
+            self.db._notify(self.parts, None)
+
+    def transaction(self, update):
+        self._io()
+        with self.db.lock:
+            new_value = update(copy.deepcopy(self._lookup()))
+            parent = self._parent()
+            if new_value is None:
+                parent.pop(self.key, None)
+            else:
+                parent[self.key] = new_value
+            self.db._notify(self.parts, new_value)
+            return new_value
+
+    def listen(self, callback):
+        """Initial put of the current value, then a put for every later write at or below this path"""
+        with self.db.lock:
+            entry = (self.parts, callback)
+            self.db.listeners.append(entry)
+            callback(FakeEvent('put', '/', copy.deepcopy(self._lookup())))
+        return FakeListener(self.db, entry)
+
+
+class _FakeRequest:
+    def __init__(self, latency, on_execute):
+        self.latency = latency
+        self.on_execute = on_execute
+
+    def execute(self):
+        _pause(self.latency)
+        return self.on_execute()
+
+
+class FakeSheetsService:
+    """Stands in for the googleapiclient Sheets service: spreadsheets().values().append/get"""
+
+    def __init__(self, latency=0.4):
+        self.latency = latency
+        self.rows = []
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def append(self, spreadsheetId=None, range=None, valueInputOption=None, body=None):
+        def _append():
+            self.rows.extend(body['values'])
+            return {'updates': {'updatedRows': len(body['values'])}}
+        return _FakeRequest(self.latency, _append)
+
+    def get(self, spreadsheetId=None, range=None):
+        return _FakeRequest(self.latency, lambda: {'values': self.rows[:1]})
+
+
+class FakeSheetsClient:
+    def __init__(self, latency=0.4):
+        self._service = FakeSheetsService(latency)
+
+    def service(self):
+        return self._service
+
+
+class FakeTwilioClient:
+    """Twilio REST client with calls.create()"""
+
+    def __init__(self, latency=0.3):
+        self.latency = latency
+        self.calls = self
+
+    def create(self, **kwargs):
+        _pause(self.latency)
+        return type('FakeCall', (), {'sid': 'CA' + uuid.uuid4().hex})()
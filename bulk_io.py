@@ -0,0 +1,192 @@
+"""Streaming CSV and JSON-lines export and import of dashboard collections
+
+Exports are generators that yield text a chunk of rows at a time, so memory stays
+flat however many records are written. CSV rows are flat (nested user details
+become user_* columns); JSON lines keep records exactly as stored.
+"""
+import csv
+import io
+import json
+import random
+import re
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+
+from records import parse_time
+
+EXPORT_FIELDS = {
+    'leads': ['id', 'name', 'email', 'phone', 'message', 'source', 'created_at'],
+    'appointments': ['id', 'title', 'time', 'notes', 'status', 'user_name', 'user_email', 'user_phone',
+                     'user_company'],
+    'conversations': ['id', 'user_message', 'bot_response', 'timestamp', 'session_id', 'user_name',
+                      'user_email', 'user_phone'],
+    'users': ['id', 'name', 'email', 'phone', 'company', 'timestamp', 'source']
+}
+# Nested dict holding the user_* columns of each collection
+USER_FIELD = {'appointments': 'user', 'conversations': 'user_details'}
+INTEGER_FIELDS = {'leads': ('created_at',), 'conversations': ('timestamp',)}
+INVALID_KEY = re.compile(r'[.$#\[\]/]')
+CHUNK_ROWS = 200
+# Alphabet of RTDB push keys, in ASCII order so keys sort by the time they encode
+PUSH_CHARS = '-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz'
+# Stored child each collection's time range is queried on, and whether it holds epoch milliseconds
+RANGE_FIELDS = {'leads': ('created_at', True), 'conversations': ('timestamp', True),
+                'appointments': ('time', False), 'users': ('timestamp', False)}
+# ISO text orders by local wall-clock time, which is at most this far from UTC
+MAX_UTC_OFFSET = timedelta(hours=14)
+
+
+def record_time(collection, record):
+    """Epoch seconds a record is filtered on: creation for leads, conversations and users, the slot for appointments"""
+    if collection == 'leads':
+        value = record.get('created_at')
+    elif collection == 'conversations':
+        value = record.get('timestamp')
+    else:
+        field = 'time' if collection == 'appointments' else 'timestamp'
+        return parse_time(record.get(field) or '')[1]
+    return value / 1000 if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def in_range(collection, record, start=None, end=None):
+    """True if the record falls in [start, end); records without a time only pass an open range"""
+    if start is None and end is None:
+        return True
+    when = record_time(collection, record)
+    return when is not None and (start is None or when >= start) and (end is None or when < end)
+
+
+def stored_range(collection, start=None, end=None):
+    """(child, start_at, end_at) covering [start, end) in stored form, for an ordered RTDB query
+
+    Bounds are None when open. Millisecond fields are bounded exactly; ISO text is widened by
+    MAX_UTC_OFFSET, so the query may return extra records and results still go through in_range().
+    """
+    field, millis = RANGE_FIELDS[collection]
+    if millis:
+        return (field, int(start * 1000) if start is not None else None,
+                int(end * 1000) if end is not None else None)
+
+    def iso(epoch, shift):
+        return (datetime.fromtimestamp(epoch, timezone.utc) + shift).replace(tzinfo=None).isoformat()
+    return (field, iso(start, -MAX_UTC_OFFSET) if start is not None else None,
+            iso(end, MAX_UTC_OFFSET) if end is not None else None)
+
+
+def push_key(epoch=None):
+    """RTDB push-style key: 8 characters of epoch milliseconds then 12 random ones, so keys sort by time"""
+    millis = max(0, int((time.time() if epoch is None else epoch) * 1000))
+    prefix = ''
+    for _ in range(8):
+        prefix = PUSH_CHARS[millis % 64] + prefix
+        millis //= 64
+    return prefix + ''.join(random.choice(PUSH_CHARS) for _ in range(12))
+
+
+def flatten(collection, key, record):
+    """Flat CSV row for a stored record"""
+    row = {field: record.get(field, '') for field in EXPORT_FIELDS[collection]}
+    row['id'] = record.get('id') or key
+    nested = USER_FIELD.get(collection)
+    if nested and isinstance(record.get(nested), dict):
+        for field, value in record[nested].items():
+            if f'user_{field}' in row:
+                row[f'user_{field}'] = value
+    return row
+
+
+def unflatten(collection, row):
+    """Stored record for a CSV row: user_* columns are nested again and timestamps made integers"""
+    record = {field: value for field, value in row.items() if field in EXPORT_FIELDS[collection]}
+    for field in INTEGER_FIELDS.get(collection, ()):
+        if record.get(field) not in (None, ''):
+            try:
+                record[field] = int(float(record[field]))
+            except ValueError:
+                raise ValueError(f'{field} must be epoch milliseconds')
+    nested = USER_FIELD.get(collection)
+    if nested:
+        record[nested] = {field[5:]: record.pop(field) or '' for field in list(record) if field.startswith('user_')}
+    return record
+
+
+def stream_csv(collection, records, chunk_rows=CHUNK_ROWS):
+    """CSV text for (key, record) pairs, yielded every chunk_rows rows"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS[collection], extrasaction='ignore')
+    writer.writeheader()
+    rows = 0
+    for key, record in records:
+        writer.writerow(flatten(collection, key, record))
+        rows += 1
+        if rows % chunk_rows == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_jsonl(records, chunk_rows=CHUNK_ROWS):
+    """One JSON object per line for (key, record) pairs, with the key as id when the record has none"""
+    lines = []
+    for key, record in records:
+        if 'id' not in record:
+            record = dict(record, id=key)
+        lines.append(json.dumps(record, ensure_ascii=False))
+        if len(lines) == chunk_rows:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def read_csv(collection, lines):
+    """(line number, record or ValueError) for each row of CSV text lines"""
+    reader = csv.DictReader(lines)
+    for row in reader:
+        try:
+            yield reader.line_num, unflatten(collection, row)
+        except ValueError as e:
+            yield reader.line_num, e
+
+
+def read_jsonl(lines):
+    """(line number, record or ValueError) for each non-blank JSON line"""
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield number, ValueError(f'Invalid JSON: {e.msg}')
+            continue
+        yield number, record if isinstance(record, dict) else ValueError('Each line must be a JSON object')
+
+
+def import_key(collection, record):
+    """RTDB key for an imported record; users are stored under push-style keys without an id field
+
+    A user without an id gets a push key for its timestamp (or now), so it sorts among
+    the users pushed around that time.
+    """
+    key = str(record.pop('id', '') if collection == 'users' else record.get('id') or '').strip()
+    if not key and collection == 'users':
+        key = push_key(record_time(collection, record))
+    elif not key:
+        key = str(uuid.uuid4())
+    elif INVALID_KEY.search(key):
+        raise ValueError(f'id {key!r} contains a character RTDB keys cannot hold (. $ # [ ] /)')
+    if collection != 'users':
+        record['id'] = key
+    return key
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
@@ -0,0 +1,420 @@
+import heapq
+import math
+import re
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, defaultdict
+
+
+def _estimate_size(key, value):
+    """Approximate the memory cost of a cache entry in bytes"""
+    size = 0
+    for item in (key, value):
+        if isinstance(item, str):
+            size += len(item.encode('utf-8'))
+        else:
+            size += sys.getsizeof(item)
+    return size
+
+
+class TTLCache:
+    """Thread-safe LRU cache bounded by entry count and byte budget, with TTL expiry"""
+
+    def __init__(self, max_entries=1024, max_bytes=8 * 1024 * 1024, ttl=3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, size, value)
+        self._expiry = []  # heap of (expires_at, key); stale once the key is replaced or removed
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Return the cached value for key, or None if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, size, value = entry
+            if expires_at <= time.time():
+                self._remove(key, size)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store value under key, evicting least recently used entries as needed"""
+        size = _estimate_size(key, value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            expires_at = time.time() + (self.ttl if ttl is None else ttl)
+            self._data[key] = (expires_at, size, value)
+            self._bytes += size
+            heapq.heappush(self._expiry, (expires_at, key))
+            self._purge_expired()
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                old_key, (_, old_size, _) = next(iter(self._data.items()))
+                self._remove(old_key, old_size)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._expiry.clear()
+            self._bytes = 0
+
+    def _remove(self, key, size):
+        del self._data[key]
+        self._bytes -= size
+
+    def _purge_expired(self):
+        # Per-key TTLs mean insertion order is not expiry order, so expiries are kept in a heap
+        now = time.time()
+        while self._expiry and self._expiry[0][0] <= now:
+            expires_at, key = heapq.heappop(self._expiry)
+            entry = self._data.get(key)
+            if entry is not None and entry[0] == expires_at:
+                self._remove(key, entry[1])
+                self.expirations += 1
+        if len(self._expiry) > 2 * len(self._data) + 64:
+            self._expiry = [(entry[0], key) for key, entry in self._data.items()]
+            heapq.heapify(self._expiry)
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and entry[0] > time.time()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def stats(self):
+        """Snapshot of the cache counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._data),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0
+            }
+
+
+class SQLiteCache:
+    """TTL cache in a SQLite file (WAL mode), shared by every worker process and kept across restarts
+
+    Same get/set interface as TTLCache. Hits are counted per key so the hottest
+    entries can be preloaded into a memory tier at startup.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS cache (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_cache_expires_at ON cache(expires_at);
+        CREATE INDEX IF NOT EXISTS idx_cache_hits ON cache(hits);
+    """
+
+    def __init__(self, path='response_cache.db', ttl=3600, max_entries=10000, prune_every=100):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.prune_every = prune_every
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self._conn().executescript(self.SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get_entry(self, key):
+        """(value, expires_at) for a live entry, or None"""
+        conn = self._conn()
+        with conn:
+            row = conn.execute(
+                'SELECT value, expires_at FROM cache WHERE key = ? AND expires_at > ?', (key, time.time())
+            ).fetchone()
+            if row is None:
+                with self._stats_lock:
+                    self.misses += 1
+                return None
+            conn.execute('UPDATE cache SET hits = hits + 1 WHERE key = ?', (key,))
+        with self._stats_lock:
+            self.hits += 1
+        return row
+
+    def get(self, key):
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
+
+    def set(self, key, value, ttl=None):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                'INSERT INTO cache (key, value, expires_at) VALUES (?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at',
+                (key, value, time.time() + (self.ttl if ttl is None else ttl))
+            )
+        with self._stats_lock:
+            self._writes += 1
+            prune = self._writes % self.prune_every == 0
+        if prune:
+            self.prune()
+
+    def prune(self):
+        """Drop expired entries, then the least-hit ones beyond max_entries"""
+        conn = self._conn()
+        with conn:
+            conn.execute('DELETE FROM cache WHERE expires_at <= ?', (time.time(),))
+            conn.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY hits DESC, expires_at DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+
+    def hottest(self, limit):
+        """[(key, value, expires_at)] for the most-hit live entries"""
+        return self._conn().execute(
+            'SELECT key, value, expires_at FROM cache WHERE expires_at > ? ORDER BY hits DESC LIMIT ?',
+            (time.time(), limit)
+        ).fetchall()
+
+    def clear(self):
+        conn = self._conn()
+        with conn:
+            conn.execute('DELETE FROM cache')
+
+    def __contains__(self, key):
+        return self._conn().execute(
+            'SELECT 1 FROM cache WHERE key = ? AND expires_at > ?', (key, time.time())
+        ).fetchone() is not None
+
+    def __len__(self):
+        return self._conn().execute('SELECT COUNT(*) FROM cache WHERE expires_at > ?', (time.time(),)).fetchone()[0]
+
+    def stats(self):
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            'path': self.path,
+            'entries': len(self),
+            'max_entries': self.max_entries,
+            'ttl': self.ttl,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': (hits / lookups) if lookups else 0.0
+        }
+
+
+class TieredCache:
+    """Per-process TTLCache in front of a shared SQLiteCache
+
+    Misses in the memory tier fall through to the shared tier and are copied back
+    with the remaining TTL, so an entry never outlives its shared expiry.
+    """
+
+    def __init__(self, front, back):
+        self.front = front
+        self.back = back
+
+    def get(self, key):
+        value = self.front.get(key)
+        if value is not None:
+            return value
+        entry = self.back.get_entry(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        self.front.set(key, value, ttl=expires_at - time.time())
+        return value
+
+    def set(self, key, value):
+        self.front.set(key, value)
+        self.back.set(key, value)
+
+    def warm(self, limit):
+        """Preload the hottest shared entries into memory; returns their keys"""
+        keys = []
+        now = time.time()
+        for key, value, expires_at in self.back.hottest(limit):
+            self.front.set(key, value, ttl=expires_at - now)
+            keys.append(key)
+        return keys
+
+    def clear(self):
+        self.front.clear()
+        self.back.clear()
+
+    def __contains__(self, key):
+        return key in self.front or key in self.back
+
+    def __len__(self):
+        return len(self.back)
+
+    def stats(self):
+        stats = self.front.stats()
+        stats['shared'] = self.back.stats()
+        return stats
+
+
+STOP_WORDS = frozenset([
+    'a', 'an', 'the', 'is', 'are', 'am', 'was', 'were', 'be', 'do', 'does', 'did',
+    'please', 'can', 'could', 'would', 'will', 'i', 'me', 'my', 'to', 'of', 'for',
+    'and', 'so', 'just', 'hi', 'hello', 'hey', 'kindly'
+])
+
+_PUNCT_RE = re.compile(r'[^\w\s]')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def normalize_cache_key(text):
+    """Canonical cache key: case-folded, punctuation and stop-words removed, whitespace collapsed
+
+    Empty for punctuation- or whitespace-only text, which must not be cached.
+    """
+    text = unicodedata.normalize('NFKC', text or '').casefold()
+    text = _SPACE_RE.sub(' ', _PUNCT_RE.sub(' ', text)).strip()
+    words = [w for w in text.split(' ') if w and w not in STOP_WORDS]
+    # A message made only of stop-words still needs a non-empty key
+    return ' '.join(words) if words else text
+
+
+class SimilarityIndex:
+    """Character n-gram TF-IDF index used to find near-duplicate cached questions"""
+
+    SCORE_BUCKETS = 10
+
+    def __init__(self, threshold=0.9, ngram=3, max_entries=1024):
+        self.threshold = threshold
+        self.ngram = ngram
+        self.max_entries = max_entries
+        self._docs = OrderedDict()  # key -> {ngram: count}
+        self._postings = defaultdict(set)  # ngram -> keys
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self._score_histogram = [0] * self.SCORE_BUCKETS
+
+    def _ngrams(self, text):
+        padded = f' {text} '
+        counts = defaultdict(int)
+        for i in range(max(1, len(padded) - self.ngram + 1)):
+            counts[padded[i:i + self.ngram]] += 1
+        return counts
+
+    def add(self, key):
+        with self._lock:
+            if key in self._docs:
+                self._docs.move_to_end(key)
+                return
+            grams = self._ngrams(key)
+            self._docs[key] = grams
+            for gram in grams:
+                self._postings[gram].add(key)
+            while len(self._docs) > self.max_entries:
+                old_key = next(iter(self._docs))
+                self._discard(old_key)
+
+    def discard(self, key):
+        with self._lock:
+            if key in self._docs:
+                self._discard(key)
+
+    def _discard(self, key):
+        for gram in self._docs.pop(key):
+            keys = self._postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[gram]
+
+    def _weights(self, grams, total_docs):
+        return {
+            gram: count * (math.log((total_docs + 1) / (len(self._postings.get(gram, ())) + 1)) + 1)
+            for gram, count in grams.items()
+        }
+
+    def lookup(self, text):
+        """Return (key, score) of the most similar indexed question at or above threshold, else (None, score)"""
+        query = self._ngrams(text)
+        with self._lock:
+            self.lookups += 1
+            total_docs = len(self._docs)
+            if not total_docs:
+                self._score_histogram[0] += 1
+                return None, 0.0
+            candidates = set()
+            for gram in query:
+                candidates.update(self._postings.get(gram, ()))
+            query_vec = self._weights(query, total_docs)
+            query_norm = math.sqrt(sum(w * w for w in query_vec.values()))
+            best_key, best_score = None, 0.0
+            for key in candidates:
+                doc_vec = self._weights(self._docs[key], total_docs)
+                doc_norm = math.sqrt(sum(w * w for w in doc_vec.values()))
+                if not doc_norm or not query_norm:
+                    continue
+                dot = sum(w * doc_vec.get(gram, 0.0) for gram, w in query_vec.items())
+                score = dot / (query_norm * doc_norm)
+                if score > best_score:
+                    best_key, best_score = key, score
+            bucket = min(int(best_score * self.SCORE_BUCKETS), self.SCORE_BUCKETS - 1)
+            self._score_histogram[bucket] += 1
+            if best_score >= self.threshold:
+                self.hits += 1
+                return best_key, best_score
+            return None, best_score
+
+    def __len__(self):
+        with self._lock:
+            return len(self._docs)
+
+    def stats(self):
+        """Hit rate plus a histogram of best-match scores for tuning the threshold"""
+        with self._lock:
+            width = 1.0 / self.SCORE_BUCKETS
+            return {
+                'entries': len(self._docs),
+                'threshold': self.threshold,
+                'lookups': self.lookups,
+                'hits': self.hits,
+                'hit_rate': (self.hits / self.lookups) if self.lookups else 0.0,
+                'best_score_histogram': {
+                    f'{i * width:.1f}-{(i + 1) * width:.1f}': count
+                    for i, count in enumerate(self._score_histogram)
+                }
+            }
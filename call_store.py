@@ -0,0 +1,193 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process locking only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class CallTranscriptStore:
+    """In-progress call transcripts in an append-only JSON-lines log shared by worker processes
+
+    Each exchange appends {"op": "add", ...}; a finished call appends {"op": "done"}.
+    Every process tails the log into an in-memory index, so any worker can finish a
+    call. Calls idle for longer than ttl are treated as abandoned: the sweeper claims
+    them under the log's file lock (so exactly one process does), hands the transcript
+    to on_expire and marks them done. The log is compacted once finished calls
+    dominate it.
+    """
+
+    def __init__(self, path='call_transcripts.jsonl', ttl=3600.0, max_calls=10000, on_expire=None,
+                 sweep_interval=60.0, compact_ratio=4.0, min_compact_rows=1000):
+        self.path = path
+        self.ttl = ttl
+        self.max_calls = max_calls
+        self.on_expire = on_expire
+        self.sweep_interval = sweep_interval
+        self.compact_ratio = compact_ratio
+        self.min_compact_rows = min_compact_rows
+        self._lock = threading.RLock()
+        self._calls = {}  # call sid -> {'exchanges': [...], 'last_seen': ts}
+        self._log_rows = 0
+        self._offset = 0
+        self._inode = None
+        self._thread = None
+        self._stopping = threading.Event()
+        self.expired = 0
+
+    # Log access
+
+    @contextmanager
+    def _exclusive(self):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.path + '.lock', 'a') as f:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _refresh(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self._calls, self._log_rows, self._offset, self._inode = {}, 0, 0, None
+            return
+        if self._inode != st.st_ino or st.st_size < self._offset:
+            self._calls, self._log_rows, self._offset = {}, 0, 0
+        if st.st_size == self._offset:
+            self._inode = st.st_ino
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        self._inode = st.st_ino
+        self._offset += end
+        for line in data[:end].decode('utf-8').splitlines():
+            if not line.strip():
+                continue
+            try:
+                self._apply(json.loads(line))
+            except (json.JSONDecodeError, KeyError):
+                logger.error(f"Skipping corrupt call transcript entry: {line[:80]}")
+
+    def _apply(self, record):
+        self._log_rows += 1
+        sid = record['sid']
+        if record['op'] == 'add':
+            call = self._calls.setdefault(sid, {'exchanges': [], 'last_seen': 0.0})
+            call['exchanges'].append({'user': record['user'], 'bot': record['bot'], 'timestamp': record['at']})
+            call['last_seen'] = max(call['last_seen'], record['ts'])
+        elif record['op'] == 'done':
+            self._calls.pop(sid, None)
+
+    def _append(self, records):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(''.join(json.dumps(r, separators=(',', ':')) + '\n' for r in records))
+        self._refresh()
+
+    # Public API
+
+    def add(self, call_sid, user_text, bot_text):
+        now = time.time()
+        record = {'op': 'add', 'sid': call_sid, 'user': user_text, 'bot': bot_text,
+                  'at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(now)), 'ts': now}
+        with self._exclusive():
+            self._refresh()
+            self._append([record])
+            overflow = len(self._calls) - self.max_calls
+        if overflow > 0:
+            self.sweep(limit_overflow=True)
+
+    def get(self, call_sid):
+        with self._lock:
+            self._refresh()
+            call = self._calls.get(call_sid)
+            return [dict(e) for e in call['exchanges']] if call else None
+
+    def complete(self, call_sid):
+        """Remove a finished call and return its exchanges (None if unknown or already claimed)"""
+        with self._exclusive():
+            self._refresh()
+            call = self._calls.get(call_sid)
+            if call is None:
+                return None
+            self._append([{'op': 'done', 'sid': call_sid}])
+            self._maybe_compact()
+            return call['exchanges']
+
+    def sweep(self, limit_overflow=False):
+        """Claim abandoned calls (idle past ttl, or the oldest beyond max_calls) and pass them to on_expire"""
+        with self._exclusive():
+            self._refresh()
+            cutoff = time.time() - self.ttl
+            by_age = sorted(self._calls.items(), key=lambda item: item[1]['last_seen'])
+            overflow = max(0, len(by_age) - self.max_calls)
+            claimed = [(sid, call) for i, (sid, call) in enumerate(by_age)
+                       if i < overflow or (not limit_overflow and call['last_seen'] < cutoff)]
+            if claimed:
+                self._append([{'op': 'done', 'sid': sid} for sid, _ in claimed])
+                self._maybe_compact()
+        for sid, call in claimed:
+            self.expired += 1
+            if self.on_expire is not None:
+                try:
+                    self.on_expire(sid, call['exchanges'])
+                except Exception as e:
+                    logger.error(f"Failed to summarise abandoned call {sid}: {e}")
+        return len(claimed)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='call-sweeper', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopping.set()
+
+    def _run(self):
+        while not self._stopping.wait(self.sweep_interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Call transcript sweep failed: {e}")
+
+    # Compaction
+
+    def _maybe_compact(self):
+        live_rows = sum(len(call['exchanges']) for call in self._calls.values())
+        if self._log_rows >= self.min_compact_rows and self._log_rows > max(live_rows, 1) * self.compact_ratio:
+            self._compact()
+
+    def _compact(self):
+        """Rewrite the log with only in-progress calls; caller holds the file lock"""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for sid, call in self._calls.items():
+                for e in call['exchanges']:
+                    f.write(json.dumps({'op': 'add', 'sid': sid, 'user': e['user'], 'bot': e['bot'],
+                                        'at': e['timestamp'], 'ts': call['last_seen']}, separators=(',', ':')) + '\n')
+        os.replace(tmp_path, self.path)
+        self._refresh()
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._calls)
+
+    def stats(self):
+        with self._lock:
+            self._refresh()
+            return {'active_calls': len(self._calls), 'log_rows': self._log_rows, 'expired': self.expired}
@@ -0,0 +1,212 @@
+import hashlib
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+COUNTERS_PATH = 'metrics/counters'
+LEADS_BY_DAY_PATH = 'metrics/leads_by_day'
+APPOINTMENT_STATUS_PATH = 'metrics/appointment_status'
+# Kept outside metrics/ so reading the counters never downloads the whole key set
+USER_KEYS_PATH = 'metrics_user_keys'
+
+
+def _incr_by(amount):
+    def _update(current):
+        try:
+            return max(0, int(current or 0) + amount)
+        except Exception:
+            return max(0, amount)
+    return _update
+
+
+def _mark_seen(result):
+    def _update(current):
+        result['new'] = current is None
+        return True
+    return _update
+
+
+def user_key(*candidates):
+    """Stable RTDB-safe key for the first non-empty identifier (email, phone, session id)"""
+    for candidate in candidates:
+        if candidate:
+            return hashlib.sha1(str(candidate).strip().lower().encode('utf-8')).hexdigest()[:20]
+    return None
+
+
+def day_bucket(created_ms):
+    return datetime.fromtimestamp((created_ms or 0) / 1000).strftime('%Y-%m-%d')
+
+
+class MetricsAggregator:
+    """Dashboard counters under metrics/, maintained at write time with RTDB transactions
+
+    Updates run on a background thread so request handlers don't wait on transactions.
+    """
+
+    def __init__(self, get_ref, max_queue=10000):
+        self.get_ref = get_ref
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self.dropped = 0
+        self.applied = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='metrics-aggregator', daemon=True)
+            self._thread.start()
+        return self
+
+    def flush(self, timeout=5.0):
+        deadline = time.time() + timeout
+        while self._queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.01)
+        return not self._queue.unfinished_tasks
+
+    def _submit(self, func, *args):
+        if self._thread is None:
+            self._apply(func, *args)
+            return
+        try:
+            self._queue.put_nowait((func, args))
+        except queue.Full:
+            self.dropped += 1
+            logger.warning('Metrics queue full, dropping update; run a metrics rebuild to resync')
+
+    def _run(self):
+        while True:
+            func, args = self._queue.get()
+            try:
+                self._apply(func, *args)
+            finally:
+                self._queue.task_done()
+
+    def _apply(self, func, *args):
+        try:
+            func(*args)
+            self.applied += 1
+        except Exception as e:
+            logger.warning(f"Failed to update dashboard metrics: {e}")
+
+    def _incr(self, path, amount=1):
+        self.get_ref(path).transaction(_incr_by(amount))
+
+    def _count_user(self, key):
+        if not key:
+            return
+        result = {}
+        self.get_ref(f'{USER_KEYS_PATH}/{key}').transaction(_mark_seen(result))
+        if result.get('new'):
+            self._incr(f'{COUNTERS_PATH}/unique_users')
+
+    # Write-time hooks
+
+    def record_lead(self, created_ms, contact_key=None):
+        def _record():
+            self._incr(f'{COUNTERS_PATH}/leads')
+            self._incr(f'{LEADS_BY_DAY_PATH}/{day_bucket(created_ms)}')
+            self._count_user(contact_key)
+        self._submit(_record)
+
+    def record_appointment(self, status, contact_key=None):
+        def _record():
+            self._incr(f'{COUNTERS_PATH}/appointments')
+            self._incr(f'{APPOINTMENT_STATUS_PATH}/{status}')
+            self._count_user(contact_key)
+        self._submit(_record)
+
+    def record_status_change(self, old_status, new_status):
+        if old_status == new_status:
+            return
+
+        def _record():
+            if old_status:
+                self._incr(f'{APPOINTMENT_STATUS_PATH}/{old_status}', -1)
+            self._incr(f'{APPOINTMENT_STATUS_PATH}/{new_status}')
+        self._submit(_record)
+
+    def record_conversation(self, contact_key=None):
+        def _record():
+            self._incr(f'{COUNTERS_PATH}/conversations')
+            self._count_user(contact_key)
+        self._submit(_record)
+
+    def record_user(self, contact_key):
+        self._submit(self._count_user, contact_key)
+
+    # Reads
+
+    def read(self, since_day=None):
+        """Counters, status histogram and per-day lead buckets (from since_day onwards)"""
+        counters = self.get_ref(COUNTERS_PATH).get()
+        statuses = self.get_ref(APPOINTMENT_STATUS_PATH).get() or {}
+        days_query = self.get_ref(LEADS_BY_DAY_PATH).order_by_key()
+        if since_day:
+            days_query = days_query.start_at(since_day)
+        days = days_query.get() or {}
+        return _shape(counters, statuses, days)
+
+    def _replace(self, path, value):
+        if value:
+            self.get_ref(path).set(value)
+        else:
+            self.get_ref(path).delete()
+
+    def rebuild(self, leads, appointments, conversations, users):
+        """Recompute every metric from full snapshots, e.g. to backfill existing data"""
+        result = summarise(leads, appointments, conversations, users)
+        keys = result.pop('user_keys')
+        self._replace(USER_KEYS_PATH, {k: True for k in keys})
+        self._replace(COUNTERS_PATH, result['counters'])
+        self._replace(LEADS_BY_DAY_PATH, result['leads_by_day'])
+        self._replace(APPOINTMENT_STATUS_PATH, result['appointment_status'])
+        return result
+
+
+def _shape(counters, statuses, days):
+    return {
+        'counters': counters,
+        'appointment_status': {k: int(v) for k, v in (statuses or {}).items() if v},
+        'leads_by_day': {k: int(v) for k, v in (days or {}).items()}
+    }
+
+
+def read_node(node, since_day=None):
+    """MetricsAggregator.read() for an in-memory copy of the metrics/ node (e.g. the RTDB mirror)"""
+    days = node.get(LEADS_BY_DAY_PATH.split('/')[-1]) or {}
+    if since_day:
+        days = {k: v for k, v in days.items() if k >= since_day}
+    return _shape(node.get(COUNTERS_PATH.split('/')[-1]), node.get(APPOINTMENT_STATUS_PATH.split('/')[-1]), days)
+
+
+def summarise(leads, appointments, conversations, users):
+    """Counters, per-day lead buckets, status histogram and user keys computed from full snapshots"""
+    counters = {'leads': 0, 'appointments': 0, 'conversations': 0, 'unique_users': 0}
+    leads_by_day = {}
+    statuses = {}
+    keys = set()
+    for d in (leads or {}).values():
+        counters['leads'] += 1
+        day = day_bucket(d.get('created_at'))
+        leads_by_day[day] = leads_by_day.get(day, 0) + 1
+        keys.add(user_key(d.get('email'), d.get('phone')))
+    for d in (appointments or {}).values():
+        counters['appointments'] += 1
+        status = (d.get('status') or 'pending').lower()
+        statuses[status] = statuses.get(status, 0) + 1
+        user = d.get('user') if isinstance(d.get('user'), dict) else {}
+        keys.add(user_key(user.get('email'), user.get('phone')))
+    for d in (conversations or {}).values():
+        counters['conversations'] += 1
+        details = d.get('user_details') if isinstance(d.get('user_details'), dict) else {}
+        keys.add(user_key(details.get('email'), details.get('phone'), d.get('session_id')))
+    for d in (users or {}).values():
+        if isinstance(d, dict):
+            keys.add(user_key(d.get('email'), d.get('phone')))
+    keys.discard(None)
+    counters['unique_users'] = len(keys)
+    return {'counters': counters, 'leads_by_day': leads_by_day, 'appointment_status': statuses, 'user_keys': keys}
@@ -0,0 +1,247 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process locking only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def _overlaps(path, batch):
+    """True if path equals, contains or is contained by a path already in the batch"""
+    for other in batch:
+        if path == other or path.startswith(other + '/') or other.startswith(path + '/'):
+            return True
+    return False
+
+
+class FirebaseWriter:
+    """Write-behind queue that batches RTDB writes into multi-path update() calls
+
+    Writes are enqueued by request handlers and applied by a background thread.
+    Batches that still fail after retrying are appended to a JSON-lines journal
+    and replayed, in order, before any newer batch once the database is reachable.
+    The journal is shared by worker processes, so spills and replays hold its file
+    lock: each batch is replayed by exactly one process and no append is lost.
+    """
+
+    def __init__(self, get_root, max_queue=10000, batch_size=100, flush_interval=0.5,
+                 max_retries=4, backoff=0.5, journal_path='firebase_journal.jsonl'):
+        self.get_root = get_root
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.journal_path = journal_path
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._journal_lock = threading.Lock()
+        self._thread = None
+        self._stopping = threading.Event()
+        self._replay_failures = 0
+        self._next_replay_at = 0.0
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.retries = 0
+        self.spilled = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='firebase-writer', daemon=True)
+            self._thread.start()
+        return self
+
+    def enqueue(self, path, value):
+        """Queue a set() of value at path; never blocks the caller"""
+        path = path.strip('/')
+        try:
+            self._queue.put_nowait((path, value))
+            self.enqueued += 1
+        except queue.Full:
+            logger.warning(f"Firebase write queue full, journaling write to {path}")
+            self._spill({path: value})
+
+    def flush(self, timeout=5.0):
+        """Wait until everything queued so far has been written or journaled"""
+        deadline = time.time() + timeout
+        while self._queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.01)
+        return not self._queue.unfinished_tasks
+
+    def stop(self, timeout=5.0):
+        """Flush for up to timeout seconds, then journal whatever is still queued or retrying"""
+        self.flush(timeout)
+        # A batch in its retry backoff gives up and is journaled once stopping is set
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._spill_queued()
+
+    def _spill_queued(self):
+        """Journal writes left in the queue, in order, as non-overlapping batches"""
+        batch, count = {}, 0
+        while True:
+            try:
+                path, value = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size or _overlaps(path, batch):
+                self._spill(batch)
+                batch = {}
+            batch[path] = value
+            count += 1
+            self._queue.task_done()
+        if batch:
+            self._spill(batch)
+        if count:
+            logger.warning(f"Journaled {count} queued Firebase writes at shutdown")
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'enqueued': self.enqueued,
+            'written': self.written,
+            'batches': self.batches,
+            'retries': self.retries,
+            'spilled': self.spilled,
+            'journal_pending': self._journal_pending()
+        }
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                if self._journal_pending() and time.time() >= self._next_replay_at:
+                    try:
+                        self._replay_journal()
+                    except Exception as e:
+                        logger.error(f"Firebase journal replay error: {e}")
+                continue
+            batch, taken, carry = {first[0]: first[1]}, 1, None
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    path, value = self._queue.get(timeout=max(0.0, deadline - time.time()))
+                except queue.Empty:
+                    break
+                taken += 1
+                if _overlaps(path, batch):
+                    # RTDB rejects multi-path updates with overlapping paths; start a new batch
+                    carry = (path, value)
+                    break
+                batch[path] = value
+            try:
+                self._write(batch)
+                if carry is not None:
+                    self._write({carry[0]: carry[1]})
+            except Exception as e:
+                logger.error(f"Firebase writer error: {e}")
+            finally:
+                for _ in range(taken):
+                    self._queue.task_done()
+
+    def _write(self, batch):
+        # Older journaled batches go first so later writes are not overwritten by a replay
+        if self._journal_pending() and not self._replay_journal():
+            self._spill(batch)
+            return
+        if self.batch_update(batch):
+            self.written += len(batch)
+            self.batches += 1
+        else:
+            self._spill(batch)
+
+    def batch_update(self, batch):
+        """Apply one batch as a multi-path update(), retrying with backoff; False once retries run out"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.get_root().update(batch)
+                return True
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error(f"Firebase batch of {len(batch)} writes failed: {e}")
+                    return False
+                self.retries += 1
+                delay = self.backoff * (2 ** attempt)
+                logger.warning(f"Firebase batch write failed ({e}), retrying in {delay:.1f}s")
+                if self._stopping.wait(delay):
+                    return False
+        return False
+
+    def _journal_pending(self):
+        try:
+            return os.path.getsize(self.journal_path) > 0
+        except OSError:
+            return False
+
+    @contextmanager
+    def _journal_exclusive(self):
+        with self._journal_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.journal_path + '.lock', 'a') as f:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _spill(self, batch):
+        with self._journal_exclusive():
+            try:
+                with open(self.journal_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(batch) + '\n')
+                self.spilled += len(batch)
+            except Exception as e:
+                logger.error(f"Failed to journal Firebase writes, {len(batch)} lost: {e}")
+
+    def _replay_journal(self):
+        """Apply journaled batches in order; returns True once the journal is empty"""
+        with self._journal_exclusive():
+            try:
+                with open(self.journal_path, 'r', encoding='utf-8') as f:
+                    lines = [line for line in f if line.strip()]
+            except FileNotFoundError:
+                return True
+            done = 0
+            for line in lines:
+                try:
+                    batch = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.error(f"Dropping corrupt Firebase journal entry: {line[:80]}")
+                    done += 1
+                    continue
+                try:
+                    self.get_root().update(batch)
+                except Exception as e:
+                    logger.warning(f"Firebase journal replay paused: {e}")
+                    break
+                self.written += len(batch)
+                self.batches += 1
+                done += 1
+            remaining = lines[done:]
+            tmp_path = self.journal_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.writelines(remaining)
+            os.replace(tmp_path, self.journal_path)
+            if done:
+                logger.info(f"Replayed {done} journaled Firebase batches, {len(remaining)} remaining")
+            if remaining:
+                # Back off idle replays while the database stays unreachable
+                self._replay_failures += 1
+                self._next_replay_at = time.time() + self.backoff * (2 ** min(self._replay_failures, 6))
+            else:
+                self._replay_failures = 0
+            return not remaining
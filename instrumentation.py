@@ -0,0 +1,214 @@
+import bisect
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from functools import wraps
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BACKGROUND = 'background'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, in the Prometheus exposition format"""
+
+    def __init__(self, name, help_text, label_names, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, *label_values):
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += seconds
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((k, list(v)) for k, v in self._series.items())
+        for label_values, counts in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == '+Inf' else f'le="{bound}"'
+                lines.append(f'{self.name}_bucket{_labels(self.label_names, label_values, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.label_names, label_values)} {_number(counts[-1])}')
+            lines.append(f'{self.name}_count{_labels(self.label_names, label_values)} {cumulative}')
+        return lines
+
+
+class Counter:
+    """Monotonic counter per label set"""
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] += amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            lines.append(f'{self.name}{_labels(self.label_names, label_values)} {value}')
+        return lines
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ('metrics', 'name', 'request', 'started')
+
+    def __init__(self, metrics, name, request):
+        self.metrics = metrics
+        self.name = name
+        self.request = request
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.started
+        endpoint = self.request['endpoint'] if self.request is not None else BACKGROUND
+        self.metrics.spans.observe(elapsed, self.name, endpoint)
+        if self.request is not None:
+            totals = self.request['spans']
+            totals[self.name] = totals.get(self.name, 0.0) + elapsed
+        return False
+
+
+class Metrics:
+    """Request timings, named spans and counters, rendered for a Prometheus scrape
+
+    begin_request()/end_request() bracket a request on the current thread; spans
+    opened on that thread are attributed to its endpoint so a slow route can be
+    broken down by dependency. Requests are sampled at sample_rate and spans
+    follow their request's decision; spans on background threads are sampled
+    on their own. With sample_rate 0 spans are a shared no-op object and only
+    the counters are kept.
+    """
+
+    def __init__(self, sample_rate=1.0, slow_request=None, buckets=DEFAULT_BUCKETS):
+        self.sample_rate = sample_rate
+        self.slow_request = slow_request
+        self.requests = Histogram('http_request_duration_seconds', 'Time spent handling a request',
+                                  ('endpoint', 'method', 'status'), buckets)
+        self.spans = Histogram('span_duration_seconds', 'Time spent in a dependency call or file operation',
+                               ('span', 'endpoint'), buckets)
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _sampled(self):
+        rate = self.sample_rate
+        return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+
+    # Requests
+
+    def begin_request(self, endpoint):
+        if self._sampled():
+            self._local.request = {'endpoint': endpoint or 'unmatched', 'spans': {},
+                                   'started': time.perf_counter()}
+        else:
+            self._local.request = None
+
+    def end_request(self, method, status):
+        request = getattr(self._local, 'request', None)
+        if request is None:
+            return
+        self._local.request = None
+        elapsed = time.perf_counter() - request['started']
+        self.requests.observe(elapsed, request['endpoint'], method, str(status))
+        if self.slow_request is not None and elapsed >= self.slow_request:
+            breakdown = ', '.join(f'{name} {seconds:.3f}s' for name, seconds in
+                                  sorted(request['spans'].items(), key=lambda item: -item[1]))
+            logger.warning(f"Slow request {method} {request['endpoint']}: {elapsed:.3f}s ({breakdown or 'no spans'})")
+
+    # Spans
+
+    def span(self, name):
+        """Context manager timing the enclosed block as span `name`"""
+        request = getattr(self._local, 'request', False)
+        if request is None:
+            return _NOOP  # inside an unsampled request
+        if request is False:
+            if not self._sampled():
+                return _NOOP
+            request = None
+        return _Span(self, name, request)
+
+    def timed(self, name):
+        """Decorator form of span()"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def instrument(self, obj, prefix, method_names):
+        """Wrap the named methods of obj in spans called '<prefix>.<method>'"""
+        for method_name in method_names:
+            setattr(obj, method_name, self.timed(f'{prefix}.{method_name}')(getattr(obj, method_name)))
+        return obj
+
+    # Counters
+
+    def counter(self, name, help_text, label_names=()):
+        # Two threads registering the same name must get the same Counter, or increments are lost
+        with self._lock:
+            if name not in self._counters:
+                self._counters[name] = Counter(name, help_text, label_names)
+            return self._counters[name]
+
+    def render(self):
+        lines = self.requests.render() + self.spans.render()
+        with self._lock:
+            counters = list(self._counters.values())
+        for counter in counters:
+            lines.extend(counter.render())
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,206 @@
+import re
+from collections import deque, namedtuple
+
+Intent = namedtuple('Intent', ['name', 'pattern', 'response', 'priority'])
+IntentMatch = namedtuple('IntentMatch', ['intent', 'confidence', 'start', 'end'])
+
+# Priorities: curated answers win over generated ones when both match
+PRIORITY_COMMON = 100
+PRIORITY_TOPIC = 50
+PRIORITY_ITEM = 10
+
+_NON_WORD_RE = re.compile(r'[^\w]+')
+
+# Words that carry no intent; ignored when measuring how much of a message a pattern covers
+FILLER_WORDS = frozenset([
+    'a', 'an', 'the', 'is', 'are', 'do', 'does', 'you', 'your', 'we', 'i', 'me', 'my',
+    'can', 'could', 'please', 'tell', 'about', 'any', 'have', 'for', 'in', 'with', 'of',
+    'to', 'and', 'hi', 'hello', 'hey', 'what', 'provide', 'offer'
+])
+
+
+def normalize_text(text):
+    """Lowercase and collapse punctuation/whitespace so matches land on word boundaries"""
+    return ' ' + ' '.join(_NON_WORD_RE.sub(' ', (text or '').lower()).split()) + ' '
+
+
+class IntentMatcher:
+    """Aho-Corasick automaton matching every intent pattern in a single pass over the input"""
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        self._intents = []
+        self._built = False
+
+    def add(self, name, pattern, response, priority=PRIORITY_ITEM):
+        """Register pattern; a pattern already registered keeps its first intent"""
+        key = normalize_text(pattern)
+        if not key.strip():
+            return
+        state = 0
+        for ch in key:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = nxt
+        if any(self._intents[idx].pattern == key.strip() for idx in self._output[state]):
+            return
+        intent = Intent(name, key.strip(), response, priority)
+        self._output[state].append(len(self._intents))
+        self._intents.append(intent)
+        self._built = False
+
+    def build(self):
+        """Compute failure links; must run after the last add()"""
+        queue = deque()
+        for nxt in self._goto[0].values():
+            self._fail[nxt] = 0
+            queue.append(nxt)
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(ch, 0)
+                self._output[nxt] = self._output[nxt] + self._output[self._fail[nxt]]
+        self._built = True
+        return self
+
+    def find_all(self, text):
+        """Yield (intent, start, end) for every pattern occurring in text"""
+        if not self._built:
+            self.build()
+        key = normalize_text(text)
+        state = 0
+        for i, ch in enumerate(key):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            for idx in self._output[state]:
+                intent = self._intents[idx]
+                # Patterns are stored padded with spaces, so end points just past the trailing space
+                yield intent, i + 1 - (len(intent.pattern) + 2), i + 1
+
+    def match(self, text, min_confidence=0.0):
+        """Best match ranked by priority then confidence, or None
+
+        Confidence is the share of the message's non-filler words covered by the pattern.
+        Matches below PRIORITY_COMMON need more than min_confidence to be considered, so a
+        weak topic match cannot outrank a strong item match and then fail the threshold.
+        """
+        all_words = normalize_text(text).split()
+        if not all_words:
+            return None
+        words = len([w for w in all_words if w not in FILLER_WORDS]) or len(all_words)
+        best = None
+        for intent, start, end in self.find_all(text):
+            confidence = min(1.0, len(intent.pattern.split()) / words)
+            if intent.priority < PRIORITY_COMMON and confidence <= min_confidence:
+                continue
+            candidate = IntentMatch(intent, confidence, start, end)
+            if best is None or (intent.priority, confidence) > (best.intent.priority, best.confidence):
+                best = candidate
+        return best
+
+    def __len__(self):
+        return len(self._intents)
+
+
+def _join(items):
+    items = list(items)
+    if len(items) <= 1:
+        return ''.join(items)
+    return ', '.join(items[:-1]) + ' and ' + items[-1]
+
+
+def _service_patterns(service):
+    """Full name plus any abbreviation in parentheses, e.g. 'Search Engine Optimization (SEO)'"""
+    patterns = [service]
+    match = re.match(r'^(.*?)\s*\(([^)]+)\)\s*$', service)
+    if match:
+        patterns = [match.group(1), match.group(2)]
+    return patterns
+
+
+def build_intent_matcher(data, common_questions=None):
+    """Generate canned intents from imsolutions_content.json and compile the matcher"""
+    matcher = IntentMatcher()
+    info = data.get('company_info', {})
+    name = info.get('name', 'our company')
+
+    for question, response in (common_questions or {}).items():
+        matcher.add(f'common:{question}', question, response, PRIORITY_COMMON)
+
+    services = data.get('services', {})
+    for kind, label in (('online_services', 'online'), ('offline_services', 'offline')):
+        items = services.get(kind, [])
+        if not items:
+            continue
+        summary = f"Our {label} services include {_join(items[:6])}, and more. Would you like details about any of them?"
+        for pattern in (f'{label} services', f'{label} marketing services', f'{label} advertising'):
+            matcher.add(f'services:{label}', pattern, summary, PRIORITY_TOPIC)
+        for service in items:
+            response = f"Yes, {name} offers {service} as part of our {label} services. Would you like more details or a quote?"
+            for pattern in _service_patterns(service):
+                matcher.add(f'service:{service}', pattern, response, PRIORITY_ITEM)
+
+    offices = info.get('offices', [])
+    branches = [b.get('location') for b in data.get('contact', {}).get('branch_offices', []) if b.get('location')]
+    all_offices = list(dict.fromkeys(offices + branches))
+    if all_offices:
+        response = f"We are headquartered in {info.get('location', '')} with offices in {_join(all_offices)}."
+        for pattern in ('offices', 'office locations', 'where is your office', 'where are your offices', 'branches'):
+            matcher.add('offices', pattern, response, PRIORITY_TOPIC)
+        for city in all_offices:
+            matcher.add(f'office:{city}', f'office in {city}', f"Yes, we have an office in {city}.", PRIORITY_ITEM)
+
+    careers = data.get('career_opportunities', [])
+    if careers:
+        response = f"We're hiring for roles such as {_join(careers[:5])}, and more. Would you like to know about a specific role?"
+        for pattern in ('careers', 'career', 'jobs', 'job openings', 'are you hiring', 'vacancies', 'openings'):
+            matcher.add('careers', pattern, response, PRIORITY_TOPIC)
+        for role in careers:
+            response = f"Yes, we have an opening for {role}. Would you like to share your details so our HR team can reach out?"
+            matcher.add(f'career:{role}', role, response, PRIORITY_ITEM)
+
+    values = data.get('values', [])
+    if values:
+        response = f"Our values are: {_join(values)}."
+        for pattern in ('values', 'your values', 'company values', 'core values'):
+            matcher.add('values', pattern, response, PRIORITY_TOPIC)
+
+    principles = data.get('core_principles', [])
+    if principles:
+        response = 'Our core principles are ' + '; '.join(principles) + '.'
+        for pattern in ('principles', 'core principles'):
+            matcher.add('principles', pattern, response, PRIORITY_TOPIC)
+
+    mission = data.get('mission', [])
+    if mission:
+        response = 'Our mission is to ' + '; '.join(m[0].lower() + m[1:] for m in mission) + '.'
+        for pattern in ('mission', 'your mission', 'what is your mission'):
+            matcher.add('mission', pattern, response, PRIORITY_TOPIC)
+
+    if data.get('vision'):
+        for pattern in ('vision', 'your vision'):
+            matcher.add('vision', pattern, data['vision'], PRIORITY_TOPIC)
+
+    if info.get('founded'):
+        response = f"{name} was founded in {info['founded']} and is based in {info.get('location', '')}."
+        for pattern in ('when were you founded', 'founded', 'how old is your company', 'established'):
+            matcher.add('founded', pattern, response, PRIORITY_TOPIC)
+
+    if info.get('team_size'):
+        response = f"We have a team of {info['team_size']} professionals."
+        for pattern in ('team size', 'how many employees', 'how big is your team'):
+            matcher.add('team_size', pattern, response, PRIORITY_TOPIC)
+
+    return matcher.build()
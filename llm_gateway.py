@@ -0,0 +1,143 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+logger = logging.getLogger(__name__)
+
+_END = object()
+
+
+class GatewayBusy(Exception):
+    """No free slot for another in-flight Gemini call within the queue timeout"""
+
+
+class GatewayTimeout(Exception):
+    """Gemini did not answer before the call deadline"""
+
+
+class LLMGateway:
+    """Bounded, deadline-aware front for model.generate_content
+
+    At most max_concurrency calls are in flight; a caller that cannot get a slot
+    within queue_timeout gets GatewayBusy. Callers stop waiting after timeout
+    seconds (GatewayTimeout) while the call finishes in the background and keeps
+    its slot until then. Concurrent generate() calls for the same prompt share a
+    single upstream request.
+    """
+
+    def __init__(self, model, max_concurrency=8, timeout=10.0, queue_timeout=1.0):
+        self.model = model
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='llm')
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.errors = 0
+
+    def _acquire(self):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            self._count('rejected')
+            raise GatewayBusy('Too many Gemini calls in flight')
+        self._count('calls')
+
+    def _count(self, name):
+        # Counters are bumped from request threads and executor threads alike
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _call(self, prompt):
+        try:
+            return self.model.generate_content(prompt).text
+        except Exception:
+            self._count('errors')
+            raise
+        finally:
+            self._slots.release()
+
+    def generate(self, prompt, timeout=None):
+        """Reply text for prompt, waiting at most timeout seconds"""
+        timeout = self.timeout if timeout is None else timeout
+        with self._lock:
+            future = self._inflight.get(prompt)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[prompt] = future
+            else:
+                self.coalesced += 1
+        if leader:
+            try:
+                self._acquire()
+            except GatewayBusy as e:
+                self._forget(prompt, future)
+                future.set_exception(e)
+                raise
+            self._executor.submit(self._run, prompt, future)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            self._count('timeouts')
+            raise GatewayTimeout(f'Gemini did not answer within {timeout}s')
+
+    def _run(self, prompt, future):
+        try:
+            result = self._call(prompt)
+        except Exception as e:
+            self._forget(prompt, future)
+            future.set_exception(e)
+        else:
+            self._forget(prompt, future)
+            future.set_result(result)
+
+    def _forget(self, prompt, future):
+        with self._lock:
+            if self._inflight.get(prompt) is future:
+                del self._inflight[prompt]
+
+    def stream(self, prompt, timeout=None):
+        """Yield streamed response chunks; the deadline applies to the whole reply"""
+        deadline = time.time() + (self.timeout if timeout is None else timeout)
+        self._acquire()
+        chunks = queue.Queue()
+
+        def _pump():
+            try:
+                for chunk in self.model.generate_content(prompt, stream=True):
+                    chunks.put(chunk)
+                chunks.put(_END)
+            except Exception as e:
+                self._count('errors')
+                chunks.put(e)
+            finally:
+                self._slots.release()
+
+        self._executor.submit(_pump)
+        while True:
+            try:
+                item = chunks.get(timeout=max(0.0, deadline - time.time()))
+            except queue.Empty:
+                self._count('timeouts')
+                raise GatewayTimeout('Gemini stream exceeded its deadline')
+            if item is _END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def stats(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'coalesced': self.coalesced,
+                'timeouts': self.timeouts,
+                'rejected': self.rejected,
+                'errors': self.errors,
+                'inflight_prompts': len(self._inflight)
+            }
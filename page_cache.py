@@ -0,0 +1,133 @@
+import gzip
+import hashlib
+import threading
+import time
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESSIBLE_TYPES = {
+    'text/html', 'text/plain', 'text/css', 'text/csv', 'text/xml', 'application/json',
+    'application/javascript', 'application/xml', 'image/svg+xml'
+}
+
+
+def accepted_encoding(accept_encoding):
+    """Best content coding the client accepts: 'br' (when brotli is installed), 'gzip' or None"""
+    accepted = set()
+    for part in (accept_encoding or '').split(','):
+        coding, *params = part.split(';')
+        q = 1.0
+        for param in params:
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            accepted.add(coding.strip().lower())
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted or '*' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding, fast=False):
+    if encoding == 'br':
+        return brotli.compress(data, quality=5 if fast else 11)
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=6 if fast else 9, mtime=0)
+    return data
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    # Weak comparison: W/"x" and "x" name the same representation
+    wanted = etag[2:] if etag.startswith('W/') else etag
+    return any((tag.strip()[2:] if tag.strip().startswith('W/') else tag.strip()) == wanted
+               for tag in if_none_match.split(','))
+
+
+class Page:
+    """A rendered page with its ETag and lazily compressed variants
+
+    Variants listed in precompress are built up front (best compression); others
+    are built on first request with a faster setting and kept.
+    """
+
+    __slots__ = ('body', 'etag', 'mimetype', '_encoded', '_lock')
+
+    def __init__(self, body, mimetype='text/html', precompress=()):
+        self.body = body.encode('utf-8') if isinstance(body, str) else body
+        self.etag = 'W/"{}"'.format(hashlib.blake2b(self.body, digest_size=12).hexdigest())
+        self.mimetype = mimetype
+        self._encoded = {None: self.body}
+        self._lock = threading.Lock()
+        for encoding in precompress:
+            if encoding != 'br' or brotli is not None:
+                self._encoded[encoding] = compress(self.body, encoding)
+
+    def encoded(self, encoding):
+        data = self._encoded.get(encoding)
+        if data is None:
+            with self._lock:
+                data = self._encoded.get(encoding)
+                if data is None:
+                    data = self._encoded[encoding] = compress(self.body, encoding, fast=True)
+        return data
+
+
+class DataVersion:
+    """Counter bumped whenever this process changes data shown on a cached page"""
+
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def bump(self):
+        with self._lock:
+            self._value += 1
+
+    @property
+    def value(self):
+        return self._value
+
+
+class PageCache:
+    """Latest rendered Page per name, valid while its data-version token is unchanged
+
+    ttl bounds how long a page is reused without a version change, which covers
+    writes made by other processes and time-dependent content.
+    """
+
+    def __init__(self, ttl=30.0):
+        self.ttl = ttl
+        self._pages = {}  # name -> (version, rendered_at, page)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.renders = 0
+
+    def get(self, name, version):
+        with self._lock:
+            entry = self._pages.get(name)
+            if entry is None or entry[0] != version or entry[1] + self.ttl <= time.time():
+                return None
+            self.hits += 1
+            return entry[2]
+
+    def put(self, name, version, page):
+        with self._lock:
+            self._pages[name] = (version, time.time(), page)
+            self.renders += 1
+        return page
+
+    def stats(self):
+        with self._lock:
+            return {'pages': len(self._pages), 'hits': self.hits, 'renders': self.renders}
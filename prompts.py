@@ -0,0 +1,153 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import namedtuple
+
+from retrieval import BM25Index, chunk_content
+
+logger = logging.getLogger(__name__)
+
+# Gemini averages roughly four characters per token for English text
+CHARS_PER_TOKEN = 4
+
+Prompt = namedtuple('Prompt', ['text', 'tokens', 'input_tokens', 'context_tokens', 'truncated', 'sources'])
+_Template = namedtuple('_Template', ['head', 'context', 'tail', 'fixed_tokens', 'context_tokens', 'index'])
+
+
+def estimate_tokens(text):
+    """Cheap token estimate, good enough for budgeting and cost tracking"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut text to roughly max_tokens, on a word boundary where possible"""
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text, False
+    cut = text[:limit - 3]
+    space = cut.rfind(' ')
+    if space > limit // 2:
+        cut = cut[:space]
+    return cut.rstrip() + '...', True
+
+
+class PromptBuilder:
+    """Gemini prompt with the static company context rendered once
+
+    The parts of the prompt around the user's question are rendered from the content
+    file at load time and re-rendered only when the file changes, together with a
+    BM25 index over its chunks. Each build() adds the top_k chunks relevant to the
+    question, clips the question to max_input_tokens and the context to
+    max_context_tokens, and records the estimated prompt size.
+    """
+
+    def __init__(self, path='imsolutions_content.json', max_input_tokens=256, max_context_tokens=1024,
+                 top_k=3, check_interval=5.0):
+        self.path = path
+        self.max_input_tokens = max_input_tokens
+        self.max_context_tokens = max_context_tokens
+        self.top_k = top_k
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked_at = 0.0
+        self.data = {}
+        self.prompts = 0
+        self.total_tokens = 0
+        self.max_tokens = 0
+        self.truncations = 0
+        self.reload()
+
+    def reload(self):
+        with self._lock:
+            mtime = os.stat(self.path).st_mtime
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._template = self._render(data)
+            self.data = data
+            self._mtime = mtime
+            self._checked_at = time.time()
+        logger.info(f"Prompt template compiled from {self.path}")
+
+    def _render(self, data):
+        info = data['company_info']
+        name = info['name']
+        head = f"You are a customer service rep for {name}. \nAnswer this question briefly (max 6 lines): "
+        context = f"""Company Info:
+- Type: {info['type']}
+- Founded: {info['founded']}
+- Location: {info['location']}
+
+Services: {', '.join(data['services']['online_services'][:5])} and more."""
+        context, _ = truncate_to_tokens(context, self.max_context_tokens)
+        tail = (f"\n\nBe brief, helpful, and professional. Do not include contact information or website "
+                f"details in your response. If question is unrelated to {name}, politely redirect to our services.")
+        return _Template(head, context, tail, estimate_tokens(head) + estimate_tokens(tail),
+                         estimate_tokens(context), BM25Index(chunk_content(data)))
+
+    def _relevant(self, template, question):
+        """Lines of retrieved context that fit in what is left of the context budget"""
+        lines, titles = [], []
+        budget = self.max_context_tokens - template.context_tokens
+        hits = template.index.search(question, self.top_k)
+        for chunk, score in hits:
+            # Weak matches on a single generic word add tokens without adding relevance
+            if score < hits[0][1] * 0.5:
+                break
+            line = f"- {chunk.text}"
+            tokens = estimate_tokens(line) + 1
+            if tokens > budget:
+                break
+            budget -= tokens
+            lines.append(line)
+            titles.append(chunk.title)
+        return lines, titles
+
+    def _maybe_reload(self):
+        now = time.time()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        try:
+            changed = os.stat(self.path).st_mtime != self._mtime
+        except OSError:
+            return
+        if changed:
+            try:
+                self.reload()
+            except Exception as e:
+                logger.error(f"Failed to reload {self.path}, keeping the previous prompt: {e}")
+
+    def build(self, user_input):
+        self._maybe_reload()
+        template = self._template
+        question, truncated = truncate_to_tokens(user_input.strip(), self.max_input_tokens)
+        input_tokens = estimate_tokens(question)
+        context = template.context
+        lines, sources = self._relevant(template, question) if self.top_k else ([], [])
+        if lines:
+            context += '\n\nRelevant details:\n' + '\n'.join(lines)
+        context_tokens = estimate_tokens(context)
+        text = f"{template.head}{question}\n\n{context}{template.tail}"
+        tokens = template.fixed_tokens + input_tokens + context_tokens
+        with self._lock:
+            self.prompts += 1
+            self.total_tokens += tokens
+            self.max_tokens = max(self.max_tokens, tokens)
+            self.truncations += int(truncated)
+        return Prompt(text, tokens, input_tokens, context_tokens, truncated, sources)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'prompts': self.prompts,
+                'total_tokens': self.total_tokens,
+                'avg_tokens': (self.total_tokens / self.prompts) if self.prompts else 0.0,
+                'max_tokens': self.max_tokens,
+                'truncated_inputs': self.truncations,
+                'max_input_tokens': self.max_input_tokens,
+                'max_context_tokens': self.max_context_tokens
+            }
@@ -0,0 +1,191 @@
+"""Compact dashboard records
+
+RTDB and local storage hand back one dict per record. The dashboard orders them
+on each type's rank() of the ordering field, converts only the rows shown to
+these slotted types, and formats their timestamps a column at a time.
+"""
+from datetime import datetime, timezone
+
+
+def iso_from_ms(values):
+    """ISO-8601 local times for a column of epoch milliseconds; repeated values are converted once"""
+    fromtimestamp = datetime.fromtimestamp
+    seen = {}
+    out = []
+    for ms in values:
+        iso = seen.get(ms) if isinstance(ms, (int, float)) else None
+        if iso is None:
+            try:
+                iso = fromtimestamp(ms / 1000).isoformat()
+            except Exception:
+                iso = str(ms)
+            else:
+                seen[ms] = iso
+        out.append(iso)
+    return out
+
+
+def _rank_ms(value):
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else float('-inf')
+
+
+def parse_time(value):
+    """(normalised ISO text, epoch seconds) for an appointment time; naive times are taken as UTC"""
+    try:
+        dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except Exception:
+        return value, None
+    epoch = (dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)).timestamp()
+    return dt.isoformat(), epoch
+
+
+class Lead:
+    __slots__ = ('id', 'name', 'email', 'phone', 'message', 'source', 'created_ms')
+
+    def __init__(self, id, name, email, phone, message, source, created_ms):
+        self.id = id
+        self.name = name
+        self.email = email
+        self.phone = phone
+        self.message = message
+        self.source = source
+        self.created_ms = created_ms
+
+    @classmethod
+    def from_raw(cls, key, d):
+        return cls(d.get('id', key), d.get('name', ''), d.get('email', ''), d.get('phone', ''),
+                   d.get('message', ''), d.get('source', ''), d.get('created_at') or 0)
+
+    @staticmethod
+    def rank(created_at):
+        """Sort rank of a stored created_at (epoch milliseconds)"""
+        return _rank_ms(created_at)
+
+    @staticmethod
+    def to_dicts(records):
+        created = iso_from_ms([r.created_ms for r in records])
+        return [{
+            'id': r.id,
+            'name': r.name,
+            'email': r.email,
+            'phone': r.phone,
+            'message': r.message,
+            'source': r.source,
+            'created_at': iso
+        } for r, iso in zip(records, created)]
+
+
+class Appointment:
+    __slots__ = ('id', 'title', 'time', 'epoch', 'notes', 'status', 'user_name', 'user_email',
+                 'user_phone', 'user_company')
+
+    def __init__(self, id, title, time, epoch, notes, status, user_name, user_email, user_phone, user_company):
+        self.id = id
+        self.title = title
+        self.time = time
+        self.epoch = epoch
+        self.notes = notes
+        self.status = status
+        self.user_name = user_name
+        self.user_email = user_email
+        self.user_phone = user_phone
+        self.user_company = user_company
+
+    @classmethod
+    def from_raw(cls, key, d):
+        time_iso, epoch = parse_time(d.get('time', ''))
+        # RTDB records nest the user; local rows keep flat user_* fields
+        user = d.get('user') or {
+            'name': d.get('user_name', ''),
+            'email': d.get('user_email', ''),
+            'phone': d.get('user_phone', ''),
+            'company': d.get('user_company', '')
+        }
+        if not isinstance(user, dict):
+            user = {}
+        name = user.get('name', 'Anonymous User')
+        if not name or name == 'Anonymous':
+            name = 'Anonymous User'
+        return cls(d.get('id', key), d.get('title', ''), time_iso, epoch, d.get('notes', ''),
+                   (d.get('status') or 'pending').lower(), name, user.get('email', ''),
+                   user.get('phone', ''), user.get('company', ''))
+
+    @staticmethod
+    def rank(time):
+        """Sort rank of a stored slot time: epoch seconds, so mixed offsets order correctly"""
+        epoch = parse_time(time)[1] if isinstance(time, str) else None
+        return epoch if epoch is not None else float('-inf')
+
+    @staticmethod
+    def to_dicts(records):
+        return [{
+            'id': r.id,
+            'title': r.title,
+            'time': r.time,
+            'notes': r.notes,
+            'status': r.status,
+            'user': {'name': r.user_name, 'email': r.user_email, 'phone': r.user_phone, 'company': r.user_company}
+        } for r in records]
+
+
+class Conversation:
+    __slots__ = ('id', 'user_message', 'bot_response', 'timestamp_ms', 'session_id', 'user_details')
+
+    def __init__(self, id, user_message, bot_response, timestamp_ms, session_id, user_details):
+        self.id = id
+        self.user_message = user_message
+        self.bot_response = bot_response
+        self.timestamp_ms = timestamp_ms
+        self.session_id = session_id
+        self.user_details = user_details
+
+    @classmethod
+    def from_raw(cls, key, d):
+        return cls(d.get('id', key), d.get('user_message', ''), d.get('bot_response', ''),
+                   d.get('timestamp') or 0, d.get('session_id', 'default'), d.get('user_details', {}))
+
+    @staticmethod
+    def rank(timestamp):
+        """Sort rank of a stored timestamp (epoch milliseconds)"""
+        return _rank_ms(timestamp)
+
+    @staticmethod
+    def to_dicts(records):
+        timestamps = iso_from_ms([r.timestamp_ms for r in records])
+        return [{
+            'id': r.id,
+            'user_message': r.user_message,
+            'bot_response': r.bot_response,
+            'timestamp': iso,
+            'session_id': r.session_id,
+            'user_details': r.user_details
+        } for r, iso in zip(records, timestamps)]
+
+
+class FormUser:
+    """Chatbot form submission; its fields vary, so they are kept as submitted"""
+
+    __slots__ = ('id', 'fields')
+
+    def __init__(self, id, fields):
+        self.id = id
+        self.fields = fields
+
+    @classmethod
+    def from_raw(cls, key, d):
+        return cls(key, d)
+
+    @staticmethod
+    def rank(key):
+        """Sort rank of a push key; push keys sort by creation time"""
+        return str(key)
+
+    @staticmethod
+    def to_dicts(records):
+        return [dict(r.fields, id=r.id) for r in records]
+
+
+def to_dicts(record_type, items):
+    """Template/JSON rows for (key, raw dict) pairs, in the given order"""
+    return record_type.to_dicts([record_type.from_raw(key, d) for key, d in items])
+
@@ -0,0 +1,108 @@
+import math
+import re
+from collections import Counter, defaultdict, namedtuple
+
+Chunk = namedtuple('Chunk', ['title', 'text'])
+
+_WORD_RE = re.compile(r'\w+')
+
+QUERY_STOP_WORDS = frozenset([
+    'a', 'an', 'the', 'is', 'are', 'am', 'was', 'were', 'be', 'do', 'does', 'did', 'you', 'your',
+    'we', 'our', 'i', 'me', 'my', 'can', 'could', 'would', 'will', 'please', 'tell', 'about', 'any',
+    'have', 'has', 'for', 'in', 'on', 'at', 'with', 'of', 'to', 'and', 'or', 'what', 'which', 'who',
+    'how', 'where', 'when', 'it', 'this', 'that', 'there', 'hi', 'hello', 'hey'
+])
+
+
+def tokenize(text):
+    """Lowercased words without stop-words, with a naive plural strip (services -> service)"""
+    tokens = []
+    for word in _WORD_RE.findall(text.lower()):
+        if word in QUERY_STOP_WORDS:
+            continue
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+def _groups(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def chunk_content(data):
+    """Split imsolutions_content.json into short, self-contained passages
+
+    Contact details are left out on purpose: the prompt tells Gemini not to share them.
+    """
+    info = data.get('company_info', {})
+    name = info.get('name', 'The company')
+    chunks = []
+    offices = list(info.get('offices', []))
+    offices += [b['location'] for b in data.get('contact', {}).get('branch_offices', [])
+                if b.get('location') and b['location'] not in offices]
+    if info:
+        chunks.append(Chunk('Company', f"{name} is a {info.get('type', '')} founded in {info.get('founded', '')}, "
+                                       f"headquartered in {info.get('location', '')} with a team of "
+                                       f"{info.get('team_size', '')} people."))
+    if offices:
+        chunks.append(Chunk('Offices', f"Office locations and branches: headquarters in {info.get('location', '')}; "
+                                       f"offices in {', '.join(offices)}."))
+    journey = data.get('journey', {})
+    if journey:
+        chunks.append(Chunk('History', 'Company history and journey: ' +
+                            '; '.join(f'{year}: {event}' for year, event in journey.items()) + '.'))
+    services = data.get('services', {})
+    for kind, label, size in (('online_services', 'Online (digital marketing) services', 6),
+                              ('offline_services', 'Offline (outdoor advertising) services', 7)):
+        for group in _groups(services.get(kind, []), size):
+            chunks.append(Chunk(label, f"{label}: {', '.join(group)}."))
+    careers = data.get('career_opportunities', [])
+    if careers:
+        chunks.append(Chunk('Careers', f"Careers, jobs and openings. We are hiring for: {', '.join(careers)}."))
+    if data.get('vision'):
+        chunks.append(Chunk('Vision', f"Vision: {data['vision']}"))
+    if data.get('mission'):
+        chunks.append(Chunk('Mission', 'Mission: ' + ' '.join(data['mission'])))
+    if data.get('values'):
+        chunks.append(Chunk('Values', f"Core values: {', '.join(data['values'])}."))
+    if data.get('core_principles'):
+        chunks.append(Chunk('Principles', 'Core principles: ' + '; '.join(data['core_principles']) + '.'))
+    return chunks
+
+
+class BM25Index:
+    """Okapi BM25 over a small set of chunks, with an inverted index for lookups"""
+
+    def __init__(self, chunks, k1=1.5, b=0.75):
+        self.chunks = list(chunks)
+        self.k1 = k1
+        self.b = b
+        self._postings = defaultdict(list)  # term -> [(chunk index, term frequency)]
+        lengths = []
+        for i, chunk in enumerate(self.chunks):
+            terms = Counter(tokenize(f'{chunk.title} {chunk.text}'))
+            lengths.append(sum(terms.values()))
+            for term, tf in terms.items():
+                self._postings[term].append((i, tf))
+        self._lengths = lengths
+        avg_length = (sum(lengths) / len(lengths)) if lengths else 1.0
+        self._norms = [k1 * (1 - b + b * length / avg_length) for length in lengths]
+        n = len(self.chunks)
+        self._idf = {term: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5)) for term, p in self._postings.items()}
+
+    def search(self, query, k=3):
+        """Top-k (chunk, score) pairs with a positive score, best first"""
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for i, tf in self._postings[term]:
+                scores[i] += idf * tf * (self.k1 + 1) / (tf + self._norms[i])
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.chunks[i], score) for i, score in best]
+
+    def __len__(self):
+        return len(self.chunks)
@@ -0,0 +1,306 @@
+import bisect
+import copy
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def _sort_value(key, record, order_by):
+    return key if order_by == '$key' else record.get(order_by)
+
+
+def _comparable(value):
+    # RTDB ordering: missing children first, then booleans, numbers and strings
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, int(value))
+    if isinstance(value, (int, float)):
+        return (2, value)
+    return (3, str(value))
+
+
+class _Index:
+    """Records of one collection kept sorted on key(record); records where it returns None are left out"""
+
+    def __init__(self, key):
+        self.key = key
+        self.entries = []  # sorted (value, record key)
+        self.values = {}  # record key -> value
+
+    def _value(self, record_key, record):
+        try:
+            return self.key(record) if isinstance(record, dict) else None
+        except Exception:
+            return None
+
+    def rebuild(self, records):
+        self.values = {k: v for k, v in ((k, self._value(k, d)) for k, d in records.items()) if v is not None}
+        self.entries = sorted((v, k) for k, v in self.values.items())
+
+    def update(self, record_key, record):
+        old = self.values.pop(record_key, None)
+        if old is not None:
+            i = bisect.bisect_left(self.entries, (old, record_key))
+            if i < len(self.entries) and self.entries[i] == (old, record_key):
+                del self.entries[i]
+        value = self._value(record_key, record)
+        if value is not None:
+            self.values[record_key] = value
+            bisect.insort(self.entries, (value, record_key))
+
+    def count_above(self, value):
+        return len(self.entries) - bisect.bisect_right(self.entries, value, key=lambda entry: entry[0])
+
+
+class _Ordering(_Index):
+    """Records sorted on rank(order_by value), the order page() serves them in"""
+
+    def __init__(self, order_by, rank):
+        super().__init__(rank)
+        self.order_by = order_by
+
+    def _value(self, record_key, record):
+        if not isinstance(record, dict):
+            return None
+        return self.key(_sort_value(record_key, record, self.order_by))
+
+
+class Subscription:
+    """Change events for one listener (e.g. an open SSE stream)
+
+    A subscriber that falls max_pending events behind is marked overflowed and
+    receives a single reset instead, telling it to reload.
+    """
+
+    def __init__(self, mirror, max_pending):
+        self._mirror = mirror
+        self._queue = queue.Queue(maxsize=max_pending)
+        self.overflowed = False
+
+    def _offer(self, change):
+        if self.overflowed:
+            return
+        try:
+            self._queue.put_nowait(change)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout=None):
+        """Next change, {'type': 'reset'} after an overflow, or None on timeout"""
+        if self.overflowed:
+            self.overflowed = False
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            return {'type': 'reset'}
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self._mirror.unsubscribe(self)
+
+
+class RealtimeMirror:
+    """In-memory copy of RTDB collections kept current by listen() streams
+
+    Each collection gets one listener; its initial put loads the whole collection
+    and later put/patch events apply deltas. Reads are served from memory once a
+    collection is ready, and every changed record is published to subscribers.
+    Indexes added with add_index() and the orderings page() reads from are updated
+    with each change, so counts and pages never scan the collection.
+    """
+
+    def __init__(self, get_ref, collections, max_subscribers=100, max_pending=256):
+        self.get_ref = get_ref
+        self.collections = list(collections)
+        self.max_subscribers = max_subscribers
+        self.max_pending = max_pending
+        self._data = {name: {} for name in self.collections}
+        self._ready = set()
+        self._registrations = {}
+        self._subscribers = set()
+        self._indexes = {name: {} for name in self.collections}
+        self._orderings = {name: {} for name in self.collections}  # (order_by, rank) -> _Ordering
+        self._lock = threading.RLock()
+        self.version = 0
+        self.events = 0
+        self.errors = 0
+
+    def start(self):
+        for name in self.collections:
+            if name not in self._registrations:
+                self._registrations[name] = self.get_ref(name).listen(
+                    lambda event, name=name: self._on_event(name, event)
+                )
+        return self
+
+    def stop(self):
+        for registration in self._registrations.values():
+            try:
+                registration.close()
+            except Exception as e:
+                logger.warning(f"Failed to close RTDB listener: {e}")
+        self._registrations.clear()
+        with self._lock:
+            self._ready.clear()
+
+    # Listener events
+
+    def _on_event(self, collection, event):
+        try:
+            changed = self._apply(collection, event.event_type, event.path, event.data)
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            logger.warning(f"Failed to apply RTDB event to {collection} mirror: {e}")
+            return
+        with self._lock:
+            self.events += 1
+        for change in changed:
+            self._publish(change)
+
+    def _apply(self, collection, event_type, path, data):
+        """Apply one put/patch and return the change events it produced"""
+        parts = [p for p in (path or '/').strip('/').split('/') if p]
+        with self._lock:
+            records = self._data[collection]
+            if not parts:
+                if event_type == 'put':
+                    # The first put carries the whole collection; later ones replace it
+                    self._data[collection] = dict(data) if isinstance(data, dict) else {}
+                    for index in self._all_indexes(collection):
+                        index.rebuild(self._data[collection])
+                    self._ready.add(collection)
+                    self.version += 1
+                    return [{'type': 'reset', 'collection': collection}]
+                # Multi-path updates carry child paths such as 'abc/status'
+                updates = [([p for p in child.split('/') if p], value) for child, value in (data or {}).items()]
+                keys = list(dict.fromkeys(child[0] for child, _ in updates if child))
+                existed = {key: key in records for key in keys}
+                for child, value in updates:
+                    if child:
+                        self._set(records, child, value)
+            else:
+                keys = [parts[0]]
+                existed = {parts[0]: parts[0] in records}
+                if event_type == 'patch':
+                    for child, value in (data or {}).items():
+                        self._set(records, parts + [p for p in child.split('/') if p], value)
+                else:
+                    self._set(records, parts, data)
+            for index in self._all_indexes(collection):
+                for key in keys:
+                    index.update(key, records.get(key))
+            self.version += 1
+            return [{'type': 'change', 'collection': collection, 'key': key, 'created': not existed[key],
+                     'record': copy.deepcopy(records.get(key))} for key in keys]
+
+    def _all_indexes(self, collection):
+        return list(self._indexes[collection].values()) + list(self._orderings[collection].values())
+
+    @staticmethod
+    def _set(node, parts, value):
+        for part in parts[:-1]:
+            child = node.get(part)
+            if not isinstance(child, dict):
+                if value is None:
+                    return
+                child = node[part] = {}
+            node = child
+        if value is None:
+            node.pop(parts[-1], None)
+        else:
+            node[parts[-1]] = value
+
+    # Reads
+
+    def add_index(self, collection, name, key):
+        """Keep the collection's records sorted on key(record), a number or None to leave the record out"""
+        index = _Index(key)
+        with self._lock:
+            index.rebuild(self._data[collection])
+            self._indexes[collection][name] = index
+
+    def count_above(self, collection, name, value):
+        """Records whose value in the named index is greater than value"""
+        with self._lock:
+            return self._indexes[collection][name].count_above(value)
+
+    def ready(self, collection=None):
+        with self._lock:
+            if collection is None:
+                return len(self._ready) == len(self.collections)
+            return collection in self._ready
+
+    def count(self, collection):
+        with self._lock:
+            return len(self._data[collection])
+
+    def snapshot(self, collection):
+        """Shallow copy of the collection (key -> record); records must not be modified"""
+        with self._lock:
+            return dict(self._data[collection])
+
+    def page(self, collection, order_by, limit, before=None, rank=None):
+        """Newest-first (key, record) pairs and the (value, key) of the last one if older records exist
+
+        Records are ordered on rank(order_by value), RTDB's ordering by default. The
+        first page for an ordering builds a sorted index of it that later changes keep
+        current; each page is then a binary search from the cursor.
+        """
+        rank = rank or _comparable
+        with self._lock:
+            records = self._data[collection]
+            ordering = self._orderings[collection].get((order_by, rank))
+            if ordering is None:
+                ordering = _Ordering(order_by, rank)
+                ordering.rebuild(records)
+                self._orderings[collection][(order_by, rank)] = ordering
+            end = len(ordering.entries)
+            if before is not None:
+                end = bisect.bisect_left(ordering.entries, (rank(before[0]), before[1]))
+            start = max(0, end - limit)
+            page = [(key, records[key]) for _, key in reversed(ordering.entries[start:end])]
+        next_before = None
+        if start > 0 and page:
+            key, d = page[-1]
+            next_before = (_sort_value(key, d, order_by), key)
+        return page, next_before
+
+    # Subscribers
+
+    def subscribe(self):
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            subscription = Subscription(self, self.max_pending)
+            self._subscribers.add(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def _publish(self, change):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription._offer(change)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ready': sorted(self._ready),
+                'records': {name: len(records) for name, records in self._data.items()},
+                'subscribers': len(self._subscribers),
+                'version': self.version,
+                'events': self.events,
+                'errors': self.errors
+            }
@@ -0,0 +1,86 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceRegistry:
+    """Named clients created on first use
+
+    register() records a factory without calling it; get() runs the factory once
+    (other threads asking for the same service wait for it) and returns the same
+    instance afterwards. A failed factory is retried on the next get(). Heavy
+    imports belong inside the factories so importing the app stays cheap.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._instances = {}
+        self._init_seconds = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, factory):
+        with self._lock:
+            self._factories[name] = factory
+            self._locks[name] = threading.Lock()
+
+    def set(self, name, instance):
+        """Use instance for name instead of calling its factory"""
+        with self._lock:
+            self._instances[name] = instance
+            self._locks.setdefault(name, threading.Lock())
+
+    def get(self, name):
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._locks[name]:
+            instance = self._instances.get(name)
+            if instance is None:
+                started = time.perf_counter()
+                instance = self._factories[name]()
+                self._init_seconds[name] = time.perf_counter() - started
+                self._instances[name] = instance
+                logger.info(f"Service '{name}' ready in {self._init_seconds[name]:.3f}s")
+        return instance
+
+    def loaded(self, name):
+        return name in self._instances
+
+    def proxy(self, name):
+        """Stand-in that creates the service on its first attribute access"""
+        return LazyService(self, name)
+
+    def preload(self, names):
+        """Create the named services on a background thread, logging failures"""
+        def _run():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception as e:
+                    logger.warning(f"Preloading service '{name}' failed: {e}")
+
+        names = [name for name in names if name in self._factories]
+        if names:
+            threading.Thread(target=_run, name='service-preload', daemon=True).start()
+
+    def stats(self):
+        return {name: {'loaded': name in self._instances, 'init_seconds': self._init_seconds.get(name)}
+                for name in self._factories}
+
+
+class LazyService:
+    __slots__ = ('_registry', '_name')
+
+    def __init__(self, registry, name):
+        self._registry = registry
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(self._registry.get(self._name), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._registry.loaded(self._name) else 'not loaded'
+        return f'<LazyService {self._name} ({state})>'
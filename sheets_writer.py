@@ -0,0 +1,219 @@
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process locking only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class SheetsClient:
+    """Long-lived Sheets API client
+
+    Credentials are loaded once and refreshed only when they expire. The discovery
+    document is built once per thread, since googleapiclient services are not
+    thread-safe. The Google client libraries are imported on first use.
+    """
+
+    def __init__(self, load_credentials, save_credentials=None):
+        self.load_credentials = load_credentials
+        self.save_credentials = save_credentials
+        self._creds = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _valid_credentials(self):
+        from google.auth.transport.requests import Request
+
+        with self._lock:
+            if self._creds is None:
+                self._creds = self.load_credentials()
+            elif not self._creds.valid and getattr(self._creds, 'refresh_token', None):
+                self._creds.refresh(Request())
+                if self.save_credentials is not None:
+                    self.save_credentials(self._creds)
+            return self._creds
+
+    def service(self):
+        creds = self._valid_credentials()
+        if getattr(self._local, 'creds', None) is not creds:
+            from googleapiclient.discovery import build
+            self._local.service = build('sheets', 'v4', credentials=creds)
+            self._local.creds = creds
+        return self._local.service
+
+
+class SheetsWriter:
+    """Journals rows and appends them to a sheet in batches from a background thread
+
+    The JSON-lines journal is the buffer and is shared by worker processes: appends
+    and rewrites hold its file lock, and only the process holding the flush lock
+    sends, so each row reaches the sheet once and survives a restart until it does.
+    With no spreadsheet_id the writer is disabled and rows are dropped.
+    """
+
+    def __init__(self, client, spreadsheet_id, range_name, batch_size=50, flush_interval=5.0,
+                 max_backoff=300.0, journal_path='sheets_journal.jsonl'):
+        self.client = client
+        self.spreadsheet_id = spreadsheet_id
+        self.range_name = range_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        self.journal_path = journal_path
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._unsent = 0
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._failures = 0
+        self.appended = 0
+        self.batches = 0
+        self.errors = 0
+        self.dropped = 0
+
+    @property
+    def enabled(self):
+        return bool(self.spreadsheet_id)
+
+    # Journal access
+
+    @contextmanager
+    def _exclusive(self, thread_lock, suffix, blocking=True):
+        """Hold thread_lock and the file lock at journal_path + suffix; yields False if not blocking and busy"""
+        if not thread_lock.acquire(blocking):
+            yield False
+            return
+        try:
+            if fcntl is None:
+                yield True
+                return
+            with open(self.journal_path + suffix, 'a') as f:
+                try:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    yield False
+                    return
+                try:
+                    yield True
+                finally:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        finally:
+            thread_lock.release()
+
+    def _journal_locked(self):
+        return self._exclusive(self._lock, '.lock')
+
+    def _read_journal(self):
+        rows = []
+        try:
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        try:
+                            rows.append(json.loads(line))
+                        except json.JSONDecodeError:
+                            logger.error(f"Dropping corrupt Sheets journal entry: {line[:80]}")
+        except FileNotFoundError:
+            pass
+        return rows
+
+    def _rewrite_journal(self, rows):
+        tmp_path = self.journal_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(row) + '\n' for row in rows)
+        os.replace(tmp_path, self.journal_path)
+
+    def start(self):
+        if not self.enabled:
+            return self
+        if self._thread is None:
+            pending = self.pending()
+            if pending:
+                logger.info(f"{pending} unsent Sheets rows in {self.journal_path}")
+            self._thread = threading.Thread(target=self._run, name='sheets-writer', daemon=True)
+            self._thread.start()
+        return self
+
+    def append(self, row):
+        """Journal one row; returns immediately. Dropped when the writer is disabled."""
+        if not self.enabled:
+            self.dropped += 1
+            logger.debug("Sheets writer disabled (no spreadsheet id), dropping row")
+            return
+        with self._journal_locked():
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(row) + '\n')
+            self._unsent += 1
+            full = self._unsent >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """Send everything journaled; returns False if another process is already sending"""
+        with self._exclusive(self._flush_lock, '.flush', blocking=False) as acquired:
+            if not acquired:
+                return False
+            with self._journal_locked():
+                batch = self._read_journal()[:self.batch_size]
+                self._unsent = 0
+            while batch:
+                self.client.service().spreadsheets().values().append(
+                    spreadsheetId=self.spreadsheet_id,
+                    range=self.range_name,
+                    valueInputOption='RAW',
+                    body={'values': batch}
+                ).execute()
+                with self._journal_locked():
+                    # Only the flusher removes rows, so the sent batch is still at the front
+                    rows = self._read_journal()[len(batch):]
+                    self._rewrite_journal(rows)
+                    self.appended += len(batch)
+                    self.batches += 1
+                    batch = rows[:self.batch_size]
+            return True
+
+    def stop(self, timeout=5.0):
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            delay = self.flush_interval
+            if self._failures:
+                delay = min(self.max_backoff, self.flush_interval * (2 ** self._failures))
+            self._wake.wait(delay)
+            self._wake.clear()
+            self._flush_quietly()
+        # Last attempt on shutdown; whatever fails stays in the journal
+        self._flush_quietly()
+
+    def _flush_quietly(self):
+        try:
+            self.flush()
+            self._failures = 0
+        except Exception as e:
+            self.errors += 1
+            self._failures = min(self._failures + 1, 10)
+            logger.error(f"Sheets batch append failed, {self.pending()} rows kept in journal: {e}")
+
+    def pending(self):
+        with self._journal_locked():
+            return len(self._read_journal())
+
+    def stats(self):
+        return {
+            'pending': self.pending(),
+            'appended': self.appended,
+            'batches': self.batches,
+            'errors': self.errors,
+            'dropped': self.dropped
+        }
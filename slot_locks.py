@@ -0,0 +1,79 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from appointment_store import slot_key
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process locking only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SLOTS_PATH = 'slots'
+
+
+def slot_id(when):
+    """RTDB-safe identifier for a slot, e.g. 20300101T100000"""
+    return slot_key(when).strftime('%Y%m%dT%H%M%S')
+
+
+class SlotLocks:
+    """Striped per-slot locks serialising the conflict check and the write of a booking
+
+    Each slot hashes to one of `stripes` locks, so bookings for different slots rarely
+    contend. Within a process the stripe is a threading.Lock; across worker processes
+    on the same host the stripe also takes an exclusive flock on a file in lock_dir.
+    """
+
+    def __init__(self, lock_dir=None, stripes=64):
+        self.lock_dir = lock_dir or os.path.join(tempfile.gettempdir(), 'imsolutions-slot-locks')
+        self.stripes = stripes
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        if fcntl is not None:
+            os.makedirs(self.lock_dir, exist_ok=True)
+
+    def _stripe(self, when):
+        digest = hashlib.sha1(slot_id(when).encode('ascii')).digest()
+        return int.from_bytes(digest[:4], 'big') % self.stripes
+
+    @contextmanager
+    def hold(self, when):
+        stripe = self._stripe(when)
+        with self._locks[stripe]:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.lock_dir, f'slot-{stripe}.lock'), 'a') as f:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class SlotReservations:
+    """Slot claims under slots/<slot id> in RTDB, made atomic with transactions
+
+    Covers app instances on different hosts sharing one database.
+    """
+
+    def __init__(self, get_ref, path=SLOTS_PATH):
+        self.get_ref = get_ref
+        self.path = path
+
+    def reserve(self, when, appointment_id):
+        """Claim the slot for appointment_id; returns the id now holding it"""
+        return self.get_ref(f'{self.path}/{slot_id(when)}').transaction(
+            lambda current: current or appointment_id
+        )
+
+    def release(self, when, appointment_id):
+        """Free the slot if appointment_id still holds it"""
+        self.get_ref(f'{self.path}/{slot_id(when)}').transaction(
+            lambda current: None if current == appointment_id else current
+        )
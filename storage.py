@@ -0,0 +1,441 @@
+import calendar
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from appointment_store import APPOINTMENT_FIELDS, AppointmentStore, slot_key
+
+logger = logging.getLogger(__name__)
+
+COLLECTIONS = ('leads', 'appointments', 'conversations', 'users')
+
+
+class LocalStorage(ABC):
+    """Local persistence used alongside (or instead of) the Realtime Database
+
+    Records are plain dicts shaped like their RTDB counterparts, so the dashboard
+    formatters work on either source. Paging is newest first: page() takes and
+    returns a (sort value, key) cursor for the last record shown. Backends must
+    implement the appointment and user methods; the rest are optional.
+    """
+
+    name = 'base'
+    supports_queries = False
+
+    # Appointments
+    @abstractmethod
+    def find_appointment_conflict(self, when):
+        pass
+
+    @abstractmethod
+    def add_appointment(self, row):
+        pass
+
+    @abstractmethod
+    def set_appointment_status(self, appointment_id, status):
+        pass
+
+    @abstractmethod
+    def list_appointments(self):
+        pass
+
+    # Leads, users and conversations
+    def add_lead(self, lead):
+        pass
+
+    @abstractmethod
+    def add_user(self, user):
+        pass
+
+    @abstractmethod
+    def list_users(self):
+        pass
+
+    def add_conversation(self, conversation):
+        pass
+
+    def bulk_insert(self, collection, records):
+        """Insert many records at once; returns the number written"""
+        add = {
+            'leads': self.add_lead,
+            'appointments': self.add_appointment,
+            'conversations': self.add_conversation,
+            'users': self.add_user
+        }[collection]
+        for record in records:
+            add(record)
+        return len(records)
+
+    # Dashboard queries
+    def page(self, collection, limit, before=None):
+        return [], None
+
+    def metrics(self, since_day=None, now_iso=None):
+        return None
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FileStorage(LocalStorage):
+    """The original flat files: appointments.csv log and users_data.json (JSON lines)"""
+
+    name = 'files'
+
+    def __init__(self, appointments_path='appointments.csv', users_path='users_data.json'):
+        self.appointments = AppointmentStore(appointments_path)
+        self.users_path = users_path
+        self._users_lock = threading.Lock()
+
+    def find_appointment_conflict(self, when):
+        return self.appointments.find_conflict(when)
+
+    def add_appointment(self, row):
+        self.appointments.add(row)
+
+    def set_appointment_status(self, appointment_id, status):
+        return self.appointments.set_status(appointment_id, status)
+
+    def list_appointments(self):
+        return self.appointments.all()
+
+    def add_user(self, user):
+        with self._users_lock:
+            with open(self.users_path, 'a') as f:
+                f.write(json.dumps(user) + '\n')
+
+    def list_users(self):
+        users = []
+        if os.path.exists(self.users_path):
+            with open(self.users_path, 'r') as f:
+                for line in f:
+                    if line.strip():
+                        users.append(json.loads(line.strip()))
+        return users
+
+    def page(self, collection, limit, before=None):
+        if collection == 'users':
+            records = list(enumerate(self.list_users()))
+        elif collection == 'appointments':
+            records = list(enumerate(self.list_appointments()))
+        else:
+            return [], None
+        # Position in the file is the sort order; the cursor is the last position shown
+        records.reverse()
+        if before is not None:
+            records = [(i, r) for i, r in records if i < before[0]]
+        page = records[:limit]
+        next_before = (page[-1][0], str(page[-1][0])) if len(records) > limit else None
+        return [(str(r.get('id', i)), r) for i, r in page], next_before
+
+
+def _appointment_record(row):
+    record = {field: row[field] for field in APPOINTMENT_FIELDS if field in row.keys()}
+    record['user'] = {
+        'name': record.pop('user_name', '') or '',
+        'email': record.pop('user_email', '') or '',
+        'phone': record.pop('user_phone', '') or '',
+        'company': record.pop('user_company', '') or ''
+    }
+    return record
+
+
+def _conversation_record(row):
+    return {
+        'id': row['id'],
+        'user_message': row['user_message'],
+        'bot_response': row['bot_response'],
+        'timestamp': row['timestamp'],
+        'session_id': row['session_id'],
+        'user_details': {'name': row['user_name'], 'email': row['user_email'], 'phone': row['user_phone']}
+    }
+
+
+def _user_record(row):
+    # Users keep the RTDB push key they were stored or imported under, if any
+    record = dict(row)
+    key = record.pop('key', None)
+    if key:
+        record['id'] = key
+    return record
+
+
+class SQLiteStorage(LocalStorage):
+    """SQLite (WAL mode) storage with indexed queries, per-thread connections and batched inserts"""
+
+    name = 'sqlite'
+    supports_queries = True
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS appointments (
+            id TEXT PRIMARY KEY,
+            title TEXT, time TEXT, slot TEXT, notes TEXT, status TEXT,
+            user_name TEXT, user_email TEXT, user_phone TEXT, user_company TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_appointments_slot_id ON appointments(slot, id);
+        CREATE INDEX IF NOT EXISTS idx_appointments_active_slot ON appointments(slot) WHERE status != 'cancelled';
+        CREATE TABLE IF NOT EXISTS leads (
+            id TEXT PRIMARY KEY,
+            name TEXT, email TEXT, phone TEXT, message TEXT, source TEXT, created_at INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS idx_leads_created_at ON leads(created_at);
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            key TEXT,
+            name TEXT, email TEXT, phone TEXT, company TEXT, timestamp TEXT, source TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
+        CREATE TABLE IF NOT EXISTS conversations (
+            id TEXT PRIMARY KEY,
+            user_message TEXT, bot_response TEXT, timestamp INTEGER, session_id TEXT,
+            user_name TEXT, user_email TEXT, user_phone TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_conversations_timestamp ON conversations(timestamp);
+        CREATE INDEX IF NOT EXISTS idx_conversations_session ON conversations(session_id);
+    """
+
+    # Collection -> (table, sort column, key column, row -> record)
+    PAGING = {
+        'leads': ('leads', 'created_at', 'id', dict),
+        'appointments': ('appointments', 'slot', 'id', _appointment_record),
+        'conversations': ('conversations', 'timestamp', 'id', _conversation_record),
+        'users': ('users', 'id', 'id', _user_record)
+    }
+
+    def __init__(self, path='imsolutions.db', batch_size=100, flush_interval=1.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._pending = []  # buffered conversation rows
+        self._pending_lock = threading.Lock()
+        with self._write_lock:
+            conn = self._conn()
+            conn.executescript(self.SCHEMA)
+            if 'key' not in {row['name'] for row in conn.execute('PRAGMA table_info(users)')}:
+                conn.execute('ALTER TABLE users ADD COLUMN key TEXT')
+            conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_users_key ON users(key)')
+            # Appointments page on (slot, id); unparseable times used to leave slot NULL
+            conn.execute('DROP INDEX IF EXISTS idx_appointments_time')
+            conn.execute("UPDATE appointments SET slot = '' WHERE slot IS NULL")
+            conn.commit()
+        self._flusher = threading.Thread(target=self._flush_loop, name='sqlite-flusher', daemon=True)
+        self._flusher.start()
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _write(self, sql, params=()):
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                return conn.execute(sql, params)
+
+    def _query(self, sql, params=()):
+        return self._conn().execute(sql, params).fetchall()
+
+    # Appointments
+
+    def find_appointment_conflict(self, when):
+        rows = self._query(
+            "SELECT * FROM appointments WHERE slot = ? AND status != 'cancelled' LIMIT 1",
+            (slot_key(when).isoformat(),)
+        )
+        return {field: rows[0][field] for field in APPOINTMENT_FIELDS} if rows else None
+
+    def add_appointment(self, row):
+        self._write(
+            'INSERT OR REPLACE INTO appointments (id, title, time, slot, notes, status, user_name, user_email, user_phone, user_company) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            self._appointment_params(row)
+        )
+
+    def _appointment_params(self, row):
+        user = row.get('user') if isinstance(row.get('user'), dict) else {}
+        try:
+            slot = slot_key(row.get('time', '')).isoformat()
+        except Exception:
+            slot = ''  # unparseable times sort oldest, as in the RTDB mirror
+        return (
+            row.get('id'), row.get('title', ''), row.get('time', ''), slot, row.get('notes', ''),
+            row.get('status', 'scheduled'),
+            row.get('user_name', user.get('name', '')), row.get('user_email', user.get('email', '')),
+            row.get('user_phone', user.get('phone', '')), row.get('user_company', user.get('company', ''))
+        )
+
+    def set_appointment_status(self, appointment_id, status):
+        self._write('UPDATE appointments SET status = ? WHERE id = ?', (status, appointment_id))
+        rows = self._query('SELECT * FROM appointments WHERE id = ?', (appointment_id,))
+        return {field: rows[0][field] for field in APPOINTMENT_FIELDS} if rows else None
+
+    def list_appointments(self):
+        rows = self._query('SELECT * FROM appointments ORDER BY rowid')
+        return [{field: row[field] for field in APPOINTMENT_FIELDS} for row in rows]
+
+    # Leads and users
+
+    def add_lead(self, lead):
+        self._write(
+            'INSERT OR REPLACE INTO leads (id, name, email, phone, message, source, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            self._lead_params(lead)
+        )
+
+    def _lead_params(self, lead):
+        return (lead.get('id'), lead.get('name', ''), lead.get('email', ''), lead.get('phone', ''),
+                lead.get('message', ''), lead.get('source', ''), lead.get('created_at'))
+
+    USER_UPSERT = (
+        'INSERT INTO users (key, name, email, phone, company, timestamp, source) VALUES (?, ?, ?, ?, ?, ?, ?) '
+        'ON CONFLICT(key) DO UPDATE SET name = excluded.name, email = excluded.email, phone = excluded.phone, '
+        'company = excluded.company, timestamp = excluded.timestamp, source = excluded.source'
+    )
+
+    def add_user(self, user):
+        self._write(self.USER_UPSERT, self._user_params(user))
+
+    def _user_params(self, user):
+        return (user.get('id') or None, user.get('name'), user.get('email'), user.get('phone', ''),
+                user.get('company', ''), user.get('timestamp'), user.get('source', ''))
+
+    def list_users(self):
+        return [_user_record(row) for row in self._query('SELECT * FROM users ORDER BY id')]
+
+    # Conversations are buffered and written in batches
+
+    def add_conversation(self, conversation):
+        with self._pending_lock:
+            self._pending.append(self._conversation_params(conversation))
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self.flush()
+
+    def _conversation_params(self, conversation):
+        details = conversation.get('user_details') if isinstance(conversation.get('user_details'), dict) else {}
+        return (conversation.get('id'), conversation.get('user_message', ''), conversation.get('bot_response', ''),
+                conversation.get('timestamp'), conversation.get('session_id', 'default'),
+                details.get('name', ''), details.get('email', ''), details.get('phone', ''))
+
+    def flush(self):
+        with self._pending_lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO conversations (id, user_message, bot_response, timestamp, session_id, '
+                    'user_name, user_email, user_phone) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    batch
+                )
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Failed to flush buffered conversations to SQLite: {e}")
+
+    def bulk_insert(self, collection, records):
+        sql, to_params = {
+            'leads': ('INSERT OR REPLACE INTO leads (id, name, email, phone, message, source, created_at) '
+                      'VALUES (?, ?, ?, ?, ?, ?, ?)', self._lead_params),
+            'appointments': ('INSERT OR REPLACE INTO appointments (id, title, time, slot, notes, status, user_name, '
+                             'user_email, user_phone, user_company) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                             self._appointment_params),
+            'conversations': ('INSERT OR REPLACE INTO conversations (id, user_message, bot_response, timestamp, '
+                              'session_id, user_name, user_email, user_phone) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                              self._conversation_params),
+            'users': (self.USER_UPSERT, self._user_params)
+        }[collection]
+        params = [to_params(record) for record in records]
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                conn.executemany(sql, params)
+        return len(params)
+
+    # Dashboard queries
+
+    def page(self, collection, limit, before=None):
+        self.flush()
+        table, sort, key, to_record = self.PAGING[collection]
+        if before is None:
+            rows = self._query(f'SELECT * FROM {table} ORDER BY {sort} DESC, {key} DESC LIMIT ?', (limit + 1,))
+        else:
+            rows = self._query(
+                f'SELECT * FROM {table} WHERE ({sort}, {key}) < (?, ?) ORDER BY {sort} DESC, {key} DESC LIMIT ?',
+                (before[0], before[1], limit + 1)
+            )
+        page = rows[:limit]
+        next_before = (page[-1][sort], page[-1][key]) if len(rows) > limit else None
+        records = [to_record(row) for row in page]
+        return [(str(record.get('id', row[key])), record) for row, record in zip(page, records)], next_before
+
+    def metrics(self, since_day=None, now_iso=None):
+        """Same shape as MetricsAggregator.read(), plus the upcoming appointment count"""
+        self.flush()
+        counts = {}
+        for collection in ('leads', 'appointments', 'conversations'):
+            counts[collection] = self._query(f'SELECT COUNT(*) FROM {collection}')[0][0]
+        counts['unique_users'] = self._query(
+            "SELECT COUNT(DISTINCT LOWER(TRIM(k))) FROM ("
+            " SELECT COALESCE(NULLIF(email, ''), NULLIF(phone, '')) AS k FROM users"
+            " UNION ALL SELECT COALESCE(NULLIF(email, ''), NULLIF(phone, '')) FROM leads"
+            " UNION ALL SELECT COALESCE(NULLIF(user_email, ''), NULLIF(user_phone, '')) FROM appointments"
+            " UNION ALL SELECT COALESCE(NULLIF(user_email, ''), NULLIF(user_phone, ''), session_id) FROM conversations"
+            ") WHERE k IS NOT NULL"
+        )[0][0]
+        # Days are UTC dates, like the leadsToday key
+        since_ms = 0
+        if since_day:
+            since_ms = calendar.timegm(time.strptime(since_day, '%Y-%m-%d')) * 1000
+        days = self._query(
+            "SELECT strftime('%Y-%m-%d', created_at / 1000, 'unixepoch') AS day, COUNT(*) "
+            "FROM leads WHERE created_at >= ? GROUP BY day",
+            (since_ms,)
+        )
+        statuses = self._query("SELECT LOWER(COALESCE(NULLIF(status, ''), 'pending')), COUNT(*) FROM appointments GROUP BY 1")
+        upcoming = 0
+        if now_iso:
+            upcoming = self._query(
+                "SELECT COUNT(*) FROM appointments WHERE slot > ? AND status != 'cancelled'", (now_iso,)
+            )[0][0]
+        return {
+            'counters': counts,
+            'leads_by_day': {row[0]: row[1] for row in days},
+            'appointment_status': {row[0]: row[1] for row in statuses},
+            'upcoming_appointments': upcoming
+        }
+
+    def close(self):
+        self.flush()
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def create_storage(backend='files', **options):
+    """Build the configured local storage backend ('files' or 'sqlite')"""
+    if backend == 'sqlite':
+        return SQLiteStorage(options.get('sqlite_path', 'imsolutions.db'))
+    if backend != 'files':
+        logger.warning(f"Unknown STORAGE_BACKEND '{backend}', using flat files")
+    return FileStorage(options.get('appointments_path', 'appointments.csv'), options.get('users_path', 'users_data.json'))
@@ -0,0 +1,91 @@
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+
+class VoiceTurns:
+    """Runs voice replies in the background so webhooks can answer within a latency budget
+
+    start() submits the reply and returns a turn id; wait() blocks for at most the
+    given timeout and returns (done, reply). Finished turns are kept for ttl
+    seconds so a redirected poll can still collect them.
+    """
+
+    def __init__(self, respond, max_workers=8, ttl=120.0):
+        self.respond = respond
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='voice')
+        self._turns = {}  # turn id -> (started_at, future)
+        self._lock = threading.Lock()
+
+    def start(self, question):
+        turn_id = uuid.uuid4().hex
+        future = self._executor.submit(self.respond, question)
+        with self._lock:
+            self._purge()
+            self._turns[turn_id] = (time.time(), future)
+        return turn_id
+
+    def wait(self, turn_id, timeout):
+        """(done, reply); (False, None) if still running, unknown turns are reported as not done"""
+        with self._lock:
+            entry = self._turns.get(turn_id)
+        if entry is None:
+            return False, None
+        try:
+            reply = entry[1].result(timeout=max(0.0, timeout))
+        except FutureTimeout:
+            return False, None
+        with self._lock:
+            self._turns.pop(turn_id, None)
+        return True, reply
+
+    def started_at(self, turn_id):
+        with self._lock:
+            entry = self._turns.get(turn_id)
+        return entry[0] if entry else None
+
+    def __contains__(self, turn_id):
+        with self._lock:
+            return turn_id in self._turns
+
+    def _purge(self):
+        cutoff = time.time() - self.ttl
+        for turn_id in [t for t, (started, _) in self._turns.items() if started < cutoff]:
+            del self._turns[turn_id]
+
+
+class LatencyRecorder:
+    """Rolling window of latencies (seconds) with percentile summaries"""
+
+    def __init__(self, window=1000):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.over_budget = 0
+
+    def record(self, seconds, budget=None):
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+            if budget is not None and seconds > budget:
+                self.over_budget += 1
+
+    def stats(self):
+        with self._lock:
+            samples = sorted(self._samples)
+            count, over_budget = self.count, self.over_budget
+
+        def _pct(p):
+            return samples[min(len(samples) - 1, int(len(samples) * p / 100))] if samples else 0.0
+
+        return {
+            'count': count,
+            'over_budget': over_budget,
+            'p50': _pct(50),
+            'p95': _pct(95),
+            'p99': _pct(99),
+            'max': samples[-1] if samples else 0.0
+        }